@@ -0,0 +1,330 @@
+"""
+a_bogus签名算法的纯Python实现
+
+与douyin.js中的sign_datail/sign_reply逐步对应：SM3摘要、rc4_encrypt、
+result_encrypt（s0-s4字母表）、generate_rc4_bb_str和gener_random。
+签名不再依赖Node.js，且批量签名时只对变化的查询字符串做摘要。
+"""
+import time
+import random
+import hashlib
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+# 固定参数，对应douyin.js中的sign_datail和sign_reply
+DETAIL_ARGUMENTS = (0, 1, 14)
+REPLY_ARGUMENTS = (0, 1, 8)
+DEFAULT_SUFFIX = "cus"
+WINDOW_ENV_STR = "1536|747|1536|834|0|30|0|0|1536|834|1536|864|1525|747|24|24|Win32"
+PAGE_ID = 6241
+AID = 6383
+# 不变中间结果缓存的容量（按User-Agent、后缀和签名参数区分）
+SIGN_CACHE_SIZE = 64
+
+# result_encrypt使用的字母表
+ALPHABETS = {
+    "s0": "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=",
+    "s1": "Dkdpgh4ZKsQB80/Mfvw36XI1R25+WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe=",
+    "s2": "Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe=",
+    "s3": "ckdp1h4ZKsUB80/Mfvw36XIgR25+WQAlEi7NLboqYTOPuzmFjJnryx9HVGDaStCe",
+    "s4": "Dkdpgh2ZmsQB80/MfvV36XI1R45-WUAlEixNLwoqYTOPuzKFjJnry79HbGcaStCe",
+}
+
+# ---------------------------------------------------------------- SM3
+
+_SM3_IV = (1937774191, 1226093241, 388252375, 3666478592,
+           2842636476, 372324522, 3817729613, 2969243214)
+_MASK32 = 0xFFFFFFFF
+
+def _rotl(x: int, n: int) -> int:
+    n %= 32
+    return ((x << n) | (x >> (32 - n))) & _MASK32
+
+# 每轮常量Tj循环左移后的结果只与轮数有关，预先计算
+_SM3_T = [_rotl(2043430169 if j < 16 else 2055708042, j) for j in range(64)]
+
+def _sm3_compress(reg: List[int], block: bytes) -> List[int]:
+    w = [int.from_bytes(block[i:i + 4], "big") for i in range(0, 64, 4)]
+    for j in range(16, 68):
+        a = w[j - 16] ^ w[j - 9] ^ _rotl(w[j - 3], 15)
+        a = a ^ _rotl(a, 15) ^ _rotl(a, 23)
+        w.append(a ^ _rotl(w[j - 13], 7) ^ w[j - 6])
+    w1 = [w[j] ^ w[j + 4] for j in range(64)]
+
+    a, b, c, d, e, f, g, h = reg
+    for j in range(64):
+        a12 = _rotl(a, 12)
+        ss1 = _rotl((a12 + e + _SM3_T[j]) & _MASK32, 7)
+        ss2 = ss1 ^ a12
+        if j < 16:
+            ff = a ^ b ^ c
+            gg = e ^ f ^ g
+        else:
+            ff = (a & b) | (a & c) | (b & c)
+            gg = (e & f) | (~e & g)
+        tt1 = (ff + d + ss2 + w1[j]) & _MASK32
+        tt2 = (gg + h + ss1 + w[j]) & _MASK32
+        d, c, b, a = c, _rotl(b, 9), a, tt1
+        h, g, f, e = g, _rotl(f, 19), e, tt2 ^ _rotl(tt2, 9) ^ _rotl(tt2, 17)
+    return [x ^ y for x, y in zip(reg, (a, b, c, d, e, f, g, h))]
+
+def _sm3_python(data: bytes) -> bytes:
+    length = len(data) * 8
+    data = data + b"\x80" + b"\x00" * ((55 - len(data)) % 64) + length.to_bytes(8, "big")
+    reg = list(_SM3_IV)
+    for i in range(0, len(data), 64):
+        reg = _sm3_compress(reg, data[i:i + 64])
+    return b"".join(x.to_bytes(4, "big") for x in reg)
+
+def _sm3_hashlib(data: bytes) -> bytes:
+    return hashlib.new("sm3", data).digest()
+
+# OpenSSL自带SM3时使用C实现，否则退回纯Python实现
+sm3_digest = _sm3_hashlib if "sm3" in hashlib.algorithms_available else _sm3_python
+
+def sm3_sum(data) -> List[int]:
+    """对应SM3.sum，字符串按UTF-8编码，返回32个字节值"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return list(sm3_digest(bytes(data)))
+
+# ---------------------------------------------------------------- RC4与编码
+
+def rc4_key_schedule(key: Sequence[int]) -> List[int]:
+    """RC4密钥调度，密钥固定时结果可以复用"""
+    s = list(range(256))
+    j = 0
+    for i in range(256):
+        j = (j + s[i] + key[i % len(key)]) % 256
+        s[i], s[j] = s[j], s[i]
+    return s
+
+def rc4_encrypt_codes(plaintext: Sequence[int], schedule: List[int]) -> List[int]:
+    """对应rc4_encrypt，输入输出均为字符编码列表"""
+    s = schedule[:]
+    i = j = 0
+    cipher = []
+    for code in plaintext:
+        i = (i + 1) % 256
+        j = (j + s[i]) % 256
+        s[i], s[j] = s[j], s[i]
+        cipher.append(s[(s[i] + s[j]) % 256] ^ code)
+    return cipher
+
+def rc4_encrypt(plaintext: str, key: str) -> str:
+    """对应rc4_encrypt"""
+    schedule = rc4_key_schedule([ord(c) for c in key])
+    return "".join(map(chr, rc4_encrypt_codes([ord(c) for c in plaintext], schedule)))
+
+def result_encrypt_codes(codes: Sequence[int], num: str) -> str:
+    """对应result_encrypt，每3个字符编码为4个字母，越界部分按0处理"""
+    alphabet = ALPHABETS[num]
+    n = len(codes)
+    out_len = -(-n * 4 // 3)
+    result = []
+    for start in range(0, n, 3):
+        c0 = codes[start]
+        c1 = codes[start + 1] if start + 1 < n else 0
+        c2 = codes[start + 2] if start + 2 < n else 0
+        long_int = (c0 << 16) | (c1 << 8) | c2
+        result.append(alphabet[(long_int & 16515072) >> 18])
+        result.append(alphabet[(long_int & 258048) >> 12])
+        result.append(alphabet[(long_int & 4032) >> 6])
+        result.append(alphabet[long_int & 63])
+    return "".join(result[:out_len])
+
+def result_encrypt(long_str: str, num: str) -> str:
+    """对应result_encrypt"""
+    return result_encrypt_codes([ord(c) for c in long_str], num)
+
+def gener_random(rand: int, option: Sequence[int]) -> List[int]:
+    """对应gener_random"""
+    return [
+        (rand & 170) | (option[0] & 85),
+        (rand & 85) | (option[0] & 170),
+        ((rand >> 8) & 170) | (option[1] & 85),
+        ((rand >> 8) & 85) | (option[1] & 170),
+    ]
+
+def generate_random_codes(random_values: Optional[Sequence[float]] = None) -> List[int]:
+    """对应generate_random_str，random_values为3个[0, 1)之间的随机数"""
+    if random_values is None:
+        random_values = [random.random() for _ in range(3)]
+    codes = []
+    for value, option in zip(random_values, ((3, 45), (1, 0), (1, 5))):
+        codes.extend(gener_random(int(value * 10000), option))
+    return codes
+
+# ---------------------------------------------------------------- 签名
+
+# 最后一步rc4的密钥固定为chr(121)，密钥调度只需计算一次
+_BB_SCHEDULE = rc4_key_schedule([121])
+_WINDOW_ENV_CODES = [ord(c) for c in WINDOW_ENV_STR]
+
+def suffix_hash(suffix: str = DEFAULT_SUFFIX) -> List[int]:
+    """后缀两次SM3的结果"""
+    return sm3_sum(sm3_sum(suffix))
+
+def user_agent_hash(user_agent: str, arguments: Sequence[int] = DETAIL_ARGUMENTS) -> List[int]:
+    """User-Agent经rc4和s3编码后SM3的结果"""
+    # String.fromCharCode(0.00390625, 1, x)中的小数会被截断为0
+    schedule = rc4_key_schedule([0, 1, arguments[2] & 0xFFFF])
+    ua_codes = rc4_encrypt_codes([ord(c) for c in user_agent], schedule)
+    return sm3_sum(result_encrypt_codes(ua_codes, "s3"))
+
+@lru_cache(maxsize=SIGN_CACHE_SIZE)
+def cached_suffix_hash(suffix: str = DEFAULT_SUFFIX) -> Tuple[int, ...]:
+    """带LRU缓存的suffix_hash，采集过程中后缀不变，只需计算一次"""
+    return tuple(suffix_hash(suffix))
+
+@lru_cache(maxsize=SIGN_CACHE_SIZE)
+def cached_user_agent_hash(user_agent: str, arguments: Tuple[int, ...] = DETAIL_ARGUMENTS) -> Tuple[int, ...]:
+    """带LRU缓存的user_agent_hash，同一User-Agent和签名参数只计算一次"""
+    return tuple(user_agent_hash(user_agent, arguments))
+
+def cache_info() -> dict:
+    """返回不变中间结果缓存的命中统计"""
+    stats = {}
+    for name, func in (("suffix", cached_suffix_hash), ("user_agent", cached_user_agent_hash)):
+        info = func.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+    stats["hits"] = stats["suffix"]["hits"] + stats["user_agent"]["hits"]
+    stats["misses"] = stats["suffix"]["misses"] + stats["user_agent"]["misses"]
+    return stats
+
+def cache_clear():
+    """清空不变中间结果缓存及统计"""
+    cached_suffix_hash.cache_clear()
+    cached_user_agent_hash.cache_clear()
+
+def _bb_codes(query_hash: Sequence[int], cus: Sequence[int], ua: Sequence[int],
+              arguments: Sequence[int], start_time: int, end_time: int) -> List[int]:
+    """对应generate_rc4_bb_str中拼装bb数组的部分"""
+    b = {}
+    b[8] = 3
+    b[18] = 44
+
+    b[20] = (start_time >> 24) & 255
+    b[21] = (start_time >> 16) & 255
+    b[22] = (start_time >> 8) & 255
+    b[23] = start_time & 255
+    b[24] = start_time >> 32
+    b[25] = start_time >> 40
+
+    b[26] = (arguments[0] >> 24) & 255
+    b[27] = (arguments[0] >> 16) & 255
+    b[28] = (arguments[0] >> 8) & 255
+    b[29] = arguments[0] & 255
+
+    b[30] = (arguments[1] // 256) & 255
+    b[31] = (arguments[1] % 256) & 255
+    b[32] = (arguments[1] >> 24) & 255
+    b[33] = (arguments[1] >> 16) & 255
+
+    b[34] = (arguments[2] >> 24) & 255
+    b[35] = (arguments[2] >> 16) & 255
+    b[36] = (arguments[2] >> 8) & 255
+    b[37] = arguments[2] & 255
+
+    b[38] = query_hash[21]
+    b[39] = query_hash[22]
+    b[40] = cus[21]
+    b[41] = cus[22]
+    b[42] = ua[23]
+    b[43] = ua[24]
+
+    b[44] = (end_time >> 24) & 255
+    b[45] = (end_time >> 16) & 255
+    b[46] = (end_time >> 8) & 255
+    b[47] = end_time & 255
+    b[48] = b[8]
+    b[49] = end_time >> 32
+    b[50] = end_time >> 40
+
+    b[52] = (PAGE_ID >> 24) & 255
+    b[53] = (PAGE_ID >> 16) & 255
+    b[54] = (PAGE_ID >> 8) & 255
+    b[55] = PAGE_ID & 255
+
+    b[57] = AID & 255
+    b[58] = (AID >> 8) & 255
+    b[59] = (AID >> 16) & 255
+    b[60] = (AID >> 24) & 255
+
+    b[64] = len(_WINDOW_ENV_CODES)
+    b[65] = b[64] & 255
+    b[66] = (b[64] >> 8) & 255
+    b[70] = 0
+    b[71] = 0
+
+    checksum = 0
+    for index in (18, 20, 26, 30, 38, 40, 42, 21, 27, 31, 35, 39, 41, 43, 22, 28, 32, 36, 23, 29, 33, 37,
+                  44, 45, 46, 47, 48, 49, 50, 24, 25, 52, 53, 54, 55, 57, 58, 59, 60, 65, 66, 70, 71):
+        checksum ^= b[index]
+
+    bb = [b[i] for i in (18, 20, 52, 26, 30, 34, 58, 38, 40, 53, 42, 21, 27, 54, 55, 31,
+                         35, 57, 39, 41, 43, 22, 28, 32, 60, 36, 23, 29, 33, 37, 44, 45,
+                         59, 46, 47, 48, 49, 50, 24, 25, 65, 66, 70, 71)]
+    return bb + _WINDOW_ENV_CODES + [checksum]
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+def sign_with_hashes(query: str, cus: Sequence[int], ua: Sequence[int],
+                     arguments: Sequence[int] = DETAIL_ARGUMENTS, suffix: str = DEFAULT_SUFFIX,
+                     random_values: Optional[Sequence[float]] = None,
+                     timestamps: Optional[Tuple[int, int]] = None) -> str:
+    """
+    使用预先计算好的后缀和User-Agent摘要生成签名，只对查询字符串做摘要
+
+    Args:
+        query: 已编码的查询字符串
+        cus: suffix_hash()的结果
+        ua: user_agent_hash()的结果
+        arguments: 签名参数，评论列表为(0, 1, 14)，回复为(0, 1, 8)
+        suffix: 查询字符串后缀
+        random_values: 3个[0, 1)之间的随机数，默认随机生成
+        timestamps: (开始时间, 结束时间)毫秒时间戳，默认取当前时间
+
+    Returns:
+        str: a_bogus签名
+    """
+    start_time, end_time = timestamps if timestamps else (_now_ms(), _now_ms())
+    query_hash = sm3_sum(sm3_sum(query + suffix))
+    bb = _bb_codes(query_hash, cus, ua, arguments, start_time, end_time)
+    codes = generate_random_codes(random_values) + rc4_encrypt_codes(bb, _BB_SCHEDULE)
+    return result_encrypt_codes(codes, "s4") + "="
+
+def sign(query: str, user_agent: str, arguments: Sequence[int] = DETAIL_ARGUMENTS,
+         random_values: Optional[Sequence[float]] = None,
+         timestamps: Optional[Tuple[int, int]] = None) -> str:
+    """对应douyin.js中的sign，后缀和User-Agent的摘要从缓存读取，只对查询字符串做摘要"""
+    arguments = tuple(arguments)
+    return sign_with_hashes(query, cached_suffix_hash(DEFAULT_SUFFIX), cached_user_agent_hash(user_agent, arguments),
+                            arguments, DEFAULT_SUFFIX, random_values, timestamps)
+
+def sign_datail(query: str, user_agent: str, **kwargs) -> str:
+    """生成评论列表接口签名"""
+    return sign(query, user_agent, DETAIL_ARGUMENTS, **kwargs)
+
+def sign_reply(query: str, user_agent: str, **kwargs) -> str:
+    """生成评论回复接口签名"""
+    return sign(query, user_agent, REPLY_ARGUMENTS, **kwargs)
+
+def sign_batch(queries: Sequence[str], user_agent: str,
+               arguments: Sequence[int] = DETAIL_ARGUMENTS) -> List[str]:
+    """
+    批量签名，后缀和User-Agent的摘要只计算一次
+
+    Args:
+        queries: 已编码的查询字符串列表
+        user_agent: 请求使用的User-Agent
+        arguments: 签名参数
+
+    Returns:
+        List[str]: 与queries一一对应的签名
+    """
+    arguments = tuple(arguments)
+    cus = cached_suffix_hash(DEFAULT_SUFFIX)
+    ua = cached_user_agent_hash(user_agent, arguments)
+    return [sign_with_hashes(query, cus, ua, arguments) for query in queries]
@@ -0,0 +1,285 @@
+"""
+多视频批量采集
+
+用法:
+    python batch.py videos.txt --replies
+    python batch.py 7400000000000000000 https://v.douyin.com/xxxx/ --per-account 3
+    python batch.py videos.txt --cookies cookies.txt
+    python batch.py videos.txt --delta --replies
+
+videos.txt每行一个视频ID或分享链接，#开头的行为注释；cookies.txt每行一个账号的Cookie，
+可以在Cookie后加一个制表符和该账号的最高请求速率（次/秒）。
+每个视频写入各自的 data/v1/<aweme_id>/ 目录，默认从断点继续，重复运行只会采集未完成的视频；
+--delta时对已采集的视频做增量刷新（见delta模块），适合定时刷新大量视频。
+"""
+import os
+import time
+import asyncio
+import argparse
+from loguru import logger
+from typing import Dict, Iterable, List, Optional
+
+from main import crawl_to_csv_async, load_cookie, DEFAULT_REPLY_CONCURRENCY
+from checkpoint import CrawlCheckpoint
+from http_session import SessionManager
+from cookie_pool import CookiePool, read_cookies, INVALID_MARKERS
+from share_link import extract_video_id
+from delta import refresh_async
+
+DEFAULT_PER_ACCOUNT = 2  # 每个账号同时采集的视频数
+REPORT_INTERVAL = 30  # 汇总进度的间隔（秒）
+
+class BatchJob:
+    """批量采集中的一个视频"""
+
+    def __init__(self, aweme_id: str, source: str = ""):
+        self.aweme_id = aweme_id
+        self.source = source or aweme_id
+        self.status = "pending"  # pending / running / done / failed
+        self.error = None
+        self.save_path = None
+        self.checkpoint = CrawlCheckpoint(aweme_id)
+        self.attempts = 0  # 因账号不可用转交其他账号的次数
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def rows(self) -> int:
+        """已写入的评论和回复数（包括从断点恢复的部分）"""
+        return self.checkpoint.comment_count + self.checkpoint.reply_count
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+def read_sources(items: Iterable[str]) -> List[str]:
+    """展开参数中的文件，返回视频ID或分享链接列表"""
+    sources = []
+    for item in items:
+        if os.path.isfile(item):
+            with open(item, "r", encoding="utf-8") as f:
+                sources.extend(line.strip() for line in f if line.strip() and not line.strip().startswith("#"))
+        elif item.strip():
+            sources.append(item.strip())
+    return sources
+
+async def resolve_jobs(sources: Iterable[str]) -> List[BatchJob]:
+    """解析分享链接（短链接需要请求重定向，放到线程池中执行），去掉重复的视频"""
+    loop = asyncio.get_running_loop()
+    sources = list(sources)
+    video_ids = await asyncio.gather(*(loop.run_in_executor(None, extract_video_id, s) for s in sources))
+    jobs = {}
+    for source, aweme_id in zip(sources, video_ids):
+        if not aweme_id:
+            logger.error(f"无法解析视频链接: {source}")
+            continue
+        if aweme_id in jobs:
+            logger.warning(f"重复的视频 {aweme_id}，已跳过: {source}")
+            continue
+        jobs[aweme_id] = BatchJob(aweme_id, source)
+    return list(jobs.values())
+
+class BatchCrawler:
+    """
+    多视频批量采集引擎
+
+    所有视频放入同一个asyncio队列，采集协程从队列中取任务，再从CookiePool中按策略分配账号
+    （每个账号同时采集的视频数不超过per_account）。一个视频在分页间隔等待时其他视频的请求
+    可以继续发出；同一账号的评论分页和回复请求共用该账号的RateController，总请求速率不会因为
+    同时采集多个视频而翻倍。被隔离或失效的账号不再分配新任务，失效账号上的任务交给其他账号。
+    """
+
+    def __init__(self, cookies: Optional[List[str]] = None, per_account: int = DEFAULT_PER_ACCOUNT,
+                 get_replies: bool = False, resume: bool = True,
+                 reply_concurrency: int = DEFAULT_REPLY_CONCURRENCY, rate_options: Optional[Dict] = None,
+                 account_rate_options: Optional[List[Dict]] = None, report_interval: float = REPORT_INTERVAL,
+                 strategy: str = "least_loaded", pool: Optional[CookiePool] = None, delta: bool = False):
+        """
+        Args:
+            cookies: 账号Cookie列表，不传时使用load_cookie加载的单个账号
+            per_account: 每个账号同时采集的视频数
+            get_replies: 是否获取回复
+            resume: 是否从各视频的断点继续
+            reply_concurrency: 每个账号同时进行的回复请求数
+            rate_options: 所有账号的RateController参数（rate、min_rate、max_rate等）
+            account_rate_options: 按账号顺序覆盖rate_options的参数
+            report_interval: 汇总进度的间隔（秒）
+            strategy: 账号分配策略，round_robin 或 least_loaded
+            pool: 已有的CookiePool，传入时忽略cookies和限速参数
+            delta: 是否增量刷新已采集的视频，没有已采集数据的视频仍完整采集
+        """
+        self.pool = pool or CookiePool(
+            cookies or [load_cookie()], strategy=strategy, max_in_flight=per_account,
+            rate_options=rate_options, account_rate_options=account_rate_options
+        )
+        self.per_account = self.pool.max_in_flight
+        self.get_replies = get_replies
+        self.resume = resume
+        self.reply_concurrency = reply_concurrency
+        self.report_interval = report_interval
+        self.delta = delta
+        self.jobs: List[BatchJob] = []
+        self.started_at = None
+
+    async def _worker(self, queue: asyncio.Queue, session: SessionManager):
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                account = await self.pool.acquire_async()
+            except ValueError as e:
+                # 所有账号都已失效
+                job.status = "failed"
+                job.error = str(e)
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            logger.info(f"[{account.name}] 开始采集视频 {job.aweme_id}")
+            try:
+                if self.delta:
+                    result = await refresh_async(
+                        job.aweme_id, get_replies=self.get_replies, session=session, cookie=account.cookie,
+                        checkpoint=job.checkpoint, rate_controller=account.controller,
+                        concurrency=self.reply_concurrency
+                    )
+                    job.save_path = result["save_path"]
+                else:
+                    job.save_path = await crawl_to_csv_async(
+                        job.aweme_id, get_replies=self.get_replies, resume=self.resume,
+                        session=session, cookie=account.cookie, checkpoint=job.checkpoint,
+                        rate_controller=account.controller, concurrency=self.reply_concurrency
+                    )
+                job.status = "done"
+                logger.info(f"[{account.name}] 视频 {job.aweme_id} 采集完成，共 {job.rows} 条")
+            except Exception as e:
+                error_msg = str(e)
+                # 每次请求的退避已经由账号的限速器计入健康统计，这里只处理Cookie失效，
+                # 视频不存在、本地IO错误等与账号无关的失败不影响账号
+                if any(marker in error_msg for marker in INVALID_MARKERS):
+                    self.pool.report_failure(account, error_msg)
+                if not account.available and job.attempts < len(self.pool):
+                    # 账号失效或被隔离，任务从断点交给其他账号继续
+                    logger.warning(f"[{account.name}] 账号不可用，视频 {job.aweme_id} 交给其他账号继续采集")
+                    job.attempts += 1
+                    job.status = "pending"
+                    job.started_at = None
+                    queue.put_nowait(job)
+                else:
+                    job.status = "failed"
+                    job.error = error_msg
+                    logger.error(f"[{account.name}] 视频 {job.aweme_id} 采集失败: {error_msg}")
+            finally:
+                self.pool.release(account)
+                if job.status != "pending":
+                    job.finished_at = time.time()
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(self.progress_text())
+
+    def progress_text(self) -> str:
+        """汇总进度：完成数、采集中、总行数、整体速率和各账号状态"""
+        counts = {status: 0 for status in ("pending", "running", "done", "failed")}
+        for job in self.jobs:
+            counts[job.status] += 1
+        rows = sum(job.rows for job in self.jobs)
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        rate = rows / elapsed if elapsed > 0 else 0
+        accounts = "，".join(
+            f"{a['name']} {a['status']} {a['rate']:.2f}次/秒 健康{a['health']:.2f}" for a in self.pool.stats()
+        )
+        return (f"批量进度 - 完成 {counts['done']}/{len(self.jobs)}，采集中 {counts['running']}，"
+                f"失败 {counts['failed']}，共 {rows} 条，速率 {rate:.2f} 条/秒；{accounts}")
+
+    async def run(self, sources: Iterable[str]) -> List[BatchJob]:
+        """
+        采集全部视频
+
+        Args:
+            sources: 视频ID或分享链接
+
+        Returns:
+            List[BatchJob]: 每个视频的采集结果
+        """
+        self.jobs = await resolve_jobs(sources)
+        if not self.jobs:
+            logger.error("没有可采集的视频")
+            return []
+        queue = asyncio.Queue()
+        for job in self.jobs:
+            queue.put_nowait(job)
+
+        self.started_at = time.time()
+        logger.info(f"开始批量采集 {len(self.jobs)} 个视频，{len(self.pool)} 个账号，每个账号并发 {self.per_account}")
+        reporter = asyncio.create_task(self._report_loop())
+        try:
+            async with SessionManager() as session:
+                workers = [
+                    asyncio.create_task(self._worker(queue, session))
+                    for _ in range(min(len(self.jobs), len(self.pool) * self.per_account))
+                ]
+                await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+
+        for job in self.jobs:
+            if job.status == "pending":
+                job.status = "failed"
+                job.error = "没有可用的账号"
+        return self.jobs
+
+    def summary(self) -> str:
+        """每个视频的结果和整体吞吐量"""
+        wall = time.time() - self.started_at if self.started_at else 0
+        lines = [f"{'视频ID':<22}{'状态':<8}{'条数':>8}{'用时(秒)':>10}  说明"]
+        for job in self.jobs:
+            note = job.error or job.save_path or ""
+            lines.append(f"{job.aweme_id:<22}{job.status:<8}{job.rows:>8}{job.elapsed:>10.1f}  {note}")
+        rows = sum(job.rows for job in self.jobs)
+        busy = sum(job.elapsed for job in self.jobs)
+        lines.append(
+            f"共 {len(self.jobs)} 个视频，{rows} 条，总用时 {wall:.1f} 秒，"
+            f"平均 {rows / wall if wall > 0 else 0:.2f} 条/秒，并行度 {busy / wall if wall > 0 else 0:.2f}"
+        )
+        return "\n".join(lines)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="抖音评论批量采集")
+    parser.add_argument("sources", nargs="+", help="视频ID、分享链接，或每行一个的列表文件")
+    parser.add_argument("--replies", action="store_true", help="同时获取评论的回复")
+    parser.add_argument("--cookies", help="每行一个账号Cookie的文件，不传时使用DOUYIN_COOKIE或cookie.txt")
+    parser.add_argument("--per-account", type=int, default=DEFAULT_PER_ACCOUNT, help="每个账号同时采集的视频数")
+    parser.add_argument("--strategy", choices=["least_loaded", "round_robin"], default="least_loaded", help="账号分配策略")
+    parser.add_argument("--rate", type=float, default=0.5, help="每个账号的初始请求速率（次/秒）")
+    parser.add_argument("--min-rate", type=float, default=0.1, help="出现限流时最低降到的请求速率")
+    parser.add_argument("--max-rate", type=float, default=4.0, help="响应正常时最高升到的请求速率")
+    parser.add_argument("--no-resume", action="store_true", help="忽略断点，全部重新采集")
+    parser.add_argument("--delta", action="store_true", help="增量刷新已采集的视频，只获取新评论和变化的计数")
+    return parser.parse_args()
+
+async def main_async(args):
+    cookies, account_rate_options = read_cookies(args.cookies) if args.cookies else (None, None)
+    crawler = BatchCrawler(
+        cookies=cookies,
+        per_account=args.per_account,
+        get_replies=args.replies,
+        resume=not args.no_resume,
+        rate_options={"rate": args.rate, "min_rate": args.min_rate, "max_rate": args.max_rate},
+        account_rate_options=account_rate_options,
+        strategy=args.strategy,
+        delta=args.delta,
+    )
+    await crawler.run(read_sources(args.sources))
+    print(crawler.summary())
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main_async(parse_args()))
+    except Exception as e:
+        logger.error(f"批量采集出错: {str(e)}")
@@ -0,0 +1,437 @@
+"""
+性能基准测试脚本
+
+用法:
+    python benchmark.py sign [-n 200]
+    python benchmark.py session [-n 50] [--latency 0.005]
+    python benchmark.py dedup [--sizes 10000 100000 1000000]
+    python benchmark.py common [-n 2000]
+    python benchmark.py signer [--crawls 8] [--pages 50] [--workers 4]
+    python benchmark.py process [--sizes 10000 100000 1000000]
+    python benchmark.py crawl [--comments 2000] [--replies 2] [--scenarios clean latency errors duplicates]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from loguru import logger
+
+# 基准测试使用的示例查询字符串和User-Agent
+SAMPLE_QUERY = (
+    "aid=6383&aweme_id=7456965026184809728&browser_language=zh-CN&browser_name=Chrome"
+    "&browser_online=true&browser_platform=Win32&browser_version=126.0.0.0&channel=channel_pc_web"
+    "&cookie_enabled=true&count=20&cpu_core_num=24&cursor=0&device_memory=8&device_platform=webapp"
+    "&downlink=10&effective_type=4g&engine_name=Blink&engine_version=126.0.0.0&item_type=0"
+    "&os_name=Windows&os_version=10&pc_client_type=1&platform=PC&round_trip_time=50"
+    "&screen_height=1440&screen_width=2560&update_version_code=170400&version_code=190500"
+    "&version_name=19.5.0&webid=7362810250930783783"
+)
+SAMPLE_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
+
+def report(name, count, elapsed):
+    """输出一项测试结果"""
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"{name:<24} {count:>8} 次  {elapsed:>8.3f} 秒  {rate:>10.1f} 次/秒")
+    return rate
+
+def bench_sign(args):
+    """对比各签名后端每秒可生成的签名数"""
+    from sign_engine import create_sign_engine
+
+    results = {}
+    for backend in args.backends:
+        engine = create_sign_engine(backend)
+        try:
+            # 预热，排除进程启动时间
+            engine.sign_datail(SAMPLE_QUERY, SAMPLE_UA)
+            count = args.number if backend != "execjs" else max(1, args.number // 10)
+            start = time.perf_counter()
+            for i in range(count):
+                engine.sign_datail(f"{SAMPLE_QUERY}&cursor={i}", SAMPLE_UA)
+            results[backend] = report(f"sign[{backend}]", count, time.perf_counter() - start)
+        finally:
+            engine.close()
+
+    if "python" in args.backends:
+        import abogus
+        queries = [f"{SAMPLE_QUERY}&cursor={i}" for i in range(args.number)]
+        start = time.perf_counter()
+        abogus.sign_batch(queries, SAMPLE_UA)
+        results["python-batch"] = report("sign_batch[python]", len(queries), time.perf_counter() - start)
+        stats = abogus.cache_info()
+        print(f"签名缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次")
+
+    if "execjs" in results and len(results) > 1:
+        base = results["execjs"]
+        for backend, rate in results.items():
+            if backend != "execjs" and base > 0:
+                print(f"{backend} 相对 execjs 提速: {rate / base:.1f}x")
+
+def use_mock_host(host):
+    """让采集模块把请求发往本地模拟服务器"""
+    os.environ["DOUYIN_HOST"] = host
+    import fetch_comments
+    import fetch_replies
+    fetch_comments.url = f"{host}/aweme/v1/web/comment/list/"
+    fetch_replies.url = f"{host}/aweme/v1/web/comment/list/reply/"
+    return fetch_comments, fetch_replies
+
+def bench_session(args):
+    """对比每页新建客户端与复用SessionManager连接池的单页延迟"""
+    from mock_server import MockDouyinServer
+    from http_session import SessionManager
+
+    with MockDouyinServer(total_comments=args.number * 20, latency=args.latency) as server:
+        fetch_comments, _ = use_mock_host(server.url)
+        cookie = "s_v_web_id=verify_benchmark"
+
+        async def run(client):
+            latencies = []
+            for i in range(args.number):
+                start = time.perf_counter()
+                await fetch_comments.fetch_comments("7456965026184809728", cookie, str(i * 20), "20", client=client)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        async def run_pooled():
+            async with SessionManager(http2=False) as session:
+                return await run(session.get_client(cookie))
+
+        results = {"每页新建客户端": asyncio.run(run(None)), "SessionManager复用": asyncio.run(run_pooled())}
+        for name, latencies in results.items():
+            latencies.sort()
+            avg = sum(latencies) / len(latencies)
+            p50 = latencies[len(latencies) // 2]
+            print(f"{name:<16} 平均 {avg * 1000:>7.2f} ms/页  p50 {p50 * 1000:>7.2f} ms")
+
+def bench_dedup(args):
+    """对比每页重建集合与增量去重索引（普通/紧凑）的耗时和内存"""
+    import tracemalloc
+    from dedup import DedupIndex
+
+    page_size = 20
+    for size in args.sizes:
+        pages = [[{"cid": str(7400000000000000000 + i)} for i in range(start, min(start + page_size, size))]
+                 for start in range(0, size, page_size)]
+        print(f"--- {size} 条评论，每页 {page_size} 条 ---")
+
+        if size <= args.rebuild_limit:
+            # 改造前：每页都从已有评论重建ID集合
+            all_comments = []
+            start = time.perf_counter()
+            for page in pages:
+                existing = set(c["cid"] for c in all_comments)
+                all_comments.extend(c for c in page if c["cid"] not in existing)
+            report("每页重建集合", size, time.perf_counter() - start)
+        else:
+            print(f"{'每页重建集合':<24} 跳过（O(n^2)，超过 --rebuild-limit）")
+
+        for compact in (False, True):
+            index = DedupIndex(compact=compact)
+            start = time.perf_counter()
+            for page in pages:
+                index.filter_new(page)
+            report("DedupIndex(紧凑)" if compact else "DedupIndex", size, time.perf_counter() - start)
+            # tracemalloc会显著拖慢分配，内存单独再构建一次测量
+            del index
+            tracemalloc.start()
+            index = DedupIndex(compact=compact)
+            for page in pages:
+                index.filter_new(page)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del index
+            print(f"{'':<24} 索引内存约 {memory / 1024 / 1024:.1f} MB")
+
+def bench_common(args):
+    """对比每次重新处理（common_uncached）与按Cookie缓存的RequestContext每秒可处理的请求数"""
+    import common
+
+    cookie = "s_v_web_id=verify_benchmark; dy_swidth=2560; dy_sheight=1440; device_web_cpu_core=24; " \
+             "device_web_memory_size=8; " + "; ".join(f"k{i}=v{i}" for i in range(40))
+    uri = f"{common.HOST}/aweme/v1/web/comment/list/"
+
+    def page_params(i):
+        return {"aweme_id": "7456965026184809728", "cursor": str(i * 20), "count": "20", "item_type": 0}
+
+    for with_sign in (False, True):
+        original_call = common.DOUYIN_SIGN.call
+        if not with_sign:
+            # 只测参数处理，签名替换为空操作
+            common.DOUYIN_SIGN.call = lambda name, query, ua: "x"
+        try:
+            suffix = "含签名" if with_sign else "不含签名"
+            start = time.perf_counter()
+            for i in range(args.number):
+                common.common_uncached(uri, page_params(i), {"cookie": cookie})
+            before = report(f"改造前[{suffix}]", args.number, time.perf_counter() - start)
+
+            common.clear_request_contexts()
+            start = time.perf_counter()
+            for i in range(args.number):
+                common.common(uri, page_params(i), {"cookie": cookie})
+            after = report(f"RequestContext[{suffix}]", args.number, time.perf_counter() - start)
+            print(f"{'':<24} 提速 {after / before:.1f}x")
+        finally:
+            common.DOUYIN_SIGN.call = original_call
+
+def bench_signer(args):
+    """多个并发采集协程同时签名：同步签名（阻塞事件循环）与异步签名工作池对比总耗时和事件循环最大延迟"""
+    from sign_engine import AsyncSigner, create_sign_engine
+
+    async def ticker(stop, lags):
+        # 每1毫秒醒来一次，记录实际醒来的延迟，反映事件循环被阻塞的程度
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def run(sign):
+        async def crawl(index):
+            for page in range(args.pages):
+                await sign(f"{SAMPLE_QUERY}&cursor={index * 1000 + page}")
+                await asyncio.sleep(args.io)  # 模拟网络请求
+        stop, lags = asyncio.Event(), []
+        lag_task = asyncio.create_task(ticker(stop, lags))
+        start = time.perf_counter()
+        await asyncio.gather(*(crawl(i) for i in range(args.crawls)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await lag_task
+        return elapsed, max(lags) if lags else 0.0
+
+    total = args.crawls * args.pages
+    engine = create_sign_engine(args.backend)
+    engine.sign_datail(SAMPLE_QUERY, SAMPLE_UA)
+
+    async def sign_blocking(query):
+        engine.sign_datail(query, SAMPLE_UA)
+
+    elapsed, lag = asyncio.run(run(sign_blocking))
+    report("同步签名", total, elapsed)
+    print(f"{'':<24} 事件循环最大延迟 {lag * 1000:.1f} ms")
+    engine.close()
+
+    for mode in args.modes:
+        signer = AsyncSigner(args.backend, args.workers, mode)
+        try:
+            # 预热，排除工作进程启动时间
+            asyncio.run(signer.sign(SAMPLE_QUERY, SAMPLE_UA))
+            elapsed, lag = asyncio.run(run(lambda query: signer.sign(query, SAMPLE_UA)))
+            report(f"sign_async[{mode} x{signer.workers}]", total, elapsed)
+            print(f"{'':<24} 事件循环最大延迟 {lag * 1000:.1f} ms")
+        finally:
+            signer.close()
+
+def bench_process(args):
+    """对比逐行处理（project_rows + DataFrame）与列式处理（project_frame）的耗时"""
+    import pandas as pd
+    from main import project_rows, project_frame
+    from mock_server import make_comment
+
+    for size in args.sizes:
+        comments = [make_comment("7456965026184809728", i, i % 4) for i in range(size)]
+        print(f"--- {size} 条评论 ---")
+        start = time.perf_counter()
+        rows, _ = project_rows(comments)
+        expected = pd.DataFrame(rows)
+        before = report("逐行处理", size, time.perf_counter() - start)
+        del rows
+
+        start = time.perf_counter()
+        frame, _ = project_frame(comments)
+        after = report("列式处理", size, time.perf_counter() - start)
+        pd.testing.assert_frame_equal(frame, expected)
+        print(f"{'':<24} 提速 {after / before:.1f}x，结果一致")
+
+# 端到端采集测试的故障场景（模拟服务器参数）
+CRAWL_SCENARIOS = {
+    "clean": {},
+    "latency": {"latency": 0.02, "jitter": 0.03},
+    "rtt": {"latency": 0.15, "jitter": 0.05},
+    "errors": {"error_rate": 0.05},
+    "duplicates": {"duplicate_rate": 0.02},
+}
+
+def percentile(values, q):
+    """已排序列表的分位数"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 / 1024
+    except ImportError:
+        return None
+
+def run_crawl_scenario(options):
+    """
+    在本地模拟服务器上完整跑一遍 fetch_all_comments、fetch_all_replies_async 和 process_comments
+
+    在独立的子进程中运行，峰值内存只反映本场景。
+    """
+    logger.remove()
+    from mock_server import MockDouyinServer
+    from http_session import SessionManager
+    from rate_limit import RateLimiter
+    from dedup import DedupIndex
+
+    aweme_id = "7456965026184809728"
+    cookie = "s_v_web_id=verify_benchmark"
+    os.environ["DOUYIN_COOKIE"] = cookie
+    server = MockDouyinServer(
+        total_comments=options["comments"], replies_per_comment=options["replies"], seed=options["seed"],
+        **CRAWL_SCENARIOS[options["scenario"]]
+    ).start()
+    try:
+        fetch_comments, fetch_replies = use_mock_host(server.url)
+        import main
+
+        page_latencies = {"comment": [], "reply": []}
+
+        def timed(func, kind):
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    page_latencies[kind].append(time.perf_counter() - start)
+            return wrapper
+
+        fetch_comments.fetch_comments = timed(fetch_comments.fetch_comments, "comment")
+        fetch_replies.fetch_reply_page = timed(fetch_replies.fetch_reply_page, "reply")
+
+        async def crawl():
+            dedup = DedupIndex()
+            limiter = RateLimiter(options["rate"], burst=options["concurrency"])
+            async with SessionManager(http2=False) as session:
+                start = time.perf_counter()
+                comments = await fetch_comments.fetch_all_comments(
+                    aweme_id, cookie, use_batch_mode=False, client=session.get_client(cookie),
+                    dedup=dedup, rate_controller=limiter, prefetch=options["prefetch"]
+                )
+                comment_time = time.perf_counter() - start
+                replies = []
+                if options["replies"]:
+                    replies = await main.fetch_all_replies_async(
+                        comments, session, concurrency=options["concurrency"], rate_limiter=limiter, dedup=dedup
+                    )
+                reply_time = time.perf_counter() - start - comment_time
+            return comments, replies, comment_time, reply_time
+
+        comments, replies, comment_time, reply_time = asyncio.run(crawl())
+        start = time.perf_counter()
+        comments_df = main.process_comments(comments)
+        main.process_replies(replies, comments_df)
+        process_time = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    return {
+        "comments": len(comments),
+        "replies": len(replies),
+        "expected": options["comments"] * (1 + options["replies"]),
+        "comment_time": comment_time,
+        "reply_time": reply_time,
+        "process_time": process_time,
+        "latencies": {kind: sorted(values) for kind, values in page_latencies.items()},
+        "server": server.stats,
+        "peak_rss": peak_rss_mb(),
+    }
+
+def bench_crawl(args):
+    """端到端采集：各故障场景下的评论吞吐量、分页延迟分位数和峰值内存"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    for scenario in args.scenarios:
+        if scenario not in CRAWL_SCENARIOS:
+            raise ValueError(f"未知的场景: {scenario}，可选: {', '.join(CRAWL_SCENARIOS)}")
+        options = {
+            "scenario": scenario, "comments": args.comments, "replies": args.replies,
+            "concurrency": args.concurrency, "rate": args.rate, "seed": args.seed, "prefetch": args.prefetch,
+        }
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(run_crawl_scenario, options).result()
+
+        rows = result["comments"] + result["replies"]
+        total_time = result["comment_time"] + result["reply_time"] + result["process_time"]
+        server = result["server"]
+        print(f"[{scenario}] 评论 {result['comments']} 条，回复 {result['replies']} 条，"
+              f"完整率 {rows / result['expected'] * 100:.1f}%（服务端请求 {server['requests']} 次，"
+              f"注入错误 {server['errors']} 次，重复页 {server['duplicates']} 次）")
+        print(f"{'':<4}评论 {result['comments'] / result['comment_time']:.1f} 条/秒，"
+              f"总计 {rows / total_time:.1f} 条/秒（评论 {result['comment_time']:.2f} 秒，"
+              f"回复 {result['reply_time']:.2f} 秒，处理 {result['process_time']:.3f} 秒）")
+        for kind, name in (("comment", "评论页"), ("reply", "回复页")):
+            latencies = result["latencies"][kind]
+            if latencies:
+                print(f"{'':<4}{name}延迟 p50 {percentile(latencies, 0.5) * 1000:.1f} ms  "
+                      f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms（{len(latencies)} 页）")
+        if result["peak_rss"] is not None:
+            print(f"{'':<4}峰值内存 {result['peak_rss']:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="抖音评论采集性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sign_parser = subparsers.add_parser("sign", help="签名后端吞吐量")
+    sign_parser.add_argument("-n", "--number", type=int, default=200, help="签名次数（execjs为其1/10）")
+    sign_parser.add_argument("--backends", nargs="+", default=["execjs", "node", "python"], help="参与对比的签名后端")
+    sign_parser.set_defaults(func=bench_sign)
+
+    session_parser = subparsers.add_parser("session", help="HTTP会话复用前后的单页延迟（本地模拟服务器）")
+    session_parser.add_argument("-n", "--number", type=int, default=50, help="请求页数")
+    session_parser.add_argument("--latency", type=float, default=0.005, help="模拟服务器每个请求的延迟（秒）")
+    session_parser.set_defaults(func=bench_session)
+
+    dedup_parser = subparsers.add_parser("dedup", help="评论去重索引在不同规模下的耗时和内存")
+    dedup_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="评论数量")
+    dedup_parser.add_argument("--rebuild-limit", type=int, default=20000, help="改造前算法只在该规模以内运行")
+    dedup_parser.set_defaults(func=bench_dedup)
+
+    common_parser = subparsers.add_parser("common", help="common()请求参数处理每秒次数（改造前后）")
+    common_parser.add_argument("-n", "--number", type=int, default=2000, help="处理次数")
+    common_parser.set_defaults(func=bench_common)
+
+    signer_parser = subparsers.add_parser("signer", help="并发采集时同步签名与异步签名工作池对比")
+    signer_parser.add_argument("--crawls", type=int, default=8, help="并发采集协程数")
+    signer_parser.add_argument("--pages", type=int, default=50, help="每个协程的页数")
+    signer_parser.add_argument("--io", type=float, default=0.002, help="每页模拟的网络耗时（秒）")
+    signer_parser.add_argument("--workers", type=int, default=None, help="签名工作线程/进程数")
+    signer_parser.add_argument("--backend", default="python", help="签名后端")
+    signer_parser.add_argument("--modes", nargs="+", default=["thread", "process"], help="参与对比的工作池模式")
+    signer_parser.set_defaults(func=bench_signer)
+
+    process_parser = subparsers.add_parser("process", help="评论处理（逐行与列式）在不同规模下的耗时")
+    process_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="评论数量")
+    process_parser.set_defaults(func=bench_process)
+
+    crawl_parser = subparsers.add_parser("crawl", help="本地模拟服务器上的端到端采集（吞吐量、分页延迟、峰值内存）")
+    crawl_parser.add_argument("--comments", type=int, default=2000, help="评论总数")
+    crawl_parser.add_argument("--replies", type=int, default=2, help="每条评论的回复数")
+    crawl_parser.add_argument("--concurrency", type=int, default=10, help="回复请求并发数")
+    crawl_parser.add_argument("--rate", type=float, default=1000, help="每秒最多请求数")
+    crawl_parser.add_argument("--seed", type=int, default=1, help="故障注入的随机种子")
+    crawl_parser.add_argument("--prefetch", type=int, default=0, help="评论分页预取页数")
+    crawl_parser.add_argument("--scenarios", nargs="+", default=list(CRAWL_SCENARIOS), help="参与测试的场景")
+    crawl_parser.set_defaults(func=bench_crawl)
+
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
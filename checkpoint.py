@@ -0,0 +1,196 @@
+import os
+import json
+import time
+from loguru import logger
+from typing import Iterable, List
+
+CHECKPOINT_VERSION = 1
+
+class CrawlCheckpoint:
+    """
+    采集断点，保存在 data/v1/<aweme_id>/ 目录下
+
+    - checkpoint.json: 当前cursor、评论/回复进度和各文件的已提交大小，每页原子替换
+    - seen_ids.txt: 已采集的评论/回复ID，每页追加
+    - reply_targets.jsonl: 有回复的评论（aweme_id、cid、reply_comment_total），每页追加
+    - replies_done.txt: 已获取完回复的评论ID，每条评论追加
+
+    checkpoint.json 是提交点：恢复时追加文件和输出文件都截断到其中记录的大小，
+    提交之后才写入的半页数据会被丢弃并重新采集，不会产生重复行。
+    """
+
+    def __init__(self, aweme_id: str, base_dir: str = "data/v1"):
+        self.aweme_id = str(aweme_id)
+        self.directory = os.path.join(base_dir, self.aweme_id)
+        self.state_path = os.path.join(self.directory, "checkpoint.json")
+        self.ids_path = os.path.join(self.directory, "seen_ids.txt")
+        self.targets_path = os.path.join(self.directory, "reply_targets.jsonl")
+        self.replies_done_path = os.path.join(self.directory, "replies_done.txt")
+        self.cursor = "0"
+        self.comment_count = 0
+        self.reply_count = 0
+        self.comments_done = False
+        self.finished = False
+        self.output_size = 0
+        self._files = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.state_path)
+
+    def load(self) -> bool:
+        """读取断点，返回是否存在可用的断点"""
+        if not self.exists():
+            return False
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取断点失败: {str(e)}，将重新采集")
+            return False
+        if state.get("version") != CHECKPOINT_VERSION or state.get("aweme_id") != self.aweme_id:
+            logger.warning("断点文件版本或视频ID不匹配，将重新采集")
+            return False
+        self.cursor = str(state.get("cursor", "0"))
+        self.comment_count = int(state.get("comment_count", 0))
+        self.reply_count = int(state.get("reply_count", 0))
+        self.comments_done = bool(state.get("comments_done", False))
+        self.finished = bool(state.get("finished", False))
+        self.output_size = int(state.get("output_size", 0))
+        # 丢弃最后一次提交之后写入的内容
+        sizes = state.get("sizes", {})
+        for path in (self.ids_path, self.targets_path, self.replies_done_path):
+            self._truncate(path, int(sizes.get(os.path.basename(path), 0)))
+        logger.info(f"已加载断点: cursor={self.cursor}，评论 {self.comment_count} 条，回复 {self.reply_count} 条")
+        return True
+
+    def reset(self):
+        """删除断点，重新开始采集"""
+        self.close()
+        for path in (self.state_path, self.ids_path, self.targets_path, self.replies_done_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.cursor = "0"
+        self.comment_count = 0
+        self.reply_count = 0
+        self.comments_done = False
+        self.finished = False
+        self.output_size = 0
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        if not os.path.exists(path):
+            return
+        if os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def restore_output(self, path: str):
+        """把输出文件截断到最后一次提交时的大小"""
+        self._truncate(path, self.output_size)
+
+    def _append(self, path: str, lines: Iterable[str]):
+        f = self._files.get(path)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(path, "a", encoding="utf-8", newline="\n")
+            self._files[path] = f
+        f.writelines(line + "\n" for line in lines)
+        f.flush()
+
+    def _size(self, path: str) -> int:
+        f = self._files.get(path)
+        if f is not None:
+            return f.tell()
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def save(self):
+        """原子写入checkpoint.json"""
+        os.makedirs(self.directory, exist_ok=True)
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "aweme_id": self.aweme_id,
+            "cursor": self.cursor,
+            "comment_count": self.comment_count,
+            "reply_count": self.reply_count,
+            "comments_done": self.comments_done,
+            "finished": self.finished,
+            "output_size": self.output_size,
+            "sizes": {
+                os.path.basename(path): self._size(path)
+                for path in (self.ids_path, self.targets_path, self.replies_done_path)
+            },
+            "updated_at": int(time.time()),
+        }
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def load_dedup(self, dedup):
+        """把已采集的ID载入去重索引"""
+        if not os.path.exists(self.ids_path):
+            return
+        with open(self.ids_path, "r", encoding="utf-8") as f:
+            dedup.update(line.rstrip("\n") for line in f if line.strip())
+
+    def load_reply_targets(self) -> List[dict]:
+        """读取尚未获取回复的评论"""
+        done = set()
+        if os.path.exists(self.replies_done_path):
+            with open(self.replies_done_path, "r", encoding="utf-8") as f:
+                done = {line.rstrip("\n") for line in f if line.strip()}
+        targets = []
+        if os.path.exists(self.targets_path):
+            with open(self.targets_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    target = json.loads(line)
+                    if str(target.get("cid", "")) not in done:
+                        targets.append(target)
+        return targets
+
+    def commit_comments(self, comments: List[dict], reply_targets: List[dict], cursor: str, output_size: int):
+        """
+        提交一页评论
+
+        Args:
+            comments: 本页已写入输出文件的评论
+            reply_targets: 本页中有回复的评论
+            cursor: 下一页的cursor
+            output_size: 输出文件当前大小
+        """
+        self._append(self.ids_path, (str(c["cid"]) for c in comments))
+        if reply_targets:
+            self._append(self.targets_path, (json.dumps(t, ensure_ascii=False) for t in reply_targets))
+        self.cursor = str(cursor)
+        self.comment_count += len(comments)
+        self.output_size = output_size
+        self.save()
+
+    def commit_replies(self, comment_id: str, replies: List[dict], output_size: int):
+        """提交一条评论的全部回复"""
+        self._append(self.ids_path, (str(r["cid"]) for r in replies))
+        self._append(self.replies_done_path, [str(comment_id)])
+        self.reply_count += len(replies)
+        self.output_size = output_size
+        self.save()
+
+    def mark_comments_done(self):
+        self.comments_done = True
+        self.save()
+
+    def mark_finished(self):
+        self.finished = True
+        self.save()
+
+    def close(self):
+        files, self._files = list(self._files.values()), {}
+        for f in files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,16 +1,19 @@
+import os
+import asyncio
 import requests
-import execjs
 import urllib.parse
 import re
 import random
 import cookiesparser
-import platform
+import threading
+from collections import OrderedDict
 from loguru import logger
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Tuple
 from retry import retry
+from sign_engine import create_sign_engine, sign_async, SignEngineError
 
-# 常量定义
-HOST = 'https://www.douyin.com'
+# 常量定义（可通过环境变量DOUYIN_HOST指向本地模拟服务器）
+HOST = os.getenv('DOUYIN_HOST', 'https://www.douyin.com')
 
 # 通用请求参数
 COMMON_PARAMS = {
@@ -59,26 +62,18 @@ COMMON_HEADERS = {
     "dnt": "1",
 }
 
-# 根据操作系统选择不同的Node.js运行时配置
-if platform.system() == 'Windows':
-    node_path = r'C:\Program Files\nodejs\node.exe'  # Windows默认Node.js路径
-    execjs.register('Node', {'runtime_path': node_path})
-else:
-    node_path = '/usr/local/bin/node'  # Mac默认Node.js路径
-    execjs.register('Node', {'runtime_path': node_path})
-
 try:
-    # 加载签名脚本
-    with open('douyin.js', 'r', encoding='utf-8') as f:
-        js_code = f.read()
-        # 处理可能的编码问题
-        js_code = js_code.replace('\ufeff', '')  # 移除BOM
-        js_code = js_code.encode('utf-8').decode('utf-8-sig')  # 处理编码
-    DOUYIN_SIGN = execjs.compile(js_code)
+    # 加载签名引擎（默认使用纯Python签名，可通过DOUYIN_SIGN_BACKEND切换为node或execjs）
+    DOUYIN_SIGN = create_sign_engine()
     logger.success("成功加载签名脚本")
 except Exception as e:
-    logger.error(f"加载签名脚本失败: {str(e)}")
-    raise
+    logger.warning(f"签名引擎启动失败: {str(e)}，改用execjs")
+    try:
+        DOUYIN_SIGN = create_sign_engine("execjs")
+        logger.success("成功加载签名脚本")
+    except Exception as e:
+        logger.error(f"加载签名脚本失败: {str(e)}")
+        raise
 
 @retry(tries=3, delay=2)
 def get_webid(headers: Dict) -> Optional[str]:
@@ -181,10 +176,174 @@ def get_webid(params=None):
         logger.error(f"生成webid时出错: {str(e)}")
         return '7362810250930783783'  # 返回一个默认的webid
 
+def build_query(params: Dict) -> str:
+    """按参数名排序并编码查询字符串（值为None的参数跳过）"""
+    return '&'.join(f'{k}={urllib.parse.quote(str(v))}' for k, v in sorted(params.items()) if v is not None)
+
+def sign_query(uri: str, query: str, user_agent: str) -> str:
+    """根据URI选择签名函数并生成a_bogus"""
+    call_name = 'sign_reply' if 'reply' in uri else 'sign_datail'
+    try:
+        a_bogus = DOUYIN_SIGN.call(call_name, query, user_agent)
+        if not a_bogus:
+            raise ValueError("签名生成结果为空")
+        logger.debug(f"成功生成签名: {a_bogus[:20]}...")
+        return a_bogus
+    except SignEngineError as e:
+        logger.error(f"JavaScript运行时错误: {str(e)}")
+        raise ValueError(f"签名生成失败: {str(e)}")
+
+class RequestContext:
+    """
+    每个Cookie的请求上下文
+
+    Cookie只解析一次，msToken和webid在上下文内保持不变，通用参数、Cookie派生参数和请求头预先合并，
+    静态参数按名称排序并编码好。每页请求只需编码cursor/count等少量动态参数，
+    再与静态部分按名称归并成和逐个排序编码完全相同的查询字符串，然后签名。
+    """
+
+    def __init__(self, cookie: str, user_agent: Optional[str] = None):
+        self.cookie = cookie
+        cookie_dict = cookiesparser.parse(cookie)
+        static_params = dict(COMMON_PARAMS)
+        static_params['screen_width'] = cookie_dict.get('dy_swidth', 2560)
+        static_params['screen_height'] = cookie_dict.get('dy_sheight', 1440)
+        static_params['cpu_core_num'] = cookie_dict.get('device_web_cpu_core', 24)
+        static_params['device_memory'] = cookie_dict.get('device_web_memory_size', 8)
+        static_params['verifyFp'] = cookie_dict.get('s_v_web_id', None)
+        static_params['fp'] = cookie_dict.get('s_v_web_id', None)
+        static_params['msToken'] = get_ms_token()
+        static_params['webid'] = get_webid()
+        self.static_params = static_params
+        self.headers = dict(COMMON_HEADERS)
+        if user_agent:
+            self.headers["User-Agent"] = user_agent
+        self.user_agent = self.headers["User-Agent"]
+        # 排序后的 (参数名, 编码后的 "k=v")
+        self._static_items: List[Tuple[str, str]] = [
+            (k, f'{k}={urllib.parse.quote(str(v))}') for k, v in sorted(static_params.items()) if v is not None
+        ]
+
+    def build_query(self, params: Dict) -> str:
+        """合并动态参数与预编码的静态参数，结果与build_query(合并后的参数)相同"""
+        dynamic = sorted(
+            (k, f'{k}={urllib.parse.quote(str(v))}') for k, v in params.items() if v is not None
+        )
+        static = self._static_items
+        if any(k in self.static_params for k in params):
+            # 动态参数覆盖同名静态参数
+            static = [item for item in static if item[0] not in params]
+        parts = []
+        i = j = 0
+        while i < len(static) and j < len(dynamic):
+            if static[i][0] < dynamic[j][0]:
+                parts.append(static[i][1])
+                i += 1
+            else:
+                parts.append(dynamic[j][1])
+                j += 1
+        parts.extend(item[1] for item in static[i:])
+        parts.extend(item[1] for item in dynamic[j:])
+        return '&'.join(parts)
+
+    def _merge(self, params: Dict, headers: Optional[Dict], a_bogus: str) -> Tuple[Dict, Dict]:
+        merged = {**self.static_params, **params}
+        merged["X-Bogus"] = a_bogus
+        merged_headers = dict(headers) if headers else {}
+        merged_headers.update(self.headers)
+        merged_headers.setdefault("cookie", self.cookie)
+        return merged, merged_headers
+
+    def build(self, uri: str, params: Dict, headers: Optional[Dict] = None) -> Tuple[Dict, Dict]:
+        """生成一次请求的完整参数（含签名）和请求头"""
+        query = self.build_query(params)
+        return self._merge(params, headers, sign_query(uri, query, self.user_agent))
+
+    async def build_async(self, uri: str, params: Dict, headers: Optional[Dict] = None) -> Tuple[Dict, Dict]:
+        """同build，签名在签名工作池中执行，不阻塞事件循环"""
+        query = self.build_query(params)
+        try:
+            a_bogus = await sign_async(query, self.user_agent, "reply" if 'reply' in uri else "detail")
+        except SignEngineError as e:
+            logger.error(f"JavaScript运行时错误: {str(e)}")
+            raise ValueError(f"签名生成失败: {str(e)}")
+        if not a_bogus:
+            raise ValueError("签名生成结果为空")
+        return self._merge(params, headers, a_bogus)
+
+# 每个Cookie的请求上下文缓存
+REQUEST_CONTEXT_CACHE_SIZE = 64
+_request_contexts: "OrderedDict[Tuple[str, Optional[str]], RequestContext]" = OrderedDict()
+_request_contexts_lock = threading.Lock()
+
+def get_request_context(cookie: str, user_agent: Optional[str] = None) -> RequestContext:
+    """获取（必要时创建）Cookie对应的请求上下文，最多缓存REQUEST_CONTEXT_CACHE_SIZE个"""
+    key = (cookie, user_agent)
+    with _request_contexts_lock:
+        context = _request_contexts.get(key)
+        if context is not None:
+            _request_contexts.move_to_end(key)
+            return context
+    context = RequestContext(cookie, user_agent)
+    with _request_contexts_lock:
+        context = _request_contexts.setdefault(key, context)
+        while len(_request_contexts) > REQUEST_CONTEXT_CACHE_SIZE:
+            _request_contexts.popitem(last=False)
+    return context
+
+def clear_request_contexts():
+    """清空请求上下文缓存，下次请求重新生成msToken和webid"""
+    with _request_contexts_lock:
+        _request_contexts.clear()
+
 def common(uri: str, params: Dict, headers: Dict) -> Tuple[Dict, Dict]:
     """
     处理通用请求参数和头信息
     
+    带Cookie的请求使用按Cookie缓存的RequestContext，只编码本次请求的动态参数并签名。
+    
+    Args:
+        uri: 请求URI
+        params: 请求参数
+        headers: 请求头
+        
+    Returns:
+        Tuple[Dict, Dict]: 处理后的参数和头信息
+        
+    Raises:
+        Exception: 处理过程中的错误
+    """
+    cookie = headers.get('cookie') or headers.get('Cookie')
+    if not cookie:
+        return common_uncached(uri, params, headers)
+    try:
+        context = get_request_context(cookie)
+        return context.build(uri, params, headers)
+    except Exception as e:
+        logger.error(f"处理请求信息时发生错误: {str(e)}")
+        raise
+
+async def common_async(uri: str, params: Dict, headers: Dict) -> Tuple[Dict, Dict]:
+    """
+    common的异步版本，签名交给签名工作池（线程池或进程池）执行
+
+    并发采集时各协程不会因为签名互相阻塞，签名工作数通过环境变量DOUYIN_SIGN_WORKERS
+    或sign_engine.configure_async_signer设置。
+    """
+    cookie = headers.get('cookie') or headers.get('Cookie')
+    if not cookie:
+        return await asyncio.to_thread(common_uncached, uri, params, headers)
+    try:
+        context = get_request_context(cookie)
+        return await context.build_async(uri, params, headers)
+    except Exception as e:
+        logger.error(f"处理请求信息时发生错误: {str(e)}")
+        raise
+
+def common_uncached(uri: str, params: Dict, headers: Dict) -> Tuple[Dict, Dict]:
+    """
+    处理通用请求参数和头信息（每次请求重新解析Cookie、生成msToken并排序编码全部参数）
+    
     Args:
         uri: 请求URI
         params: 请求参数
@@ -210,30 +369,8 @@ def common(uri: str, params: Dict, headers: Dict) -> Tuple[Dict, Dict]:
         
         # 生成签名
         try:
-            # 构建查询字符串
-            query_items = []
-            for k, v in sorted(params.items()):  # 对参数排序以保证一致性
-                if v is not None:
-                    encoded_value = urllib.parse.quote(str(v))
-                    query_items.append(f'{k}={encoded_value}')
-            query = '&'.join(query_items)
-            
-            # 根据URI选择签名函数
-            call_name = 'sign_reply' if 'reply' in uri else 'sign_datail'
-            
-            try:
-                # 生成签名
-                a_bogus = DOUYIN_SIGN.call(call_name, query, headers["User-Agent"])
-                if not a_bogus:
-                    raise ValueError("签名生成结果为空")
-                    
-                params["X-Bogus"] = a_bogus
-                logger.debug(f"成功生成签名: {a_bogus[:20]}...")
-                
-            except execjs.RuntimeError as e:
-                logger.error(f"JavaScript运行时错误: {str(e)}")
-                raise ValueError(f"签名生成失败: {str(e)}")
-                
+            query = build_query(params)  # 对参数排序以保证一致性
+            params["X-Bogus"] = sign_query(uri, query, headers["User-Agent"])
         except Exception as e:
             logger.error(f"生成签名时发生错误: {str(e)}")
             raise
@@ -0,0 +1,50 @@
+import pytest
+
+import main
+import fetch_comments
+import fetch_replies
+from rate_limit import RateLimiter
+from writers import CsvAppendWriter
+from mock_server import MockDouyinServer, COMMENT_PATH, REPLY_PATH
+
+@pytest.fixture
+def mock_options():
+    """mock_crawl启动的MockDouyinServer参数，测试文件中可以覆盖"""
+    return {"total_comments": 90, "replies_per_comment": 2}
+
+@pytest.fixture
+def mock_crawl(tmp_path, monkeypatch, mock_options):
+    """
+    在本地模拟服务器上采集：工作目录切换到tmp_path，评论和回复接口指向模拟服务器，
+    限速器换成1000次/秒的固定速率
+    """
+    server = MockDouyinServer(**mock_options).start()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DOUYIN_COOKIE", "s_v_web_id=test")
+    monkeypatch.setattr(fetch_comments, "url", server.url + COMMENT_PATH)
+    monkeypatch.setattr(fetch_replies, "url", server.url + REPLY_PATH)
+    fast = lambda *args, burst=1, **kwargs: RateLimiter(1000, burst)
+    monkeypatch.setattr(fetch_comments, "RateController", fast)
+    monkeypatch.setattr(main, "RateController", fast)
+    yield server
+    server.stop()
+
+@pytest.fixture
+def crash_after(monkeypatch):
+    """
+    crash_after(writes)：第writes次写入之后让CSV写入器抛出异常，模拟采集进程中断
+
+    返回原来的CsvAppendWriter.write_rows，恢复后可以继续采集
+    """
+    def crash(writes):
+        original = CsvAppendWriter.write_rows
+        state = {"count": 0}
+
+        def write_rows(self, rows):
+            state["count"] += 1
+            if state["count"] > writes:
+                raise RuntimeError("模拟中断")
+            original(self, rows)
+        monkeypatch.setattr(CsvAppendWriter, "write_rows", write_rows)
+        return original
+    return crash
@@ -0,0 +1,224 @@
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from loguru import logger
+from typing import Dict, List, Optional, Tuple
+
+from rate_limit import RateController
+
+# 被服务端拒绝的错误信息（计入403失败），其余错误只作为限流迹象
+BLOCKED_MARKERS = ("访问被拒绝", "403", "禁止访问", "IP被限制")
+INVALID_MARKERS = ("Cookie已失效",)
+
+class AccountRateController(RateController):
+    """账号专用的限速器，把每次请求的结果同时记入账号的健康统计"""
+
+    def __init__(self, account: "CookieAccount", **kwargs):
+        super().__init__(**kwargs)
+        self.account = account
+
+    def on_success(self):
+        super().on_success()
+        self.account.pool.report_success(self.account)
+
+    def on_backoff(self, reason: str = ""):
+        super().on_backoff(reason)
+        self.account.pool.report_failure(self.account, reason)
+
+class CookieAccount:
+    """账号池中的一个账号"""
+
+    def __init__(self, pool: "CookiePool", cookie: str, name: str, rate_options: Optional[Dict] = None):
+        self.pool = pool
+        self.cookie = cookie
+        self.name = name
+        self.in_flight = 0  # 正在使用该账号的采集任务数
+        self.success_count = 0
+        self.blocked_count = 0  # 403、禁止访问等
+        self.soft_failure_count = 0  # 空页面、重复cursor等
+        self.consecutive_blocked = 0
+        self.quarantined_until = 0.0
+        self.invalid = False  # Cookie已失效，不再使用
+        self.controller = AccountRateController(self, **(rate_options or {}))
+
+    @property
+    def request_count(self) -> int:
+        return self.success_count + self.blocked_count + self.soft_failure_count
+
+    @property
+    def health(self) -> float:
+        """健康分（0~1），空页面等限流迹象按半次失败计"""
+        total = self.success_count + self.blocked_count + 0.5 * self.soft_failure_count
+        return self.success_count / total if total else 1.0
+
+    @property
+    def quarantined(self) -> bool:
+        return time.time() < self.quarantined_until
+
+    @property
+    def available(self) -> bool:
+        return not self.invalid and not self.quarantined
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "in_flight": self.in_flight,
+            "requests": self.request_count,
+            "success": self.success_count,
+            "blocked": self.blocked_count,
+            "health": round(self.health, 3),
+            "rate": round(self.controller.rate, 3),
+            "status": "失效" if self.invalid else ("隔离中" if self.quarantined else "正常"),
+        }
+
+class CookiePool:
+    """
+    多账号Cookie池
+
+    按轮询（round_robin）或最少占用（least_loaded）分配账号，每个账号有独立的RateController，
+    并统计成功率和403比例。连续被拒绝quarantine_after次、或请求数足够多但健康分低于min_health时，
+    账号被隔离quarantine_seconds秒；出现"Cookie已失效"时永久停用。
+    GUI线程和采集线程可能同时访问，内部用线程锁保护。
+    """
+
+    def __init__(self, cookies: List[str], strategy: str = "least_loaded", max_in_flight: int = 2,
+                 quarantine_after: int = 3, quarantine_seconds: float = 300.0, min_health: float = 0.5,
+                 min_requests: int = 10, rate_options: Optional[Dict] = None,
+                 account_rate_options: Optional[List[Dict]] = None):
+        """
+        Args:
+            cookies: Cookie列表，重复的Cookie只保留一个
+            strategy: round_robin 或 least_loaded
+            max_in_flight: 每个账号同时进行的采集任务数上限
+            quarantine_after: 连续被拒绝多少次后隔离
+            quarantine_seconds: 隔离时长（秒）
+            min_health: 健康分低于该值时隔离
+            min_requests: 请求数达到该值后才按健康分判断
+            rate_options: 所有账号的RateController参数
+            account_rate_options: 按账号顺序覆盖rate_options的参数
+        """
+        if strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"不支持的分配策略: {strategy}")
+        self.strategy = strategy
+        self.max_in_flight = max(1, max_in_flight)
+        self.quarantine_after = quarantine_after
+        self.quarantine_seconds = quarantine_seconds
+        self.min_health = min_health
+        self.min_requests = min_requests
+        self.accounts: List[CookieAccount] = []
+        self._next = 0
+        self._lock = threading.RLock()
+        account_rate_options = account_rate_options or []
+        seen = set()
+        for index, cookie in enumerate(cookies):
+            cookie = cookie.strip()
+            if not cookie or cookie in seen:
+                continue
+            seen.add(cookie)
+            options = dict(rate_options or {})
+            if index < len(account_rate_options):
+                options.update(account_rate_options[index])
+            self.accounts.append(CookieAccount(self, cookie, f"账号{len(self.accounts) + 1}", options))
+        if not self.accounts:
+            raise ValueError("账号池为空，请先导入Cookie")
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def acquire(self) -> Optional[CookieAccount]:
+        """分配一个可用账号，没有空闲账号时返回None；所有账号都已失效时抛出ValueError"""
+        with self._lock:
+            if all(account.invalid for account in self.accounts):
+                raise ValueError("账号池中的Cookie已全部失效，请更新Cookie")
+            candidates = [a for a in self.accounts if a.available and a.in_flight < self.max_in_flight]
+            if not candidates:
+                return None
+            if self.strategy == "least_loaded":
+                account = min(candidates, key=lambda a: (a.in_flight, -a.health, a.request_count))
+            else:
+                count = len(self.accounts)
+                for offset in range(count):
+                    account = self.accounts[(self._next + offset) % count]
+                    if account in candidates:
+                        self._next = (self.accounts.index(account) + 1) % count
+                        break
+            account.in_flight += 1
+            return account
+
+    async def acquire_async(self, poll_interval: float = 1.0) -> CookieAccount:
+        """等待直到有可用账号"""
+        while True:
+            account = self.acquire()
+            if account is not None:
+                return account
+            await asyncio.sleep(poll_interval)
+
+    def release(self, account: CookieAccount):
+        with self._lock:
+            account.in_flight = max(0, account.in_flight - 1)
+
+    @contextmanager
+    def lease(self):
+        """同步获取一个账号，用完自动归还"""
+        account = self.acquire()
+        if account is None:
+            raise ValueError("没有空闲的可用账号，请稍后再试")
+        try:
+            yield account
+        finally:
+            self.release(account)
+
+    def report_success(self, account: CookieAccount):
+        with self._lock:
+            account.success_count += 1
+            account.consecutive_blocked = 0
+
+    def report_failure(self, account: CookieAccount, reason: str = ""):
+        """记录一次失败，按错误类型更新健康统计，必要时隔离或停用账号"""
+        with self._lock:
+            if any(marker in reason for marker in INVALID_MARKERS):
+                if not account.invalid:
+                    account.invalid = True
+                    logger.error(f"{account.name} 的Cookie已失效，已从账号池停用")
+                return
+            if any(marker in reason for marker in BLOCKED_MARKERS):
+                account.blocked_count += 1
+                account.consecutive_blocked += 1
+            else:
+                account.soft_failure_count += 1
+            unhealthy = account.request_count >= self.min_requests and account.health < self.min_health
+            if account.consecutive_blocked >= self.quarantine_after or unhealthy:
+                self.quarantine(account)
+
+    def quarantine(self, account: CookieAccount, seconds: float = None):
+        with self._lock:
+            seconds = self.quarantine_seconds if seconds is None else seconds
+            account.quarantined_until = time.time() + seconds
+            account.consecutive_blocked = 0
+            logger.warning(f"{account.name} 请求频繁失败（健康分 {account.health:.2f}），隔离 {seconds:.0f} 秒")
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [account.stats() for account in self.accounts]
+
+def read_cookies(path: str) -> Tuple[List[str], List[Dict]]:
+    """
+    读取每行一个Cookie的账号文件，#开头的行为注释
+
+    Returns:
+        Tuple[List[str], List[Dict]]: Cookie列表和每个账号的限速参数（行尾用制表符分隔的最高速率）
+    """
+    cookies = []
+    account_rate_options = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            cookie, _, max_rate = line.partition("\t")
+            cookies.append(cookie.strip())
+            account_rate_options.append({"max_rate": float(max_rate)} if max_rate.strip() else {})
+    if not cookies:
+        raise ValueError(f"账号文件为空: {path}")
+    return cookies, account_rate_options
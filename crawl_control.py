@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from typing import Awaitable, Optional
+
+class CrawlCancelled(asyncio.CancelledError):
+    """
+    采集被CrawlControl取消
+
+    继承CancelledError，不会被采集循环中重试用的 except Exception 捕获。
+    """
+
+class CrawlControl:
+    """
+    采集的取消/暂停令牌
+
+    界面线程或其他线程调用cancel()、pause()、resume()，采集协程在每页、每次限速等待和
+    每个请求处通过checkpoint()/run()检查：暂停时在下一次检查处等待（不再消耗请求预算），
+    取消时立即中断限速等待和进行中的请求并抛出CrawlCancelled。已提交的数据不受影响，
+    fetch_all_comments等函数收到取消后返回已采集的部分。
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._waiters = set()  # (事件循环, asyncio.Event)，状态变化时通知
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set() and not self.cancelled
+
+    def cancel(self):
+        """取消采集（线程安全）"""
+        self._cancelled.set()
+        self._running.set()
+        self._notify()
+
+    def pause(self):
+        """暂停采集，进行中的请求完成后在下一次检查处等待（线程安全）"""
+        if not self.cancelled:
+            self._running.clear()
+            self._notify()
+
+    def resume(self):
+        """继续采集（线程安全）"""
+        self._running.set()
+        self._notify()
+
+    def _notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    def _register(self) -> tuple:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        return waiter
+
+    def _unregister(self, waiter: tuple):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    async def checkpoint(self):
+        """已取消时抛出CrawlCancelled，暂停时等待继续"""
+        waiter = self._register()
+        try:
+            while True:
+                if self.cancelled:
+                    raise CrawlCancelled()
+                if self._running.is_set():
+                    return
+                await waiter[1].wait()
+                waiter[1].clear()
+        finally:
+            self._unregister(waiter)
+
+    async def run(self, awaitable: Awaitable):
+        """
+        先检查暂停/取消，再等待awaitable（限速等待、请求等）
+
+        等待期间被取消时中断awaitable并抛出CrawlCancelled；暂停不会中断已经开始的等待。
+        """
+        try:
+            await self.checkpoint()
+        except BaseException:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()  # 未开始的协程直接关闭，避免"never awaited"警告
+            raise
+        task = asyncio.ensure_future(awaitable)
+        waiter = self._register()
+        try:
+            while True:
+                if self.cancelled:
+                    raise CrawlCancelled()
+                notified = asyncio.ensure_future(waiter[1].wait())
+                try:
+                    done, _ = await asyncio.wait({task, notified}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    notified.cancel()
+                if task in done:
+                    return task.result()
+                waiter[1].clear()
+        finally:
+            self._unregister(waiter)
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def sleep(self, seconds: float):
+        """可被取消的sleep"""
+        await self.run(asyncio.sleep(seconds))
+
+async def controlled(awaitable: Awaitable, control: Optional[CrawlControl] = None):
+    """有control时通过control.run等待，否则直接等待"""
+    if control is None:
+        return await awaitable
+    return await control.run(awaitable)
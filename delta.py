@@ -0,0 +1,316 @@
+"""
+已采集视频的增量刷新
+
+读取 data/v1/<aweme_id>/comments.csv 中已有的评论ID、点赞数、回复数和最新评论时间，从第一页开始
+重新分页，只收集新评论和点赞数/回复数有变化的评论；连续stop_pages页都是已知评论时提前停止。
+新评论（以及回复数增加的评论的新回复）追加到原文件，变化的计数在原文件中更新。
+
+用法:
+    python main.py <视频ID> --delta --replies
+    python batch.py videos.txt --delta
+"""
+import os
+import json
+import time
+import pandas as pd
+from datetime import datetime
+from loguru import logger
+from typing import Dict, List, Optional
+
+from main import (
+    COLUMNS, TIME_FORMAT, crawl_to_csv_async, iter_replies_async, load_cookie, project_rows
+)
+from fetch_comments import iter_comment_pages
+from checkpoint import CrawlCheckpoint
+from crawl_control import CrawlCancelled
+from dedup import DedupIndex
+from http_session import SessionManager
+from writers import CsvAppendWriter
+
+DELTA_STOP_PAGES = 2  # 连续多少页全是已知评论时停止
+MERGE_CHUNK_ROWS = 65536  # 合并时每次读写的行数
+
+class DeltaBaseline:
+    """
+    上一次采集的结果：全部评论/回复ID、每条评论的点赞数和回复数，以及最新评论时间（高水位）
+
+    高水位保存在同目录的delta.json中，第一次增量刷新时从评论时间列推算。
+    """
+
+    def __init__(self, aweme_id: str, save_path: Optional[str] = None, base_dir: str = "data/v1"):
+        self.aweme_id = str(aweme_id)
+        self.directory = os.path.join(base_dir, self.aweme_id)
+        self.save_path = save_path or os.path.join(self.directory, "comments.csv")
+        self.state_path = os.path.join(self.directory, "delta.json")
+        self.known = DedupIndex(compact=True)
+        self.high_water = 0
+        self.rows = 0
+        self._counts = pd.DataFrame(columns=["点赞数", "回复总数"], dtype="int64")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.save_path) and os.path.getsize(self.save_path) > 0
+
+    def load(self, chunk_rows: int = MERGE_CHUNK_ROWS):
+        """分块读取已有结果，只保留ID和计数"""
+        frames = []
+        latest = ""
+        chunks = pd.read_csv(self.save_path, encoding="utf-8-sig", dtype=str, keep_default_na=False,
+                             usecols=["评论ID", "点赞数", "回复总数", "评论时间"], chunksize=chunk_rows)
+        for chunk in chunks:
+            self.rows += len(chunk)
+            self.known.update(chunk["评论ID"])
+            latest = max(latest, chunk["评论时间"].max() or "")
+            ids = pd.to_numeric(chunk["评论ID"], errors="coerce")
+            counts = pd.DataFrame({
+                "点赞数": pd.to_numeric(chunk["点赞数"], errors="coerce"),
+                "回复总数": pd.to_numeric(chunk["回复总数"], errors="coerce"),
+            }).fillna(0).astype("int64")
+            counts.index = ids
+            frames.append(counts[ids.notna().to_numpy()])
+        if frames:
+            counts = pd.concat(frames)
+            counts.index = counts.index.astype("int64")
+            self._counts = counts[~counts.index.duplicated(keep="last")]
+
+        self.high_water = self._load_state().get("high_water", 0)
+        if not self.high_water and latest:
+            # 评论时间按本地时区保存，精确到秒
+            self.high_water = int(datetime.strptime(latest, TIME_FORMAT).timestamp())
+        logger.info(f"已载入上次采集的 {self.rows} 条数据，最新评论时间 {latest or '未知'}")
+
+    def _load_state(self) -> Dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取增量状态失败: {str(e)}")
+            return {}
+
+    def save_state(self, high_water: int):
+        """原子写入delta.json"""
+        self.high_water = max(self.high_water, int(high_water))
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"high_water": self.high_water, "refreshed_at": int(time.time())}, f)
+        os.replace(temp_path, self.state_path)
+
+    def counts(self, cids: List[str]) -> List[Optional[tuple]]:
+        """已有评论的 (点赞数, 回复总数)，不在上次结果中的返回None"""
+        ids = pd.to_numeric(pd.Series(cids, dtype=object), errors="coerce")
+        positions = self._counts.index.get_indexer(ids.fillna(-1).astype("int64"))
+        values = self._counts.to_numpy()
+        return [tuple(int(v) for v in values[p]) if p >= 0 else None for p in positions]
+
+def merge_csv(path: str, updates: Dict[str, tuple], new_rows: List[Dict], commit=None,
+              chunk_rows: int = MERGE_CHUNK_ROWS) -> int:
+    """
+    把新行追加到已有结果末尾，已有行的点赞数或回复数有变化时才重写整个文件
+
+    只有新行时直接追加；有计数变化时先写临时文件（path + ".tmp"），调用commit后再替换原文件，
+    替换前中断时由recover_merge根据断点中的文件大小决定完成替换还是丢弃临时文件。
+
+    Args:
+        path: CsvAppendWriter写出的CSV文件
+        updates: 评论ID -> (点赞数, 回复总数)
+        new_rows: 追加的输出行
+        commit: 写入完成后调用commit(size)提交断点，size为合并后的文件大小
+
+    Returns:
+        int: 合并后的文件大小（字节）
+    """
+    if not updates:
+        with CsvAppendWriter(path, columns=COLUMNS) as writer:
+            writer.write_rows(new_rows)
+            size = writer.tell()
+        if commit is not None:
+            commit(size)
+        return size
+
+    temp_path = path + ".tmp"
+    with CsvAppendWriter(temp_path, columns=COLUMNS, overwrite=True) as writer:
+        # 全部按字符串读写，原有的值原样保留
+        for chunk in pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            hit = chunk["评论ID"].isin(updates.keys())
+            if hit.any():
+                changed = chunk.loc[hit, "评论ID"].map(updates)
+                chunk.loc[hit, "点赞数"] = changed.map(lambda counts: str(counts[0]))
+                chunk.loc[hit, "回复总数"] = changed.map(lambda counts: str(counts[1]))
+            writer.write_rows(chunk.to_dict("records"))
+        writer.write_rows(new_rows)
+        size = writer.tell()
+    if commit is not None:
+        commit(size)
+    os.replace(temp_path, path)
+    return size
+
+def recover_merge(path: str, checkpoint: CrawlCheckpoint):
+    """
+    处理上次合并留下的临时文件，并把结果截断到断点提交时的大小
+
+    临时文件的大小与断点一致说明断点已经提交、只差替换，完成替换；否则断点没有提交，丢弃临时文件。
+    之后截断掉追加了但没有提交的行，它们在本次刷新中会作为新评论重新获取。
+    """
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        if os.path.getsize(temp_path) == checkpoint.output_size:
+            logger.info("上次增量刷新在替换结果文件前中断，完成替换")
+            os.replace(temp_path, path)
+        else:
+            os.remove(temp_path)
+    checkpoint.restore_output(path)
+
+async def refresh_async(aweme_id, get_replies=False, save_path=None, session=None, cookie=None, checkpoint=None,
+                        rate_controller=None, control=None, stop_pages=DELTA_STOP_PAGES, store=None,
+                        **reply_options) -> Dict:
+    """
+    增量刷新一个已采集的视频，没有已采集的数据时执行完整采集，上次评论未采集完时从断点继续
+
+    评论列表按cursor从头分页，每页与上次的结果比较：未见过的评论作为新评论，已有评论的点赞数或
+    回复数变化时记录新值；连续stop_pages页既没有新评论、也没有晚于高水位的评论时停止分页。
+    get_replies时获取新评论的回复、回复数增加的评论的新回复，以及上次未获取完回复的评论。
+
+    Args:
+        aweme_id: 视频ID
+        get_replies: 是否获取回复
+        save_path: 已有结果的路径，默认为 data/v1/<aweme_id>/comments.csv
+        session: SessionManager会话管理器，不传时在内部创建并在结束时关闭
+        cookie: 使用的Cookie，不传时从环境变量或cookie.txt加载
+        checkpoint: CrawlCheckpoint断点，存在时同步更新其中的ID、计数和文件大小
+        rate_controller: 账号共用的RateController，分页和回复请求共用
+        control: CrawlControl取消/暂停令牌，取消时合并已获取的部分（不更新高水位）
+        stop_pages: 连续多少页全是已知评论时停止
+        store: SqliteStore数据库，传入时扫描到的评论（含计数变化）和新回复同时upsert到数据库
+        **reply_options: 传给iter_replies_async的并发和限速参数
+
+    Returns:
+        Dict: save_path、mode（delta/full/resume）、pages（本次分页数）、new_comments、new_replies、updated（计数变化的评论数）、
+            cancelled（是否被control取消，取消时只合并了已获取的部分）
+    """
+    baseline = DeltaBaseline(aweme_id, save_path)
+    if checkpoint is None:
+        checkpoint = CrawlCheckpoint(aweme_id)
+    has_checkpoint = baseline.exists() and checkpoint.load()
+    if has_checkpoint and checkpoint.comments_done:
+        recover_merge(baseline.save_path, checkpoint)
+    if not baseline.exists() or (has_checkpoint and not checkpoint.comments_done):
+        # 没有已采集的数据时完整采集，上次的评论没有采集完时先从断点继续
+        mode = "resume" if has_checkpoint else "full"
+        logger.info(f"视频 {aweme_id} {'上次采集未完成，从断点继续' if has_checkpoint else '没有已采集的数据，执行完整采集'}")
+        path = await crawl_to_csv_async(
+            aweme_id, get_replies=get_replies, resume=has_checkpoint, save_path=baseline.save_path, session=session,
+            cookie=cookie, checkpoint=checkpoint, rate_controller=rate_controller, control=control, store=store,
+            **reply_options
+        )
+        baseline.load()
+        if control is None or not control.cancelled:
+            baseline.save_state(baseline.high_water)
+        return {"save_path": path, "mode": mode, "pages": 0, "new_comments": checkpoint.comment_count,
+                "new_replies": checkpoint.reply_count, "updated": 0,
+                "cancelled": control is not None and control.cancelled}
+
+    baseline.load()
+
+    own_session = session is None
+    if own_session:
+        session = SessionManager()
+    try:
+        cookie = cookie or load_cookie()
+        client = session.get_client(cookie)
+        new_comments = []
+        new_targets = []  # 新评论中有回复的
+        grown_targets = []  # 回复数增加的已有评论及其原有计数
+        updates = {}
+        newest = baseline.high_water
+        pages = known_pages = 0
+        cancelled = False
+
+        comment_pages = iter_comment_pages(aweme_id, cookie, use_batch_mode=False, client=client, dedup=DedupIndex(),
+                                           rate_controller=rate_controller, control=control)
+        try:
+            async for page in comment_pages:
+                pages += 1
+                if store is not None:
+                    store.upsert_comments(aweme_id, page)
+                fresh = False
+                for comment, old in zip(page, baseline.counts([c["cid"] for c in page])):
+                    create_time = comment.get("create_time", 0)
+                    if isinstance(create_time, (int, float)) and create_time > baseline.high_water:
+                        fresh = True
+                        newest = max(newest, int(create_time))
+                    target = {"aweme_id": comment.get("aweme_id", aweme_id), "cid": comment["cid"],
+                              "reply_comment_total": comment.get("reply_comment_total", 0)}
+                    if comment["cid"] not in baseline.known:
+                        fresh = True
+                        new_comments.append(comment)
+                        if target["reply_comment_total"] > 0:
+                            new_targets.append(target)
+                        continue
+                    if old is None:
+                        continue
+                    counts = (int(comment.get("digg_count", 0)), int(comment.get("reply_comment_total", 0)))
+                    if counts != old:
+                        updates[str(comment["cid"])] = counts
+                        if counts[1] > old[1]:
+                            grown_targets.append((target, old))
+                known_pages = 0 if fresh else known_pages + 1
+                if known_pages >= stop_pages:
+                    logger.info(f"连续 {known_pages} 页都是已知评论，停止分页")
+                    break
+        except CrawlCancelled:
+            cancelled = True
+            logger.info("增量刷新已取消，合并已获取的部分")
+        finally:
+            await comment_pages.aclose()
+
+        new_rows, _ = project_rows(new_comments)
+        baseline.known.update(c["cid"] for c in new_comments)
+        reply_batches = []
+        if get_replies and not cancelled:
+            if rate_controller is not None:
+                reply_options.setdefault("rate_limiter", rate_controller)
+            targets = new_targets + [target for target, _ in grown_targets]
+            targets += checkpoint.load_reply_targets() if has_checkpoint else []
+            logger.info(f"需要获取回复的评论: {len(targets)} 条")
+            try:
+                async for comment, replies in iter_replies_async(targets, session, cookie=cookie, control=control,
+                                                                 **reply_options):
+                    reply_batches.append((comment.get("cid", ""), baseline.known.filter_new(replies)))
+                    if store is not None:
+                        store.upsert_replies(aweme_id, *reply_batches[-1])
+            except CrawlCancelled:
+                cancelled = True
+                logger.info("增量刷新已取消，合并已获取的回复")
+        for _, replies in reply_batches:
+            new_rows.extend(project_rows(replies, is_reply=True)[0])
+        if get_replies:
+            # 新回复没有获取成功的评论保留原来的回复数，下次刷新时仍会被识别为回复数增加
+            fetched = {str(comment_id) for comment_id, _ in reply_batches}
+            for target, old in grown_targets:
+                cid = str(target["cid"])
+                if cid not in fetched:
+                    updates[cid] = (updates[cid][0], old[1])
+                    if updates[cid] == old:
+                        del updates[cid]
+
+        def commit(size):
+            if has_checkpoint:
+                with checkpoint:
+                    checkpoint.commit_comments(new_comments, new_targets, checkpoint.cursor, size)
+                    for comment_id, replies in reply_batches:
+                        checkpoint.commit_replies(comment_id, replies, size)
+
+        merge_csv(baseline.save_path, updates, new_rows, commit=commit)
+        if not cancelled:
+            baseline.save_state(newest)
+
+        new_replies = sum(len(replies) for _, replies in reply_batches)
+        logger.info(f"增量刷新完成：分页 {pages} 页，新评论 {len(new_comments)} 条，新回复 {new_replies} 条，"
+                    f"计数变化 {len(updates)} 条")
+        return {"save_path": baseline.save_path, "mode": "delta", "pages": pages, "new_comments": len(new_comments),
+                "new_replies": new_replies, "updated": len(updates), "cancelled": cancelled}
+    finally:
+        if own_session:
+            await session.aclose()
@@ -12,6 +12,8 @@ a = Analysis(
         ('cookie.txt', '.'),
         ('cookie_json.txt', '.'),
         ('deepseek_api_key.txt', '.'),
+        ('douyin.js', '.'),
+        ('sign_worker.js', '.'),
     ],
     hiddenimports=[
         'PyQt6',
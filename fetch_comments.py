@@ -1,17 +1,20 @@
 import asyncio
 import httpx
 from loguru import logger
-from common import common
+from common import common_async, HOST
+from http_session import client_scope
+from dedup import DedupIndex
+from rate_limit import RateLimiter, RateController
 from retry import retry
-import random
+from crawl_control import CrawlCancelled, CrawlControl, controlled
 import time
 
 # 配置常量
-url = "https://www.douyin.com/aweme/v1/web/comment/list/"
+url = f"{HOST}/aweme/v1/web/comment/list/"
 
 @retry(tries=3, delay=2)
-async def fetch_comments(aweme_id: str, cookie: str, cursor: str = "0", count: str = "100"):
-    """获取评论数据"""
+async def fetch_comments(aweme_id: str, cookie: str, cursor: str = "0", count: str = "100", client=None):
+    """获取评论数据，传入client时复用该连接池"""
     try:
         if not cookie:
             raise ValueError("Cookie不能为空")
@@ -29,12 +32,12 @@ async def fetch_comments(aweme_id: str, cookie: str, cursor: str = "0", count: s
         
         # 使用common模块处理参数
         try:
-            params, headers = common(url, params, headers)
+            params, headers = await common_async(url, params, headers)
         except Exception as e:
             logger.error(f"处理请求参数时出错: {str(e)}")
             raise ValueError(f"签名生成失败: {str(e)}")
         
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with client_scope(client, timeout=60) as client:
             try:
                 response = await client.get(url, params=params, headers=headers)
                 response.raise_for_status()
@@ -105,10 +108,10 @@ async def fetch_comments(aweme_id: str, cookie: str, cursor: str = "0", count: s
         logger.error(f"获取评论时发生未知错误: {str(e)}")
         raise ValueError(f"获取评论失败: {str(e)}")
 
-async def check_comments_count(aweme_id: str, cookie: str) -> int:
+async def check_comments_count(aweme_id: str, cookie: str, client=None) -> int:
     """检查视频的总评论数"""
     try:
-        comments, _, _, total = await fetch_comments(aweme_id, cookie, "0", "1")
+        comments, _, _, total = await fetch_comments(aweme_id, cookie, "0", "1", client=client)
         if total == 0 and comments:
             # 如果返回的total为0但实际有评论，使用评论列表长度
             return len(comments)
@@ -117,21 +120,54 @@ async def check_comments_count(aweme_id: str, cookie: str) -> int:
         logger.error(f"检查评论数量时发生错误: {str(e)}")
         raise  # 向上传递错误，让调用者处理
 
-async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool = None):
-    """获取所有评论"""
+def _drop_task(task: asyncio.Future):
+    """丢弃预取的页，已完成的结果（包括异常）直接忽略"""
+    task.cancel()
+    if task.done() and not task.cancelled():
+        task.exception()
+
+async def iter_comment_pages(aweme_id: str, cookie: str, use_batch_mode: bool = None, client=None,
+                             dedup: DedupIndex = None, cursor: str = "0", progress: dict = None,
+                             rate_controller: RateLimiter = None, control: CrawlControl = None,
+                             prefetch: int = 0):
+    """
+    逐页获取评论的异步生成器，每次产出一页去重后的评论
+
+    调用方可以边采集边处理、写盘，内存占用不随评论总数增长。
+
+    Args:
+        aweme_id: 视频ID
+        cookie: Cookie字符串
+        use_batch_mode: 是否使用批量模式，None时根据评论总数自动判断
+        client: 复用的httpx.AsyncClient，所有分页请求共用同一个连接池
+        dedup: 去重索引，整个采集过程增量更新，可与回复采集共用
+        cursor: 起始cursor，从断点恢复时传入上次保存的值
+        progress: 每页产出前把下一页的cursor写入progress["cursor"]，供调用方保存断点；
+            检查过评论总数时写入progress["total"]
+        rate_controller: 请求限速器，通常是账号共用的RateController，不传时按模式创建
+        control: CrawlControl取消/暂停令牌，每次限速等待和请求前检查，取消时抛出CrawlCancelled
+        prefetch: 预取页数，大于0时在当前页请求期间按cursor每页增加count的规律提前签名并请求后面几页，
+            与服务端实际返回的cursor不一致的预取结果直接丢弃；预取请求同样经过rate_controller限速，
+            适合请求往返延迟大于请求间隔的情况
+    """
+    pending = {}  # 预取中的页：cursor -> Task
     try:
+        if dedup is None:
+            dedup = DedupIndex()
         # 如果未指定模式，先检查评论总数
         if use_batch_mode is None:
             try:
-                total_comments = await check_comments_count(aweme_id, cookie)
+                total_comments = await controlled(check_comments_count(aweme_id, cookie, client=client), control)
+                if progress is not None:
+                    progress["total"] = total_comments
                 use_batch_mode = total_comments > 1000  # 超过1000条评论使用批量模式
                 logger.info(f"检测到总评论数: {total_comments}，{'使用' if use_batch_mode else '不使用'}批量模式")
             except Exception as e:
                 logger.warning(f"检查评论数量失败: {str(e)}，将使用默认模式")
                 use_batch_mode = False
         
-        cursor = "0"
-        all_comments = []
+        start_cursor = cursor = str(cursor)
+        collected = 0  # 已产出的评论数
         has_more = 1
         retry_count = 0
         max_retries = 5
@@ -145,17 +181,51 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
         # 批量模式参数调整
         if use_batch_mode:
             count = "30"  # 减小每页评论数，提高稳定性
-            min_delay = 1.5  # 增加延迟，避免请求过快
-            max_delay = 2.5
+            initial_rate = 1 / 2.0  # 初始每2秒一页，之后根据响应情况自动调整
             max_retries = 8  # 增加重试次数
             max_empty_pages = 8  # 增加空页面容忍度
         else:
             count = "20"
-            min_delay = 2
-            max_delay = 3
+            initial_rate = 1 / 2.5
             max_retries = 5
             max_empty_pages = 5
         
+        if rate_controller is None:
+            rate_controller = RateController(rate=initial_rate)
+        
+        known_total = 0  # 服务端返回的评论总数，预取不超过该位置
+        prefetch_hits = 0
+        prefetch_dropped = 0
+
+        async def request_page(page_cursor):
+            # 暂停时在此等待，不再占用账号的请求预算
+            await controlled(rate_controller.acquire(), control)
+            return await controlled(fetch_comments(aweme_id, cookie, page_cursor, count, client=client), control)
+
+        async def fetch_page(page_cursor):
+            """获取page_cursor处的一页，预取模式下优先使用已预取的结果，并补足后面的预取"""
+            nonlocal prefetch_hits, prefetch_dropped
+            if prefetch <= 0:
+                return await request_page(page_cursor)
+            step = int(count)
+            expected = {str(int(page_cursor) + i * step) for i in range(prefetch + 1)}
+            for key in [key for key in pending if key not in expected]:
+                # cursor没有按预期递增（重复页、cursor调整等），丢弃猜错的预取
+                _drop_task(pending.pop(key))
+                prefetch_dropped += 1
+            task = pending.pop(page_cursor, None)
+            if task is not None:
+                prefetch_hits += 1
+            else:
+                task = asyncio.ensure_future(request_page(page_cursor))
+            for i in range(1, prefetch + 1):
+                guess = int(page_cursor) + i * step
+                if known_total and guess >= known_total:
+                    break
+                if str(guess) not in pending:
+                    pending[str(guess)] = asyncio.ensure_future(request_page(str(guess)))
+            return await task
+        
         # 记录起始时间和上次进度更新时间
         start_time = time.time()
         last_progress_time = start_time
@@ -167,22 +237,24 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
                 current_time = time.time()
                 if current_time - last_progress_time >= progress_interval:
                     elapsed_time = current_time - start_time
-                    rate = len(all_comments) / elapsed_time if elapsed_time > 0 else 0
-                    logger.info(f"采集进度 - 已获取: {len(all_comments)} 条评论, 速率: {rate:.2f} 条/秒")
+                    rate = collected / elapsed_time if elapsed_time > 0 else 0
+                    logger.info(f"采集进度 - 已获取: {collected} 条评论, 速率: {rate:.2f} 条/秒")
                     last_progress_time = current_time
                 
                 if cursor == last_cursor:
                     logger.warning(f"检测到重复的cursor值: {cursor}，尝试跳过")
+                    rate_controller.on_backoff("重复的cursor")
                     # 使用评论数来计算下一个cursor
                     next_cursor_val = int(cursor) + int(count)
-                    if next_cursor_val <= len(all_comments):
+                    if next_cursor_val <= collected:
                         cursor = str(next_cursor_val)
                     else:
                         # 如果计算的cursor超过了已有评论数，尝试更小的增量
                         cursor = str(int(cursor) + int(int(count) / 2))
                         logger.warning(f"使用更小的增量调整cursor: {cursor}")
                 
-                comments, has_more, next_cursor, _ = await fetch_comments(aweme_id, cookie, cursor, count)
+                comments, has_more, next_cursor, page_total = await fetch_page(cursor)
+                known_total = page_total or known_total
                 
                 if not comments and has_more:
                     empty_page_count += 1
@@ -191,24 +263,26 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
                     if empty_page_count >= max_empty_pages:
                         logger.warning("连续多次未获取到评论，可能已到达末尾")
                         break
-                    await asyncio.sleep(random.uniform(2, 3))  # 空页面时增加等待时间
+                    rate_controller.on_backoff("空页面")  # 空页面时降低请求速率
                     continue
                 
+                page = None
                 if comments:
                     empty_page_count = 0
                     
                     # 检查新评论是否与已有评论重复
-                    new_comment_ids = set(comment["cid"] for comment in comments if isinstance(comment, dict) and "cid" in comment)
-                    existing_comment_ids = set(comment["cid"] for comment in all_comments if isinstance(comment, dict) and "cid" in comment)
-                    unique_comments = [c for c in comments if isinstance(c, dict) and "cid" in c and c["cid"] not in existing_comment_ids]
+                    unique_comments = dedup.filter_new(comments)
                     
                     if unique_comments:
-                        all_comments.extend(unique_comments)
-                        logger.info(f"已获取 {len(all_comments)} 条评论")
+                        collected += len(unique_comments)
+                        logger.info(f"已获取 {collected} 条评论")
                         retry_count = 0  # 获取到新评论时重置重试计数
                         no_progress_count = 0
+                        page = unique_comments
+                        rate_controller.on_success()
                     else:
                         logger.warning("本页评论全部重复，可能存在分页问题")
+                        rate_controller.on_backoff("整页评论重复")
                         no_progress_count += 1
                         if no_progress_count >= max_no_progress:
                             logger.warning(f"连续 {max_no_progress} 次未获取到新评论，尝试调整cursor")
@@ -218,11 +292,11 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
                             continue
                 
                 # 检查是否有实际进展
-                if len(all_comments) == last_comment_count:
+                if collected == last_comment_count:
                     no_progress_count += 1
                 else:
                     no_progress_count = 0
-                    last_comment_count = len(all_comments)
+                    last_comment_count = collected
                 
                 # 更新cursor
                 last_cursor = cursor
@@ -233,26 +307,24 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
                 else:
                     cursor = next_cursor
                 
-                # 根据当前进展调整延迟
-                if no_progress_count > 0:
-                    # 如果没有新评论，增加延迟
-                    await asyncio.sleep(random.uniform(max_delay, max_delay + 1))
-                else:
-                    # 正常延迟
-                    await asyncio.sleep(random.uniform(min_delay, max_delay))
+                # cursor更新之后再产出，调用方此时保存的断点指向下一页
+                if page:
+                    if progress is not None:
+                        progress["cursor"] = cursor
+                    yield page
                 
             except ValueError as e:
                 if "Cookie已失效" in str(e) or "视频不存在" in str(e):
                     raise  # 这些错误直接抛出
                 retry_count += 1
                 logger.warning(f"获取评论出错: {str(e)}，第{retry_count}次重试")
-                await asyncio.sleep(random.uniform(2, 3))
+                rate_controller.on_backoff(str(e))  # 403、IP被限制等错误都降低请求速率
             except Exception as e:
                 retry_count += 1
                 logger.error(f"获取评论时发生错误: {str(e)}，第{retry_count}次重试")
-                await asyncio.sleep(random.uniform(2, 3))
+                rate_controller.on_backoff(str(e))
         
-        if not all_comments:
+        if not collected and start_cursor == "0":
             if retry_count >= max_retries:
                 raise ValueError("达到最大重试次数，未能获取到评论")
             elif empty_page_count >= max_empty_pages:
@@ -262,10 +334,41 @@ async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool =
         
         # 显示最终统计信息
         total_time = time.time() - start_time
-        rate = len(all_comments) / total_time if total_time > 0 else 0
-        logger.info(f"评论采集完成，共获取 {len(all_comments)} 条评论，用时 {total_time:.2f} 秒，平均速率 {rate:.2f} 条/秒")
-        return all_comments
+        rate = collected / total_time if total_time > 0 else 0
+        logger.info(f"评论采集完成，共获取 {collected} 条评论，用时 {total_time:.2f} 秒，平均速率 {rate:.2f} 条/秒")
+        if prefetch > 0:
+            logger.info(f"预取命中 {prefetch_hits} 页，丢弃 {prefetch_dropped + len(pending)} 页")
         
     except Exception as e:
         logger.error(f"获取所有评论时发生错误: {str(e)}")
         raise
+    finally:
+        # 结束、出错或取消时放弃尚未使用的预取
+        for task in pending.values():
+            _drop_task(task)
+        if pending:
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+
+async def fetch_all_comments(aweme_id: str, cookie: str, use_batch_mode: bool = None, client=None, dedup: DedupIndex = None,
+                             rate_controller: RateLimiter = None, control: CrawlControl = None, prefetch: int = 0):
+    """
+    获取所有评论，通过control取消时返回已获取的部分
+
+    Args:
+        aweme_id: 视频ID
+        cookie: Cookie字符串
+        use_batch_mode: 是否使用批量模式，None时根据评论总数自动判断
+        client: 复用的httpx.AsyncClient，所有分页请求共用同一个连接池
+        dedup: 去重索引，整个采集过程增量更新，可与回复采集共用
+        rate_controller: 请求限速器，不传时按模式创建
+        control: CrawlControl取消/暂停令牌
+        prefetch: 预取页数，见iter_comment_pages
+    """
+    all_comments = []
+    try:
+        async for page in iter_comment_pages(aweme_id, cookie, use_batch_mode, client=client, dedup=dedup,
+                                             rate_controller=rate_controller, control=control, prefetch=prefetch):
+            all_comments.extend(page)
+    except CrawlCancelled:
+        logger.info(f"评论采集已取消，返回已获取的 {len(all_comments)} 条评论")
+    return all_comments
@@ -1,70 +1,169 @@
 import asyncio
 import httpx
 from loguru import logger
-from common import common
+from common import common_async, HOST
+from http_session import client_scope
+from crawl_control import controlled
+from fetch_comments import _drop_task
 
 # 配置常量
-url = "https://www.douyin.com/aweme/v1/web/comment/list/reply/"
+url = f"{HOST}/aweme/v1/web/comment/list/reply/"
 
-async def fetch_replies(aweme_id: str, comment_id: str, cookie: str, cursor: str = "0", count: str = "50"):
-    """获取评论回复数据"""
-    try:
-        if not cookie:
-            raise ValueError("Cookie不能为空")
-            
-        params = {
-            "item_id": aweme_id,
-            "comment_id": comment_id,
-            "cursor": cursor,
-            "count": count,
-            "item_type": 0
-        }
-        headers = {"cookie": cookie}
-        
-        # 使用common模块处理参数
-        params, headers = common(url, params, headers)
+# 每页回复数
+REPLY_PAGE_SIZE = 50
+# 回复很多的评论同时请求的页数
+REPLY_PAGE_CONCURRENCY = 4
+
+async def fetch_reply_page(aweme_id: str, comment_id: str, cookie: str, cursor: str = "0", count: str = str(REPLY_PAGE_SIZE),
+                           client=None):
+    """
+    获取一页回复，传入client时复用该连接池
+
+    Returns:
+        Tuple[list, int, str, int]: 回复列表、has_more、下一页的cursor和回复总数
+
+    Raises:
+        ValueError: 请求失败或返回数据格式错误
+    """
+    if not cookie:
+        raise ValueError("Cookie不能为空")
         
-        async with httpx.AsyncClient(timeout=30) as client:
+    params = {
+        "item_id": aweme_id,
+        "comment_id": comment_id,
+        "cursor": cursor,
+        "count": count,
+        "item_type": 0
+    }
+    headers = {"cookie": cookie}
+    
+    # 使用common模块处理参数
+    params, headers = await common_async(url, params, headers)
+    
+    async with client_scope(client, timeout=30) as client:
+        try:
             response = await client.get(url, params=params, headers=headers)
             response.raise_for_status()
             data = response.json()
-            
-            if data.get("status_code") != 0:
-                raise ValueError(f"请求失败: {data.get('status_msg', '未知错误')}")
-                
-            return data.get("comments", [])
-            
-    except httpx.HTTPError as e:
-        logger.error(f"获取回复时发生网络错误: {str(e)}")
-        return []
+        except httpx.HTTPError as e:
+            raise ValueError(f"网络请求失败: {str(e)}")
+        except Exception:
+            raise ValueError("返回数据格式错误")
+        
+        if not isinstance(data, dict):
+            raise ValueError("返回数据格式错误")
+        if data.get("status_code") != 0:
+            raise ValueError(f"请求失败: {data.get('status_msg', '未知错误')}")
+        
+        replies = data.get("comments") or []
+        if not isinstance(replies, list):
+            raise ValueError("回复数据格式错误")
+        next_cursor = data.get("cursor", cursor)
+        if not isinstance(next_cursor, (str, int)):
+            next_cursor = cursor
+        total = data.get("total", 0)
+        return replies, int(bool(data.get("has_more", 0))), str(next_cursor), total if isinstance(total, int) else 0
+
+async def fetch_replies(aweme_id: str, comment_id: str, cookie: str, cursor: str = "0", count: str = str(REPLY_PAGE_SIZE),
+                        client=None):
+    """获取一页回复数据，出错时返回空列表；需要分页信息时使用fetch_reply_page"""
+    try:
+        replies, _, _, _ = await fetch_reply_page(aweme_id, comment_id, cookie, cursor, count, client=client)
+        return replies
     except Exception as e:
         logger.error(f"获取回复时发生错误: {str(e)}")
         return []
 
-async def fetch_all_replies(aweme_id: str, comment_id: str, cookie: str):
-    """获取评论的所有回复"""
+async def fetch_all_replies(aweme_id: str, comment_id: str, cookie: str, client=None, rate_limiter=None, control=None,
+                            total: int = 0, concurrency: int = REPLY_PAGE_CONCURRENCY, max_retries: int = 3):
+    """
+    按服务端返回的cursor和has_more获取评论的所有回复
+
+    每页返回后，如果下一页的cursor正好比本页多REPLY_PAGE_SIZE，就按这个规律从它开始推算后面的页，
+    在回复总数以内最多concurrency页同时请求；推算的页只在cursor链与之相符时保留，不相符时立即丢弃
+    （还在等待令牌的请求不会消耗令牌）。cursor不按规律前进时逐页请求。
+
+    Args:
+        aweme_id: 视频ID
+        comment_id: 评论ID
+        cookie: Cookie字符串
+        client: 复用的httpx.AsyncClient
+        rate_limiter: 共享的限速器，每页请求前获取令牌，不传时每页间隔1秒
+        control: CrawlControl取消/暂停令牌，取消时抛出CrawlCancelled
+        total: 评论的回复总数（reply_comment_total），服务端没有返回回复总数时用于限制推算的页
+        concurrency: 同时请求的页数
+        max_retries: 每页出错时的重试次数
+
+    Returns:
+        list: 全部回复
+
+    Raises:
+        ValueError: 某一页重试后仍然失败
+    """
+    page_size = REPLY_PAGE_SIZE
+    pending = {}  # 推算出的后续页：cursor -> Task
+
+    async def request(cursor):
+        if rate_limiter is not None:
+            await controlled(rate_limiter.acquire(), control)
+        return await controlled(
+            fetch_reply_page(aweme_id, comment_id, cookie, cursor, str(page_size), client=client), control
+        )
+
+    def plan(cursor, limit):
+        """从cursor开始推算concurrency页并提前请求，丢弃其余推算的页；cursor为None时全部丢弃"""
+        wanted = set()
+        if cursor is not None:
+            start = int(cursor)
+            wanted = {str(offset) for offset in range(start, min(limit, start + concurrency * page_size), page_size)}
+        for key in list(pending):
+            if key not in wanted:
+                _drop_task(pending.pop(key))
+        for key in sorted(wanted - pending.keys(), key=int):
+            pending[key] = asyncio.ensure_future(request(key))
+
+    async def fetch_page(cursor):
+        task = pending.pop(cursor, None)
+        for attempt in range(max_retries + 1):
+            try:
+                page = await (task if task is not None else request(cursor))
+                if rate_limiter is not None:
+                    rate_limiter.on_success()
+                return page
+            except ValueError as e:
+                task = None
+                if rate_limiter is not None:
+                    rate_limiter.on_backoff(str(e))
+                if attempt >= max_retries:
+                    raise ValueError(f"获取评论 {comment_id} 的回复失败: {str(e)}")
+                logger.warning(f"获取评论 {comment_id} 的回复出错: {str(e)}，第{attempt + 1}次重试")
+                if rate_limiter is None:
+                    await controlled(asyncio.sleep(1), control)
+
     try:
         cursor = "0"
         all_replies = []
-        has_more = True
-        
-        while has_more:
-            replies = await fetch_replies(aweme_id, comment_id, cookie, cursor)
-            if not replies:
-                break
-                
+        visited = set()
+        while True:
+            visited.add(cursor)
+            replies, has_more, next_cursor, page_total = await fetch_page(cursor)
             all_replies.extend(replies)
-            logger.info(f"已获取评论 {comment_id} 的 {len(all_replies)} 条回复")
-            
-            # 检查是否还有更多回复
-            has_more = len(replies) == 50  # 如果返回的回复数量等于请求的数量，说明可能还有更多
-            cursor = str(len(all_replies))  # 更新cursor
-            
-            # 添加延时避免请求过快
-            await asyncio.sleep(1)
-            
-        return all_replies
+            if not has_more or not replies:
+                break
+            if next_cursor in visited:
+                logger.warning(f"评论 {comment_id} 的回复cursor没有前进: {next_cursor}，停止获取")
+                break
+            regular = cursor.isdigit() and next_cursor.isdigit() and int(next_cursor) == int(cursor) + page_size
+            plan(next_cursor if regular and concurrency > 1 else None, page_total or total)
+            cursor = next_cursor
+            # 没有提前请求的页按顺序获取，避免请求过快
+            if rate_limiter is None and cursor not in pending:
+                await controlled(asyncio.sleep(1), control)
         
-    except Exception as e:
-        logger.error(f"获取所有回复时发生错误: {str(e)}")
-        return []
+        logger.info(f"已获取评论 {comment_id} 的 {len(all_replies)} 条回复")
+        return all_replies
+    finally:
+        for task in pending.values():
+            _drop_task(task)
+        if pending:
+            await asyncio.gather(*pending.values(), return_exceptions=True)
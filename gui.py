@@ -3,21 +3,27 @@ import os
 import asyncio
 import pandas as pd
 import traceback
-import re
 import requests
 import json
 from urllib.parse import urlparse
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
+    QLineEdit, QPushButton, QTableView,
     QLabel, QCheckBox, QProgressBar, QMessageBox, QHeaderView,
     QTextEdit, QRadioButton, QButtonGroup, QTabWidget, QStatusBar,
     QFileDialog, QGroupBox
 )
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QRect
 from PyQt6.QtGui import QColor, QFont, QPainter, QPen
-from main import fetch_all_comments_async, fetch_all_replies_async, process_comments, process_replies, load_cookie
+from main import crawl_to_csv_async, load_cookie, COLUMNS
+from share_link import extract_video_id
+from cookie_pool import CookiePool, read_cookies, INVALID_MARKERS
+from writers import ParquetAppendWriter, XlsxStreamWriter, comment_schema
+from table_model import CommentTableModel
+from crawl_control import CrawlControl
+from sqlite_store import SqliteStore, DEFAULT_DB_PATH
 from fetch_comments import fetch_all_comments
+from http_session import SessionManager
 from deepseek_api import DeepSeekAPI
 from loguru import logger
 from login_window import LoginWindow
@@ -41,32 +47,120 @@ logger.add(
 
 class CommentWorker(QThread):
     """后台工作线程，用于获取评论数据"""
-    finished = pyqtSignal(object)  # 完成信号
+    finished = pyqtSignal(object)  # 完成信号（保存路径、发送的行数、是否被停止）
     progress = pyqtSignal(int)     # 进度信号
     error = pyqtSignal(str)        # 错误信号
     log = pyqtSignal(str)          # 日志信号
+    rows = pyqtSignal(object)      # 新采集到的一批数据（DataFrame）
 
-    def __init__(self, aweme_id, get_replies=False, cookie=None):
+    ROW_BATCH = 200       # 攒够多少行发送一次
+    ROW_INTERVAL = 0.5    # 最长多少秒发送一次
+
+    def __init__(self, aweme_id, get_replies=False, cookie=None, resume=False, pool=None, db_path=None):
         super().__init__()
         self.aweme_id = aweme_id
         self.get_replies = get_replies
         self.cookie = cookie
+        self.resume = resume
+        self.pool = pool  # CookiePool，传入时从账号池分配账号
+        self.db_path = db_path  # SQLite数据库路径，传入时同时写入数据库
+        self.store = None
+        self._pending = []
+        self._last_emit = 0.0
+        self._percent = -1
+        self.row_count = 0  # 已通过rows信号发送的行数
+        self.control = CrawlControl()  # 界面线程通过它取消或暂停采集
+
+    def stop(self):
+        """停止采集（可在界面线程调用），已采集的数据和断点都会保留"""
+        self.control.cancel()
+
+    def pause(self):
+        """暂停采集，不再发出请求，账号的请求预算留给其他采集"""
+        self.control.pause()
+
+    def resume_crawl(self):
+        """继续暂停的采集"""
+        self.control.resume()
+
+    def _on_rows(self, rows, status):
+        """crawl_to_csv_async每写入一批行时调用：按批发送新数据，并按评论总数更新进度"""
+        self._pending.extend(rows)
+        self.row_count += len(rows)
+        if status["stage"] == "comments":
+            total = status["total_comments"]
+            part = min(status["comment_count"] / total, 1.0) if total else 0.0
+            percent = int(part * (50 if self.get_replies else 99))
+        else:
+            targets = status["reply_targets"]
+            percent = 50 + int((status["replies_done"] / targets if targets else 1.0) * 49)
+        if percent != self._percent:
+            self._percent = percent
+            self.progress.emit(percent)
+        if len(self._pending) >= self.ROW_BATCH or time.time() - self._last_emit >= self.ROW_INTERVAL:
+            self._flush_rows()
+
+    def _flush_rows(self):
+        if self._pending:
+            rows, self._pending = self._pending, []
+            self.rows.emit(pd.DataFrame(rows, columns=COLUMNS))
+        self._last_emit = time.time()
+
+    def _run_crawl(self, loop, **kwargs):
+        """在事件循环中运行一次采集，stop()时采集在下一个请求或限速等待处结束并返回"""
+        try:
+            return loop.run_until_complete(crawl_to_csv_async(
+                self.aweme_id, get_replies=self.get_replies, on_rows=self._on_rows, control=self.control,
+                store=self.store, **kwargs
+            ))
+        finally:
+            self._flush_rows()
+        
+    def _crawl(self, loop, session, resume):
+        """使用账号池中的账号采集，账号失效或被隔离时从断点换下一个账号继续"""
+        if self.pool is None:
+            return self._run_crawl(loop, resume=resume, session=session, cookie=self.cookie)
+        for attempt in range(len(self.pool)):
+            account = self.pool.acquire()
+            if account is None:
+                raise ValueError("没有空闲的可用账号，账号可能都在隔离中，请稍后再试")
+            self.log.emit(f"使用 {account.name} 采集")
+            try:
+                return self._run_crawl(
+                    loop, resume=resume or attempt > 0, session=session,
+                    cookie=account.cookie, rate_controller=account.controller
+                )
+            except ValueError as e:
+                # 请求的退避已经由账号的限速器计入健康统计，这里只停用Cookie失效的账号
+                if any(marker in str(e) for marker in INVALID_MARKERS):
+                    self.pool.report_failure(account, str(e))
+                if account.available:
+                    raise
+                self.log.emit(f"{account.name} 不可用，从断点换账号继续: {str(e)}")
+            finally:
+                self.pool.release(account)
+                self.log.emit(f"{account.name} 状态: {account.stats()}")
+        raise ValueError("Cookie已失效，账号池中没有可用的账号")
         
     def run(self):
         try:
             self.log.emit("开始创建事件循环...")
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
+            # 评论和回复共用同一个HTTP会话
+            session = SessionManager()
+            if self.db_path:
+                # 数据库连接只能在创建它的线程中使用，在采集线程中打开
+                self.store = SqliteStore(self.db_path)
+                self.log.emit(f"评论和回复同时写入数据库 {self.db_path}")
             
-            # 使用传入的cookie
-            if self.cookie:
-                os.environ["DOUYIN_COOKIE"] = self.cookie
-            
-            self.log.emit(f"开始获取视频 {self.aweme_id} 的评论...")
+            if self.resume:
+                self.log.emit(f"从断点继续采集视频 {self.aweme_id} 的评论...")
+            else:
+                self.log.emit(f"开始获取视频 {self.aweme_id} 的评论...")
             try:
-                comments = loop.run_until_complete(fetch_all_comments_async(self.aweme_id))
-                if not comments:
-                    raise Exception("未获取到评论数据")
+                # 边采集边写入CSV并保存断点，中断后可勾选断点续采继续
+                save_path = self._crawl(loop, session, self.resume)
             except ValueError as e:
                 error_msg = str(e)
                 if "Cookie已失效" in error_msg:
@@ -76,27 +170,19 @@ class CommentWorker(QThread):
                 elif "IP被限制" in error_msg:
                     raise Exception("IP被限制，请稍后再试")
                 else:
-                    raise Exception(f"获取评论失败: {error_msg}")
+                    raise Exception(f"获取评论失败: {error_msg}，可勾选断点续采后重试")
                 
-            self.log.emit("处理评论数据...")
-            comments_df = process_comments(comments)
-            self.log.emit(f"成功获取 {len(comments)} 条评论")
-            
-            if self.get_replies:
-                self.log.emit("开始获取评论回复...")
-                try:
-                    replies = loop.run_until_complete(fetch_all_replies_async(comments))
-                    self.log.emit(f"成功获取 {len(replies)} 条回复")
-                    replies_df = process_replies(replies, comments_df)
-                    result = pd.concat([comments_df, replies_df], ignore_index=True)
-                except Exception as e:
-                    self.log.emit(f"获取回复时出错: {str(e)}")
-                    # 如果获取回复失败，仍然返回评论数据
-                    result = comments_df
+            if self.control.cancelled:
+                # 已写入的数据和断点都已提交，返回目前采集到的部分
+                self.log.emit("采集已停止，可勾选断点续采继续")
             else:
-                result = comments_df
-                
-            self.finished.emit(result)
+                self.progress.emit(100)
+            # 数据已经逐批发送到表格，不再把整个CSV读回内存；停止时可能一行都还没有写入
+            if self.row_count:
+                self.log.emit(f"成功获取 {self.row_count} 条数据，已保存到 {save_path}")
+            else:
+                self.log.emit("本次没有采集到新数据")
+            self.finished.emit({"save_path": save_path, "rows": self.row_count, "cancelled": self.control.cancelled})
             
         except Exception as e:
             error_msg = str(e)
@@ -104,76 +190,44 @@ class CommentWorker(QThread):
             self.error.emit(error_msg)
         finally:
             try:
+                if self.store is not None:
+                    self.store.close()
+                loop.run_until_complete(session.aclose())
                 loop.close()
                 self.log.emit("事件循环已关闭")
             except Exception as e:
                 logger.error(f"关闭事件循环时出错: {str(e)}")
 
-def extract_video_id(share_text):
-    """从分享文本中提取视频ID"""
-    try:
-        # 尝试直接匹配数字ID
-        if share_text.isdigit():
-            return share_text
-            
-        # 尝试直接从URL中提取视频ID
-        video_id_pattern = r'/video/(\d+)'
-        match = re.search(video_id_pattern, share_text)
-        if match:
-            return match.group(1)
-            
-        # 匹配短链接
-        url_pattern = r'https?://[^\s<>"]+|www\.[^\s<>"]+|v\.douyin\.com/[^\s<>"]+'
-        urls = re.findall(url_pattern, share_text)
-        
-        if not urls:
-            return None
-            
-        # 获取第一个URL
-        url = urls[0]
-        
-        # 如果是短链接，尝试使用高级请求头获取重定向后的URL
-        if 'v.douyin.com' in url:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
-                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-                "Accept-Encoding": "gzip, deflate",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1"
-            }
-            
-            # 设置重试次数
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    session = requests.Session()
-                    # 禁用重定向，手动处理
-                    response = session.get(url, headers=headers, allow_redirects=False, timeout=10)
-                    
-                    # 检查是否有重定向
-                    if response.status_code in [301, 302]:
-                        redirect_url = response.headers.get('Location')
-                        if redirect_url:
-                            # 从重定向URL中提取视频ID
-                            match = re.search(video_id_pattern, redirect_url)
-                            if match:
-                                return match.group(1)
-                    break
-                except requests.exceptions.RequestException as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        logger.error(f"重试{max_retries}次后仍然失败: {str(e)}")
-                        return None
-                    logger.warning(f"第{retry_count}次重试...")
-                    time.sleep(1)  # 重试前等待1秒
-                    
-        return None
-    except Exception as e:
-        logger.error(f"解析分享链接时出错: {str(e)}")
-        return None
+class ExportWorker(QThread):
+    """后台导出线程，流式写入Excel或Parquet，不阻塞界面"""
+    finished = pyqtSignal(str)  # 完成信号（文件路径和说明）
+    progress = pyqtSignal(int)  # 进度信号（百分比）
+    error = pyqtSignal(str)     # 错误信号
+
+    def __init__(self, data: pd.DataFrame, file_path: str):
+        super().__init__()
+        self.data = data
+        self.file_path = file_path
+
+    def _report(self, written, total):
+        self.progress.emit(int(written * 100 / total) if total else 100)
+
+    def run(self):
+        try:
+            if self.file_path.endswith('.parquet'):
+                # Parquet保留类型：评论ID为int64，评论时间为时间戳
+                with ParquetAppendWriter(self.file_path, schema=comment_schema()) as writer:
+                    writer.write_frame(self.data, progress=self._report)
+                self.finished.emit(f"数据已保存到Parquet文件: {self.file_path}")
+            else:
+                # write_only模式逐行写盘，超过Excel单表行数上限时自动分表
+                with XlsxStreamWriter(self.file_path) as writer:
+                    writer.write_frame(self.data, progress=self._report)
+                sheets = f"，共 {writer.sheet_count} 个工作表" if writer.sheet_count > 1 else ""
+                self.finished.emit(f"数据已保存到Excel文件: {self.file_path}{sheets}")
+        except Exception as e:
+            logger.error(f"导出数据时出错: {str(e)}")
+            self.error.emit(str(e))
 
 class CookieManager:
     """Cookie管理类"""
@@ -277,6 +331,56 @@ class CookieManager:
         except Exception as e:
             return False, f"验证出错: {str(e)}"
 
+class CookiePoolManager(CookieManager):
+    """
+    多账号Cookie管理
+
+    在单账号的cookie.txt之外，把更多账号保存到cookie_pool.txt（每行一个Cookie），
+    采集时由CookiePool轮流分配账号并统计每个账号的成功率和403比例，失败过多的账号自动隔离。
+    """
+    def __init__(self):
+        super().__init__()
+        self.pool_file = "cookie_pool.txt"
+        self.pool = None
+        
+    def load_accounts(self, current_cookie=None):
+        """读取所有账号，当前验证通过的Cookie排在最前面"""
+        cookies = [current_cookie] if current_cookie else []
+        if os.path.exists(self.pool_file):
+            try:
+                pool_cookies, _ = read_cookies(self.pool_file)
+                cookies.extend(pool_cookies)
+            except ValueError:
+                pass
+        return list(dict.fromkeys(c.strip() for c in cookies if c and c.strip()))
+        
+    def add_account(self, cookies_json):
+        """把JSON格式的Cookies添加到账号池"""
+        try:
+            cookies_data = json.loads(cookies_json)
+            cookie_str = "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in cookies_data])
+            if cookie_str in self.load_accounts():
+                return False, "该账号已在账号池中"
+            with open(self.pool_file, "a", encoding="utf-8") as f:
+                f.write(cookie_str + "\n")
+            return True, f"已添加到账号池，当前共 {len(self.load_accounts())} 个账号"
+        except Exception as e:
+            return False, f"添加账号失败: {str(e)}"
+            
+    def get_pool(self, current_cookie=None, max_in_flight=1):
+        """
+        获取账号池，账号列表未变化时复用已有的CookiePool，保留健康统计和隔离状态
+
+        Returns:
+            CookiePool: 没有任何账号时返回None
+        """
+        cookies = self.load_accounts(current_cookie)
+        if not cookies:
+            return None
+        if self.pool is None or [a.cookie for a in self.pool.accounts] != cookies:
+            self.pool = CookiePool(cookies, strategy="least_loaded", max_in_flight=max_in_flight)
+        return self.pool
+
 class AIAnalysisWorker(QThread):
     """AI分析工作线程"""
     finished = pyqtSignal(str)  # 完成信号
@@ -344,6 +448,8 @@ class LoadingSpinner(QWidget):
         painter.drawArc(rect, self.counter * 16, 300 * 16)
 
 class MainWindow(QMainWindow):
+    WORKER_STOP_TIMEOUT = 10000  # 关闭窗口时等待采集线程结束的最长时间（毫秒）
+
     def __init__(self, token):
         super().__init__()
         self.token = token  # 保存登录token
@@ -364,7 +470,7 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 1200, 800)
         
         # 初始化Cookie管理器
-        self.cookie_manager = CookieManager()
+        self.cookie_manager = CookiePoolManager()
         self.current_cookie = None
         
         # 创建定时器检查登录状态
@@ -476,53 +582,88 @@ class MainWindow(QMainWindow):
             return
             
         # 创建工作线程
-        self.worker = CommentWorker(video_id, self.get_replies_checkbox.isChecked(), self.current_cookie)
+        self.worker = CommentWorker(
+            video_id, self.get_replies_checkbox.isChecked(), self.current_cookie,
+            resume=self.resume_checkbox.isChecked(),
+            pool=self.cookie_manager.get_pool(self.current_cookie),
+            db_path=DEFAULT_DB_PATH if self.db_checkbox.isChecked() else None
+        )
         self.worker.finished.connect(self.on_collection_finished)
         self.worker.error.connect(self.on_collection_error)
         self.worker.log.connect(self.add_log)
+        self.worker.rows.connect(self.on_rows_received)
+        self.worker.progress.connect(self.progress_bar.setValue)
+        
+        # 清空上次的结果，采集过程中逐批显示
+        self.current_data = None
+        self.table_model.set_frame(None)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.stop_button.setEnabled(True)
+        self.pause_button.setText("暂停采集")
+        self.pause_button.setEnabled(True)
         self.worker.start()
 
-    def on_collection_finished(self, data):
-        """采集完成的回调"""
+    def stop_collection(self):
+        """停止采集，保留已采集的数据"""
+        if self.worker is not None and self.worker.isRunning():
+            self.stop_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
+            self.add_log("正在停止采集...")
+            self.worker.stop()
+
+    def toggle_pause(self):
+        """暂停或继续采集，暂停期间不发出请求，已采集的数据可以照常导出"""
+        if self.worker is None or not self.worker.isRunning():
+            return
+        if self.worker.control.paused:
+            self.worker.resume_crawl()
+            self.pause_button.setText("暂停采集")
+            self.add_log("继续采集")
+        else:
+            self.worker.pause()
+            self.pause_button.setText("继续采集")
+            self.add_log("采集已暂停，正在进行的请求完成后不再发出新请求")
+
+    def on_rows_received(self, batch):
+        """采集过程中收到一批新数据"""
+        first_batch = self.table_model.total_rows == 0
+        self.table_model.append_frame(batch)
+        if first_batch:
+            self.table.resizeColumnsToContents()
+        # 采集过程中也可以导出已采集的部分
+        self.save_button.setEnabled(True)
+
+    def on_collection_finished(self, result):
+        """采集完成的回调，数据已经在采集过程中逐批加入表格"""
         try:
             # 停止加载动画
             self.loading_spinner.stop()
+            self.progress_bar.setVisible(False)
+            self.stop_button.setEnabled(False)
+            self.pause_button.setEnabled(False)
             
             # 启用开始采集按钮
             self.start_button.setEnabled(True)
             
             # 检查数据有效性
-            if data is None or data.empty:
+            if not result["rows"]:
+                if result["cancelled"]:
+                    self.add_log("采集已停止，未获取到数据")
+                    return
                 self.add_log("未获取到有效数据")
                 QMessageBox.warning(self, "提示", "未获取到有效数据")
                 return
                 
-            # 保存数据用于导出
-            self.current_data = data
-            
-            # 清空表格
-            self.table.setRowCount(0)
-            
-            # 填充数据到表格
-            for index, row in data.iterrows():
-                row_position = self.table.rowCount()
-                self.table.insertRow(row_position)
-                
-                # 设置单元格内容
-                self.table.setItem(row_position, 0, QTableWidgetItem(str(row.get('评论ID', ''))))
-                self.table.setItem(row_position, 1, QTableWidgetItem(str(row.get('评论内容', ''))))
-                self.table.setItem(row_position, 2, QTableWidgetItem(str(row.get('点赞数', 0))))
-                self.table.setItem(row_position, 3, QTableWidgetItem(str(row.get('评论时间', ''))))
-                self.table.setItem(row_position, 4, QTableWidgetItem(str(row.get('用户昵称', ''))))
-                self.table.setItem(row_position, 5, QTableWidgetItem(str(row.get('用户抖音号', ''))))
-                self.table.setItem(row_position, 6, QTableWidgetItem(str(row.get('ip归属', ''))))
-                self.table.setItem(row_position, 7, QTableWidgetItem(str(row.get('回复总数', 0))))
+            # 保存数据用于导出（多批数据在此时合并）
+            self.current_data = self.table_model.frame()
+            self.table.resizeColumnsToContents()
             
             # 启用保存按钮
             self.save_button.setEnabled(True)
             
             # 添加日志
-            total_rows = self.table.rowCount()
+            total_rows = self.table_model.total_rows
             self.add_log(f"数据采集完成，共获取 {total_rows} 条数据")
             
             # 显示完成消息
@@ -540,6 +681,9 @@ class MainWindow(QMainWindow):
         """采集出错的回调"""
         # 停止加载动画
         self.loading_spinner.stop()
+        self.progress_bar.setVisible(False)
+        self.stop_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
         
         # 启用开始采集按钮
         self.start_button.setEnabled(True)
@@ -681,36 +825,83 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"复制Cookies时出错: {str(e)}")
 
+    def add_to_cookie_pool(self):
+        """把输入框中的Cookies添加到账号池"""
+        cookies_json = self.cookie_input.toPlainText().strip()
+        if not cookies_json:
+            QMessageBox.warning(self, "警告", "请先粘贴Cookies内容")
+            return
+        success, message = self.cookie_manager.add_account(cookies_json)
+        self.update_pool_status()
+        if success:
+            QMessageBox.information(self, "成功", message)
+        else:
+            QMessageBox.warning(self, "失败", message)
+            
+    def update_pool_status(self):
+        """显示账号池中的账号数"""
+        count = len(self.cookie_manager.load_accounts(self.current_cookie))
+        self.pool_status_label.setText(f"账号池: {count} 个账号")
+
     def save_data(self):
-        """保存数据到Excel文件"""
+        """在后台线程中保存数据到Excel或Parquet文件"""
         try:
-            if not hasattr(self, 'current_data') or self.current_data is None:
+            # 采集过程中导出已采集的部分
+            data = getattr(self, 'current_data', None)
+            if data is None:
+                data = self.table_model.frame()
+            if data.empty:
                 QMessageBox.warning(self, "警告", "没有可保存的数据")
                 return
                 
             # 获取保存文件路径
-            file_path, _ = QFileDialog.getSaveFileName(
+            file_path, selected_filter = QFileDialog.getSaveFileName(
                 self,
                 "保存数据",
                 "抖音评论数据.xlsx",
-                "Excel Files (*.xlsx);;All Files (*)"
+                "Excel Files (*.xlsx);;Parquet Files (*.parquet);;All Files (*)"
             )
             
             if file_path:
+                if selected_filter.startswith('Parquet') and not file_path.endswith(('.xlsx', '.parquet')):
+                    file_path += '.parquet'
                 # 如果用户没有指定.xlsx后缀，添加它
-                if not file_path.endswith('.xlsx'):
+                elif not file_path.endswith(('.xlsx', '.parquet')):
                     file_path += '.xlsx'
                     
-                # 保存数据到Excel
-                self.current_data.to_excel(file_path, index=False, engine='openpyxl')
-                self.add_log(f"数据已保存到: {file_path}")
-                QMessageBox.information(self, "成功", "数据已成功保存到Excel文件")
+                self.save_button.setEnabled(False)
+                self.add_log(f"正在保存 {len(data)} 条数据...")
+                self.export_worker = ExportWorker(data, file_path)
+                # 采集过程中进度条显示采集进度，导出只记录日志
+                if not self.is_collecting():
+                    self.progress_bar.setValue(0)
+                    self.progress_bar.setVisible(True)
+                    self.export_worker.progress.connect(self.progress_bar.setValue)
+                self.export_worker.finished.connect(self.on_export_finished)
+                self.export_worker.error.connect(self.on_export_error)
+                self.export_worker.start()
                 
         except Exception as e:
             error_msg = f"保存数据时出错:\n{str(e)}"
             logger.error(error_msg)
             QMessageBox.critical(self, "错误", error_msg)
 
+    def is_collecting(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def on_export_finished(self, message):
+        """导出完成的回调"""
+        self.progress_bar.setVisible(self.is_collecting())
+        self.save_button.setEnabled(True)
+        self.add_log(message)
+        QMessageBox.information(self, "成功", message)
+
+    def on_export_error(self, error_msg):
+        """导出出错的回调"""
+        self.progress_bar.setVisible(self.is_collecting())
+        self.save_button.setEnabled(True)
+        QMessageBox.critical(self, "错误", f"保存数据时出错:\n{error_msg}")
+
     def create_ai_analysis_tab(self):
         """创建AI分析标签页"""
         ai_tab = QWidget()
@@ -852,16 +1043,30 @@ class MainWindow(QMainWindow):
         self.input_field = QLineEdit()
         self.input_field.setPlaceholderText("请粘贴抖音分享链接")
         self.get_replies_checkbox = QCheckBox("获取评论回复")
+        self.resume_checkbox = QCheckBox("断点续采")
+        self.resume_checkbox.setToolTip("从上次中断的位置继续采集，只获取剩余的评论和回复")
+        self.db_checkbox = QCheckBox("写入数据库")
+        self.db_checkbox.setToolTip(f"评论、回复和用户同时保存到SQLite数据库（{DEFAULT_DB_PATH}），所有视频累积保存")
         self.start_button = QPushButton("开始采集")
         self.save_button = QPushButton("保存数据")
         self.start_button.clicked.connect(self.start_collection)
         self.save_button.clicked.connect(self.save_data)
         self.save_button.setEnabled(False)
+        self.stop_button = QPushButton("停止采集")
+        self.stop_button.clicked.connect(self.stop_collection)
+        self.stop_button.setEnabled(False)
+        self.pause_button = QPushButton("暂停采集")
+        self.pause_button.clicked.connect(self.toggle_pause)
+        self.pause_button.setEnabled(False)
         
         input_layout.addWidget(QLabel("分享链接:"))
         input_layout.addWidget(self.input_field)
         input_layout.addWidget(self.get_replies_checkbox)
+        input_layout.addWidget(self.resume_checkbox)
+        input_layout.addWidget(self.db_checkbox)
         input_layout.addWidget(self.start_button)
+        input_layout.addWidget(self.pause_button)
+        input_layout.addWidget(self.stop_button)
         input_layout.addWidget(self.save_button)
         
         # 创建进度条
@@ -874,16 +1079,16 @@ class MainWindow(QMainWindow):
         self.log_display.setMaximumHeight(100)
         
         # 创建表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
+        self.table_model = CommentTableModel(COLUMNS, [
             "评论ID", "评论内容", "点赞数", "评论时间",
             "用户昵称", "用户抖音号", "IP归属", "回复总数"
         ])
-        # 设置表格列宽自动调整
-        header = self.table.horizontalHeader()
-        for i in range(8):
-            header.setSectionResizeMode(i, QHeaderView.ResizeMode.ResizeToContents)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        # 列宽在加载数据时按第一批行调整一次，行高固定，避免逐行测量
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.table.horizontalHeader().setMaximumSectionSize(400)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         
         # 创建加载动画容器
         spinner_container = QWidget()
@@ -923,14 +1128,19 @@ class MainWindow(QMainWindow):
         self.import_cookie_btn = QPushButton("导入Cookies")
         self.verify_cookie_btn = QPushButton("验证Cookies")
         self.copy_cookie_btn = QPushButton("复制Cookies")
+        self.add_pool_btn = QPushButton("添加到账号池")
+        self.pool_status_label = QLabel()
         
         self.import_cookie_btn.clicked.connect(self.import_cookies)
+        self.add_pool_btn.clicked.connect(self.add_to_cookie_pool)
         self.verify_cookie_btn.clicked.connect(self.verify_cookies)
         self.copy_cookie_btn.clicked.connect(self.copy_cookies)
         
         cookie_buttons_layout.addWidget(self.import_cookie_btn)
         cookie_buttons_layout.addWidget(self.verify_cookie_btn)
         cookie_buttons_layout.addWidget(self.copy_cookie_btn)
+        cookie_buttons_layout.addWidget(self.add_pool_btn)
+        cookie_buttons_layout.addWidget(self.pool_status_label)
         
         cookie_layout.addLayout(cookie_buttons_layout)
         
@@ -941,6 +1151,7 @@ class MainWindow(QMainWindow):
         
         # 尝试加载保存的Cookies
         self.load_saved_cookies()
+        self.update_pool_status()
 
     def ask_ai_question(self):
         """处理自定义AI提问"""
@@ -1013,6 +1224,13 @@ class MainWindow(QMainWindow):
             self.check_login_timer.stop()
         if hasattr(self, 'cookie_timer'):
             self.cookie_timer.stop()
+        # 取消正在进行的采集，已写入的数据和断点保留在磁盘上
+        worker = getattr(self, 'worker', None)
+        if worker is not None and worker.isRunning():
+            worker.blockSignals(True)  # 窗口关闭后不再显示采集结果
+            worker.stop()
+            if not worker.wait(self.WORKER_STOP_TIMEOUT):
+                logger.error("采集线程未能及时停止")
         event.accept()
         
     def check_login_status(self):
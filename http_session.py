@@ -0,0 +1,78 @@
+import hashlib
+import importlib.util
+import httpx
+from contextlib import asynccontextmanager
+from loguru import logger
+from typing import Dict, Optional
+
+# 是否安装了HTTP/2支持（httpx[http2]依赖h2）
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+class SessionManager:
+    """
+    采集会话管理器
+
+    为每个Cookie（账号）维护一个长期存在的httpx.AsyncClient，
+    同一次采集中的所有分页请求复用同一个连接池，避免每页都重新进行TCP和TLS握手。
+    """
+
+    def __init__(self, http2: bool = True, max_connections: int = 20,
+                 max_keepalive_connections: int = 10, keepalive_expiry: float = 30.0,
+                 timeout: float = 60.0):
+        """
+        Args:
+            http2: 是否启用HTTP/2（未安装h2时自动退回HTTP/1.1）
+            max_connections: 每个客户端的最大连接数
+            max_keepalive_connections: 每个客户端保持的空闲连接数
+            keepalive_expiry: 空闲连接保持时间（秒）
+            timeout: 请求超时时间（秒）
+        """
+        if http2 and not HTTP2_AVAILABLE:
+            logger.debug("未安装h2，HTTP/2不可用，将使用HTTP/1.1（pip install httpx[http2]）")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _key(cookie: Optional[str]) -> str:
+        return hashlib.md5((cookie or "").encode("utf-8")).hexdigest()
+
+    def get_client(self, cookie: Optional[str] = None) -> httpx.AsyncClient:
+        """获取指定Cookie对应的客户端，不存在时创建"""
+        key = self._key(cookie)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+            self._clients[key] = client
+            logger.debug(f"创建HTTP会话: {key[:8]}，HTTP/2: {self.http2}")
+        return client
+
+    async def aclose(self):
+        """关闭所有客户端"""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"关闭HTTP会话时出错: {str(e)}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+@asynccontextmanager
+async def client_scope(client: Optional[httpx.AsyncClient] = None, timeout: float = 60):
+    """传入客户端时直接复用（不关闭），否则创建一个仅用于本次请求的临时客户端"""
+    if client is not None:
+        yield client
+        return
+    async with httpx.AsyncClient(timeout=timeout) as temp_client:
+        yield temp_client
@@ -1,11 +1,18 @@
 import os
 import asyncio
+import argparse
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from fetch_comments import fetch_all_comments, check_comments_count
-from fetch_replies import fetch_replies
+from datetime import datetime, timezone
+from fetch_comments import fetch_all_comments, check_comments_count, iter_comment_pages
+from fetch_replies import fetch_all_replies, REPLY_PAGE_CONCURRENCY
+from http_session import SessionManager
+from rate_limit import RateController
+from dedup import DedupIndex
+from writers import CsvAppendWriter, csv_to_parquet
+from checkpoint import CrawlCheckpoint
+from crawl_control import CrawlCancelled, controlled
 from loguru import logger
-import random
 
 def load_cookie():
     """从环境变量或文件加载cookie"""
@@ -26,8 +33,30 @@ def load_cookie():
     logger.info("从文件加载cookie成功")
     return cookie
 
-async def fetch_all_comments_async(aweme_id):
-    """异步获取所有评论"""
+async def fetch_all_comments_async(aweme_id, session=None, dedup=None, control=None):
+    """
+    异步获取所有评论
+
+    Args:
+        aweme_id: 视频ID
+        session: SessionManager会话管理器，不传时在本次采集内部创建并在结束时关闭
+        dedup: DedupIndex去重索引，可与回复采集共用
+        control: CrawlControl取消/暂停令牌，取消时返回已获取的评论
+    """
+    own_session = session is None
+    if own_session:
+        session = SessionManager()
+    try:
+        return await _fetch_all_comments_with_session(aweme_id, session, dedup, control)
+    finally:
+        if own_session:
+            await session.aclose()
+
+async def _fetch_all_comments_with_session(aweme_id, session, dedup=None, control=None):
+    if dedup is None:
+        dedup = DedupIndex()
+    # 重试时从头采集，需要清掉本次失败采集登记的ID
+    dedup_was_empty = len(dedup) == 0
     max_retries = 3
     retry_count = 0
     last_error = None
@@ -35,10 +64,11 @@ async def fetch_all_comments_async(aweme_id):
     while retry_count < max_retries:
         try:
             cookie = load_cookie()
+            client = session.get_client(cookie)
             
             # 检查评论总数
             try:
-                total_comments = await check_comments_count(aweme_id, cookie)
+                total_comments = await controlled(check_comments_count(aweme_id, cookie, client=client), control)
                 if total_comments == 0:
                     logger.warning("未检测到评论数量，将使用默认模式")
                 else:
@@ -54,12 +84,18 @@ async def fetch_all_comments_async(aweme_id):
                 logger.warning(f"检查评论数量失败: {str(e)}，将使用默认模式")
                 use_batch_mode = None
             
-            comments = await fetch_all_comments(aweme_id, cookie, use_batch_mode)
+            if dedup_was_empty:
+                dedup.clear()
+            comments = await fetch_all_comments(aweme_id, cookie, use_batch_mode, client=client, dedup=dedup,
+                                                control=control)
+            if control is not None and control.cancelled:
+                # 取消时不再重试，返回已获取的部分
+                return [c for c in comments if isinstance(c, dict) and "cid" in c and "text" in c]
             
             if not comments:
                 retry_count += 1
                 logger.warning(f"未获取到评论数据，第{retry_count}次重试")
-                await asyncio.sleep(2)
+                await controlled(asyncio.sleep(2), control)
                 continue
                 
             if not isinstance(comments, list):
@@ -83,209 +119,594 @@ async def fetch_all_comments_async(aweme_id):
             retry_count += 1
             last_error = error_msg
             logger.warning(f"获取评论出错: {error_msg}，第{retry_count}次重试")
-            await asyncio.sleep(2)
+            await controlled(asyncio.sleep(2), control)
         except Exception as e:
             retry_count += 1
             last_error = str(e)
             logger.error(f"获取评论时发生错误: {str(e)}，第{retry_count}次重试")
-            await asyncio.sleep(2)
+            await controlled(asyncio.sleep(2), control)
     
     error_msg = f"达到最大重试次数，采集失败。最后一次错误: {last_error}" if last_error else "达到最大重试次数，采集失败"
     raise ValueError(error_msg)  # 改为抛出异常而不是返回None
 
-async def fetch_all_replies_async(comments):
-    """异步获取所有回复"""
+# 并发获取回复的默认参数
+DEFAULT_REPLY_CONCURRENCY = 4  # 同时进行的回复请求数
+DEFAULT_REPLY_RATE = 2.0  # 所有回复请求合计每秒最多请求数
+
+async def iter_replies_async(comments, session=None, concurrency=DEFAULT_REPLY_CONCURRENCY,
+                             rate=DEFAULT_REPLY_RATE, rate_limiter=None, max_errors=3, cookie=None, control=None,
+                             page_concurrency=REPLY_PAGE_CONCURRENCY):
+    """
+    并发获取回复，按完成顺序逐条产出 (评论, 该评论的全部回复)
+
+    每条评论的回复按服务端cursor分页获取（见fetch_replies.fetch_all_replies），回复超过一页的评论
+    按reply_comment_total规划各页并同时请求；所有请求共用同一个限速器。
+
+    Args:
+        comments: 一级评论列表
+        session: SessionManager会话管理器，不传时在内部创建并在结束时关闭
+        concurrency: 同时进行的回复请求数
+        rate: 初始每秒请求数，之后根据响应情况自适应调整，传入rate_limiter时忽略
+        rate_limiter: 共享的限速器（通常是账号共用的RateController），多个采集任务共用同一个请求预算
+        max_errors: 连续出错次数达到该值时停止获取剩余回复
+        cookie: 使用的Cookie，不传时从环境变量或cookie.txt加载
+        control: CrawlControl取消/暂停令牌，暂停时不再发出新请求，取消时抛出CrawlCancelled
+        page_concurrency: 回复较多的评论同时请求的页数
+    """
+    own_session = session is None
+    if own_session:
+        session = SessionManager()
+    tasks = []
+    try:
+        cookie = cookie or load_cookie()
+        client = session.get_client(cookie)
+        limiter = rate_limiter or RateController(rate, min_rate=min(rate, 0.1), max_rate=rate * 4, burst=concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        stop_event = asyncio.Event()
+        error_count = 0
+
+        async def harvest(comment):
+            nonlocal error_count
+            async with semaphore:
+                if stop_event.is_set():
+                    return comment, None
+                try:
+                    # 每页请求前从limiter获取令牌，成功或出错时由fetch_all_replies调整速率
+                    replies = await fetch_all_replies(
+                        comment.get("aweme_id", ""),
+                        comment.get("cid", ""),
+                        cookie,
+                        client=client,
+                        rate_limiter=limiter,
+                        control=control,
+                        total=comment.get("reply_comment_total", 0),
+                        concurrency=page_concurrency
+                    )
+                    if replies:
+                        error_count = 0  # 重置错误计数
+                        return comment, replies
+                    # 有回复的评论却返回空列表，通常是被限流
+                    error_msg = "未获取到回复"
+                    limiter.on_backoff(error_msg)
+                except Exception as e:
+                    error_msg = str(e)
+                error_count += 1
+                logger.error(f"获取评论 {comment.get('cid', '')} 的回复时出错: {error_msg}")
+                if error_count >= max_errors and not stop_event.is_set():
+                    logger.error("连续错误次数过多，跳过剩余回复获取")
+                    stop_event.set()
+                return comment, None
+
+        targets = [c for c in comments if isinstance(c, dict) and c.get("reply_comment_total", 0) > 0]
+        tasks = [asyncio.create_task(harvest(comment)) for comment in targets]
+        for future in asyncio.as_completed(tasks):
+            comment, replies = await future
+            if replies:
+                yield comment, replies
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if own_session:
+            await session.aclose()
+
+async def fetch_all_replies_async(comments, session=None, concurrency=DEFAULT_REPLY_CONCURRENCY,
+                                  rate=DEFAULT_REPLY_RATE, rate_limiter=None, dedup=None, control=None):
+    """
+    异步获取所有回复，通过control取消时返回已获取的部分
+
+    Args:
+        comments: 一级评论列表
+        session: SessionManager会话管理器，不传时在本次采集内部创建并在结束时关闭
+        concurrency: 同时进行的回复请求数
+        rate: 每秒最多请求数
+        rate_limiter: 共享的限速器
+        dedup: DedupIndex去重索引，可与评论采集共用
+        control: CrawlControl取消/暂停令牌
+    """
     try:
         if not comments or not isinstance(comments, list):
             logger.error("评论数据无效")
             return []
             
-        cookie = load_cookie()
         all_replies = []
-        total_replies = sum(comment.get("reply_comment_total", 0) for comment in comments if isinstance(comment, dict))
+        if dedup is None:
+            dedup = DedupIndex()
+        total_comments = sum(1 for c in comments if isinstance(c, dict) and c.get("reply_comment_total", 0) > 0)
         processed_count = 0
-        error_count = 0
-        max_errors = 3
         
-        for comment in comments:
-            if not isinstance(comment, dict):
-                continue
-                
-            reply_count = comment.get("reply_comment_total", 0)
-            if reply_count > 0:
-                try:
-                    replies = await fetch_replies(
-                        comment.get("aweme_id", ""),
-                        comment.get("cid", ""),
-                        cookie
-                    )
-                    
-                    if replies and isinstance(replies, list):
-                        # 检查重复回复
-                        existing_reply_ids = set(reply["cid"] for reply in all_replies if isinstance(reply, dict) and "cid" in reply)
-                        unique_replies = [r for r in replies if isinstance(r, dict) and "cid" in r and r["cid"] not in existing_reply_ids]
-                        
-                        if unique_replies:
-                            all_replies.extend(unique_replies)
-                            processed_count += 1
-                            logger.info(f"已处理 {processed_count}/{total_replies} 个评论的回复")
-                            error_count = 0  # 重置错误计数
-                        else:
-                            logger.warning(f"评论 {comment.get('cid', '')} 未获取到有效回复")
-                    
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"获取评论 {comment.get('cid', '')} 的回复时出错: {str(e)}")
-                    if error_count >= max_errors:
-                        logger.error("连续错误次数过多，跳过剩余回复获取")
-                        break
-                    continue
-                
-                # 添加随机延时
-                await asyncio.sleep(random.uniform(1, 2))
+        try:
+            async for comment, replies in iter_replies_async(comments, session, concurrency, rate, rate_limiter,
+                                                             control=control):
+                # 检查重复回复
+                unique_replies = dedup.filter_new(replies)
+                if unique_replies:
+                    all_replies.extend(unique_replies)
+                    processed_count += 1
+                    logger.info(f"已处理 {processed_count}/{total_comments} 个评论的回复")
+                else:
+                    logger.warning(f"评论 {comment.get('cid', '')} 未获取到有效回复")
+        except CrawlCancelled:
+            logger.info(f"回复采集已取消，返回已获取的 {len(all_replies)} 条回复")
         
         return all_replies
     except Exception as e:
         logger.error(f"获取回复时发生错误: {str(e)}")
         raise
 
-def process_comments(comments):
-    """处理评论数据"""
-    if not comments or not isinstance(comments, list):
-        logger.warning("没有有效的评论数据可以处理")
-        return pd.DataFrame()
+# 输出表格的列
+COLUMNS = ["评论ID", "评论内容", "点赞数", "评论时间", "用户昵称", "用户抖音号", "ip归属", "回复总数"]
+
+def project_comment(comment, is_reply=False):
+    """
+    把一条原始评论/回复投影为输出行
+
+    Returns:
+        dict: 输出行，记录无效时返回None
+    """
+    if not isinstance(comment, dict):
+        return None
         
-    data = []
-    error_count = 0
+    user = comment.get("user", {})
+    if not isinstance(user, dict):
+        return None
+        
+    create_time = comment.get("create_time", 0)
+    if not isinstance(create_time, (int, float)):
+        create_time = 0
     
-    for comment in comments:
+    cid = comment.get("cid", "")
+    if not cid:
+        return None
+        
+    return {
+        "评论ID": cid,
+        "评论内容": comment.get("text", ""),
+        "点赞数": int(comment.get("digg_count", 0)),
+        "评论时间": datetime.fromtimestamp(create_time).strftime("%Y-%m-%d %H:%M:%S"),
+        "用户昵称": user.get("nickname", "未知"),
+        "用户抖音号": user.get("unique_id", "未设置"),
+        "ip归属": comment.get("ip_label", "未知"),
+        "回复总数": 0 if is_reply else int(comment.get("reply_comment_total", 0))  # 二级评论没有回复
+    }
+
+def project_rows(items, is_reply=False):
+    """
+    批量投影评论/回复
+
+    Returns:
+        Tuple[List[dict], int]: 有效的输出行和出错记录数
+    """
+    rows = []
+    error_count = 0
+    for item in items:
         try:
-            # 添加更多错误检查
-            if not isinstance(comment, dict):
-                error_count += 1
-                continue
-                
-            user = comment.get("user", {})
-            if not isinstance(user, dict):
-                error_count += 1
-                continue
-                
-            create_time = comment.get("create_time", 0)
-            if not isinstance(create_time, (int, float)):
-                create_time = 0
-            
-            cid = comment.get("cid", "")
-            if not cid:
-                error_count += 1
-                continue
-                
-            data.append({
-                "评论ID": cid,
-                "评论内容": comment.get("text", ""),
-                "点赞数": int(comment.get("digg_count", 0)),
-                "评论时间": datetime.fromtimestamp(create_time).strftime("%Y-%m-%d %H:%M:%S"),
-                "用户昵称": user.get("nickname", "未知"),
-                "用户抖音号": user.get("unique_id", "未设置"),
-                "ip归属": comment.get("ip_label", "未知"),
-                "回复总数": int(comment.get("reply_comment_total", 0))
-            })
+            row = project_comment(item, is_reply)
         except Exception as e:
+            logger.error(f"处理{'回复' if is_reply else '评论'}数据时出错: {str(e)}, 数据: {item}")
+            row = None
+        if row is None:
             error_count += 1
-            logger.error(f"处理评论数据时出错: {str(e)}, 评论数据: {comment}")
             continue
+        rows.append(row)
+    return rows, error_count
+
+# 评论时间的输出格式
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 时区偏移按15分钟对齐计算（所有时区的偏移和夏令时切换点都落在15分钟整点上）
+OFFSET_BUCKET = 900
+# pandas纳秒精度时间的范围约为1677~2262年，超出的时间戳逐条处理
+PANDAS_SECONDS_LIMIT = 9_000_000_000
+
+def local_offsets(seconds):
+    """本地时区相对UTC的偏移（秒），每个15分钟区间只调用一次fromtimestamp；无法转换的时间为nan"""
+    unique, inverse = np.unique(seconds // OFFSET_BUCKET, return_inverse=True)
+    offsets = np.empty(len(unique))
+    for i, bucket in enumerate(unique.tolist()):
+        moment = bucket * OFFSET_BUCKET
+        try:
+            utc = datetime.fromtimestamp(moment, timezone.utc).replace(tzinfo=None)
+            offsets[i] = (datetime.fromtimestamp(moment) - utc).total_seconds()
+        except (OverflowError, OSError, ValueError):
+            offsets[i] = np.nan
+    return offsets[inverse.ravel()]
+
+def format_timestamps(values):
+    """
+    批量把秒级时间戳格式化为本地时间，结果与 datetime.fromtimestamp(v).strftime(TIME_FORMAT) 相同
+
+    Returns:
+        Tuple[List[str], np.ndarray]: 时间字符串（无效处为None）和有效掩码
+    """
+    seconds = np.floor(np.round(np.asarray(values, dtype=np.float64), 6))
+    result = np.full(len(seconds), None, dtype=object)
+    valid = np.isfinite(seconds)
+    in_range = valid & (np.abs(seconds) < PANDAS_SECONDS_LIMIT)
+    indices = np.flatnonzero(in_range)
+    local = seconds[indices] + local_offsets(seconds[indices])
+    converted = ~np.isnan(local)
+    valid[indices[~converted]] = False
+    if converted.any():
+        times = pd.to_datetime(local[converted].astype(np.int64), unit="s")
+        result[indices[converted]] = times.strftime(TIME_FORMAT).to_numpy(dtype=object)
+    for i in np.flatnonzero(valid & ~in_range).tolist():
+        try:
+            result[i] = datetime.fromtimestamp(seconds[i]).strftime(TIME_FORMAT)
+        except (OverflowError, OSError, ValueError):
+            valid[i] = False
+    return result.tolist(), valid
+
+def to_int_column(values, valid):
+    """按int()转换一列，整列都是整数时直接使用；转换失败的记录在valid中标记为无效"""
+    column = np.array(values) if values else np.zeros(0, dtype=np.int64)
+    if column.dtype.kind == "i":
+        return pd.Series(column.astype(np.int64, copy=False))
+    converted = []
+    for i, value in enumerate(values):
+        if type(value) is not int:
+            try:
+                value = int(value)
+            except (TypeError, ValueError, OverflowError):
+                valid[i] = False
+                value = 0
+        converted.append(value)
+    return pd.Series(converted)
+
+def project_frame(items, is_reply=False):
+    """
+    列式批量投影评论/回复，结果与 pd.DataFrame(project_rows(items, is_reply)[0]) 相同
+
+    按列用一次推导式取出各字段，整数列整列转换，评论时间批量格式化，
+    无效记录用掩码剔除，避免逐行调用datetime和构造字典。
+
+    Returns:
+        Tuple[pd.DataFrame, int]: 有效记录组成的表格（没有有效记录时为空表）和出错记录数
+    """
+    empty = {}
+    records = items if all(type(item) is dict for item in items) else [
+        item if isinstance(item, dict) else None for item in items
+    ]
+    users = [item.get("user", empty) if item is not None else None for item in records]
+    cids = [item.get("cid", "") if item is not None else None for item in records]
+    valid = np.fromiter((isinstance(u, dict) and bool(c) for u, c in zip(users, cids)), dtype=bool, count=len(items))
+    if not valid.all():
+        records = [item if ok else empty for item, ok in zip(records, valid)]
+        users = [user if ok else empty for user, ok in zip(users, valid)]
+
+    diggs = to_int_column([item.get("digg_count", 0) for item in records], valid)
+    if is_reply:  # 二级评论没有回复
+        reply_totals = pd.Series(np.zeros(len(items), dtype=np.int64))
+    else:
+        reply_totals = to_int_column([item.get("reply_comment_total", 0) for item in records], valid)
+    times = [item.get("create_time", 0) for item in records]
+    if times and np.array(times).dtype.kind not in "iuf":
+        times = [t if isinstance(t, (int, float)) else 0 for t in times]
+    time_texts, time_valid = format_timestamps(times)
+    valid &= time_valid
+
+    error_count = int(len(items) - valid.sum())
+    if error_count == len(items):
+        return pd.DataFrame(), error_count
+    frame = pd.DataFrame({
+        "评论ID": cids,
+        "评论内容": [item.get("text", "") for item in records],
+        "点赞数": diggs,
+        "评论时间": time_texts,
+        "用户昵称": [user.get("nickname", "未知") for user in users],
+        "用户抖音号": [user.get("unique_id", "未设置") for user in users],
+        "ip归属": [item.get("ip_label", "未知") for item in records],
+        "回复总数": reply_totals,
+    })
+    if error_count:
+        frame = frame[valid].reset_index(drop=True)
+        for column in ("点赞数", "回复总数"):
+            if frame[column].dtype == object:
+                frame[column] = frame[column].infer_objects()
+    return frame, error_count
+
+def process_comments(comments):
+    """处理评论数据"""
+    if not comments or not isinstance(comments, list):
+        logger.warning("没有有效的评论数据可以处理")
+        return pd.DataFrame()
+        
+    df, error_count = project_frame(comments)
             
     if error_count > 0:
         logger.warning(f"处理评论数据时有 {error_count} 条记录出错")
         
-    if not data:
+    if df.empty:
         logger.warning("没有有效的评论数据可以处理")
         return pd.DataFrame()
         
-    return pd.DataFrame(data)
+    return df
 
 def process_replies(replies, comments_df):
     """处理回复数据"""
     if not replies or not isinstance(replies, list):
         return pd.DataFrame()
         
-    data = []
-    error_count = 0
-    
-    for reply in replies:
-        try:
-            if not isinstance(reply, dict):
-                error_count += 1
-                continue
-                
-            user = reply.get("user", {})
-            if not isinstance(user, dict):
-                error_count += 1
-                continue
-                
-            create_time = reply.get("create_time", 0)
-            if not isinstance(create_time, (int, float)):
-                create_time = 0
-                
-            cid = reply.get("cid", "")
-            if not cid:
-                error_count += 1
-                continue
-                
-            data.append({
-                "评论ID": cid,
-                "评论内容": reply.get("text", ""),
-                "点赞数": int(reply.get("digg_count", 0)),
-                "评论时间": datetime.fromtimestamp(create_time).strftime("%Y-%m-%d %H:%M:%S"),
-                "用户昵称": user.get("nickname", "未知"),
-                "用户抖音号": user.get("unique_id", "未设置"),
-                "ip归属": reply.get("ip_label", "未知"),
-                "回复总数": 0  # 二级评论没有回复
-            })
-        except Exception as e:
-            error_count += 1
-            logger.error(f"处理回复数据时出错: {str(e)}, 回复数据: {reply}")
-            continue
+    df, error_count = project_frame(replies, is_reply=True)
             
     if error_count > 0:
         logger.warning(f"处理回复数据时有 {error_count} 条记录出错")
         
-    return pd.DataFrame(data)
+    return df
+
+async def stream_comments_async(aweme_id, writer, session=None, dedup=None, keep_reply_targets=True, checkpoint=None, cookie=None,
+                                rate_controller=None, on_rows=None, control=None, prefetch=0, store=None):
+    """
+    边采集边写入评论，内存占用不随评论总数增长
+
+    Args:
+        aweme_id: 视频ID
+        writer: writers模块中的写入器，每页写入一次
+        session: SessionManager会话管理器
+        dedup: DedupIndex去重索引
+        keep_reply_targets: 是否保留有回复的评论（仅ID和回复数），供后续获取回复
+        checkpoint: CrawlCheckpoint断点，传入时从其中的cursor继续采集，并在每页写入后提交
+        cookie: 使用的Cookie，不传时从环境变量或cookie.txt加载
+        rate_controller: 分页请求的限速器，不传时按评论数量自动创建
+        on_rows: 每页写入（并提交断点）后调用on_rows(rows, progress)，progress中有下一页的cursor
+            和评论总数total（检查过总数时）
+        control: CrawlControl取消/暂停令牌，取消时抛出CrawlCancelled，已写入的页都已提交
+        prefetch: 预取页数，见iter_comment_pages；预取的页仍按顺序写入，断点不受影响
+        store: SqliteStore数据库，传入时每页在提交断点之前同时upsert到数据库
+
+    Returns:
+        Tuple[int, List[dict]]: 写入的评论数和有回复的评论
+    """
+    own_session = session is None
+    if own_session:
+        session = SessionManager()
+    try:
+        cookie = cookie or load_cookie()
+        client = session.get_client(cookie)
+        written = 0
+        reply_targets = []
+        progress = {}
+        start_cursor = checkpoint.cursor if checkpoint is not None else "0"
+        async for page in iter_comment_pages(aweme_id, cookie, client=client, dedup=dedup,
+                                             cursor=start_cursor, progress=progress, rate_controller=rate_controller,
+                                             control=control, prefetch=prefetch):
+            rows, error_count = project_rows(page)
+            if error_count > 0:
+                logger.warning(f"处理评论数据时有 {error_count} 条记录出错")
+            writer.write_rows(rows)
+            written += len(rows)
+            if store is not None:
+                store.upsert_comments(aweme_id, page)
+            page_targets = [
+                {"aweme_id": c.get("aweme_id", aweme_id), "cid": c["cid"], "reply_comment_total": c.get("reply_comment_total", 0)}
+                for c in page if c.get("reply_comment_total", 0) > 0
+            ]
+            if keep_reply_targets:
+                reply_targets.extend(page_targets)
+            if checkpoint is not None:
+                checkpoint.commit_comments(page, page_targets, progress["cursor"], writer.tell())
+            if on_rows is not None:
+                on_rows(rows, progress)
+        return written, reply_targets
+    finally:
+        if own_session:
+            await session.aclose()
+
+async def stream_replies_async(comments, writer, session=None, dedup=None, checkpoint=None, on_rows=None, store=None,
+                               **kwargs):
+    """
+    边采集边写入回复
+
+    Args:
+        comments: 有回复的评论（至少包含aweme_id、cid、reply_comment_total）
+        writer: writers模块中的写入器
+        session: SessionManager会话管理器
+        dedup: DedupIndex去重索引
+        checkpoint: CrawlCheckpoint断点，每条评论的回复写入后提交
+        on_rows: 每条评论的回复写入后调用on_rows(rows, progress)，progress中有已完成的评论数done
+        store: SqliteStore数据库，传入时每条评论的回复在提交断点之前同时upsert到数据库（记录所属评论）
+        **kwargs: 传给iter_replies_async的并发和限速参数
+
+    Returns:
+        int: 写入的回复数
+    """
+    if dedup is None:
+        dedup = DedupIndex()
+    written = 0
+    done = 0
+    async for comment, replies in iter_replies_async(comments, session, **kwargs):
+        unique_replies = dedup.filter_new(replies)
+        rows, _ = project_rows(unique_replies, is_reply=True)
+        writer.write_rows(rows)
+        written += len(rows)
+        done += 1
+        if store is not None:
+            store.upsert_replies(comment.get("aweme_id", ""), comment.get("cid", ""), unique_replies)
+        if checkpoint is not None:
+            checkpoint.commit_replies(comment.get("cid", ""), unique_replies, writer.tell())
+        if on_rows is not None:
+            on_rows(rows, {"done": done})
+    return written
+
+async def crawl_to_csv_async(aweme_id, get_replies=False, resume=False, save_path=None, session=None,
+                             cookie=None, checkpoint=None, rate_controller=None, on_rows=None, control=None,
+                             prefetch=0, store=None, **reply_options):
+    """
+    采集评论（可选回复）并边采集边写入CSV，每页保存一次断点
+
+    Args:
+        aweme_id: 视频ID
+        get_replies: 是否获取回复
+        resume: 是否从上次中断的位置继续，只采集剩余的页和尚未获取回复的评论
+        save_path: 输出文件路径，默认为 data/v1/<aweme_id>/comments.csv
+        session: SessionManager会话管理器，不传时在内部创建并在结束时关闭
+        cookie: 使用的Cookie，不传时从环境变量或cookie.txt加载
+        checkpoint: CrawlCheckpoint断点，不传时使用 data/v1/<aweme_id>/ 下的断点；
+            调用方可以持有该对象，采集过程中读取comment_count/reply_count作为进度
+        rate_controller: 账号共用的RateController，传入时评论分页和回复请求共用同一个请求预算
+        on_rows: 每批行写入并提交断点后调用on_rows(rows, status)，用于实时显示结果和进度；status包含
+            stage（comments/replies）、comment_count、reply_count、total_comments（服务端评论总数，未知时为0）、
+            reply_targets（需要获取回复的评论数）和replies_done（已获取回复的评论数）
+        control: CrawlControl取消/暂停令牌；暂停时不再发出请求（把请求预算让给同一账号的其他采集），
+            取消时停止采集并正常返回输出路径，已写入的部分和断点都保留，之后可用resume继续
+        prefetch: 评论分页的预取页数，0为逐页请求
+        store: SqliteStore数据库，传入时评论和回复同时upsert到数据库（CSV仍然写入，作为断点续采的依据）
+        **reply_options: 传给iter_replies_async的并发和限速参数（concurrency、rate、rate_limiter）
+
+    Returns:
+        str: 输出文件路径
+    """
+    save_path = save_path or f"data/v1/{aweme_id}/comments.csv"
+    own_session = session is None
+    if own_session:
+        session = SessionManager()
+    if checkpoint is None:
+        checkpoint = CrawlCheckpoint(aweme_id)
+    try:
+        with checkpoint:
+            resumed = resume and checkpoint.load() and os.path.exists(save_path)
+            if resumed:
+                checkpoint.restore_output(save_path)
+            else:
+                if resume:
+                    logger.info("未找到可用的断点，将从头开始采集")
+                checkpoint.reset()
+            
+            # 评论和回复共用同一个去重索引，恢复时载入已采集的ID
+            dedup = DedupIndex(compact=True)
+            checkpoint.load_dedup(dedup)
+            
+            status = {"stage": "comments", "total_comments": 0, "reply_targets": 0, "replies_done": 0}
 
-async def main_async():
-    """异步主函数"""
+            def report(rows, progress):
+                if on_rows is None:
+                    return
+                status["total_comments"] = progress.get("total", status["total_comments"])
+                status["replies_done"] = progress.get("done", status["replies_done"])
+                on_rows(rows, dict(status, comment_count=checkpoint.comment_count, reply_count=checkpoint.reply_count))
+            
+            try:
+                with CsvAppendWriter(save_path, columns=COLUMNS, overwrite=not resumed) as writer:
+                    if not checkpoint.comments_done:
+                        written, _ = await stream_comments_async(
+                            aweme_id, writer, session=session, dedup=dedup,
+                            keep_reply_targets=False, checkpoint=checkpoint, cookie=cookie,
+                            rate_controller=rate_controller, on_rows=report, control=control,
+                            prefetch=prefetch, store=store
+                        )
+                        checkpoint.mark_comments_done()
+                        logger.info(f"本次获取 {written} 条评论")
+                    if not checkpoint.comment_count:
+                        raise ValueError("未获取到评论数据")
+                    logger.info(f"共获取 {checkpoint.comment_count} 条评论")
+                
+                    if get_replies and not checkpoint.finished:
+                        if rate_controller is not None:
+                            reply_options.setdefault("rate_limiter", rate_controller)
+                        targets = checkpoint.load_reply_targets()
+                        logger.info(f"需要获取回复的评论: {len(targets)} 条")
+                        status.update(stage="replies", reply_targets=len(targets))
+                        written = await stream_replies_async(
+                            targets, writer, session=session, dedup=dedup, checkpoint=checkpoint,
+                            on_rows=report, cookie=cookie, control=control, store=store, **reply_options
+                        )
+                        logger.info(f"本次获取 {written} 条回复，共 {checkpoint.reply_count} 条回复")
+                        # 出错跳过的评论留到下次恢复时重新获取
+                        if not checkpoint.load_reply_targets():
+                            checkpoint.mark_finished()
+            except CrawlCancelled:
+                logger.info(f"采集已取消，已保存 {checkpoint.comment_count} 条评论和 {checkpoint.reply_count} 条回复，"
+                            "可使用 --resume 从断点继续")
+        return save_path
+    finally:
+        if own_session:
+            await session.aclose()
+
+async def main_async(aweme_id=None, get_replies=None, resume=False, output_format="csv", prefetch=0, delta=False,
+                     db=None):
+    """
+    异步主函数
+
+    Args:
+        output_format: csv 或 parquet；parquet时采集完成后把CSV分块转换为带类型的Parquet
+        prefetch: 评论分页的预取页数
+        delta: 增量刷新已采集的结果（见delta模块），没有已采集的数据时完整采集
+        db: SQLite数据库路径，传入时评论、回复和用户同时写入该数据库（见sqlite_store模块）
+    """
     # 获取视频ID
-    aweme_id = input("请输入视频ID: ").strip()
+    if not aweme_id:
+        aweme_id = input("请输入视频ID: ").strip()
     if not aweme_id:
         logger.error("视频ID不能为空")
         return
         
-    # 获取评论
-    comments = await fetch_all_comments_async(aweme_id)
-    if not comments:
-        logger.error("未获取到评论数据")
-        return
-        
-    comments_df = process_comments(comments)
-    logger.info(f"成功获取 {len(comments)} 条评论")
-    
     # 询问是否获取回复
-    get_replies = input("是否获取评论的回复？(y/n): ").strip().lower() == 'y'
-    if get_replies:
-        replies = await fetch_all_replies_async(comments)
-        logger.info(f"成功获取 {len(replies)} 条回复")
-        replies_df = process_replies(replies, comments_df)
-        result = pd.concat([comments_df, replies_df], ignore_index=True)
-    else:
-        result = comments_df
+    if get_replies is None:
+        get_replies = input("是否获取评论的回复？(y/n): ").strip().lower() == 'y'
     
-    # 保存数据
-    save_dir = f"data/v1/{aweme_id}"
-    os.makedirs(save_dir, exist_ok=True)
-    result.to_csv(f"{save_dir}/comments.csv", index=False, encoding="utf-8-sig")
-    logger.info(f"数据已保存到 {save_dir}/comments.csv")
+    store = None
+    if db:
+        from sqlite_store import SqliteStore
+        store = SqliteStore(db)
+    # 边采集边写入，采集中断时已获取的数据和断点都保存在磁盘上
+    try:
+        if delta:
+            from delta import refresh_async
+            save_path = (await refresh_async(aweme_id, get_replies=get_replies, store=store))["save_path"]
+        else:
+            save_path = await crawl_to_csv_async(aweme_id, get_replies=get_replies, resume=resume, prefetch=prefetch,
+                                                 store=store)
+    except ValueError as e:
+        logger.error(f"采集失败: {str(e)}，可使用 --resume 从断点继续")
+        return
+    finally:
+        if store is not None:
+            store.close()
+    if store is not None:
+        logger.info(f"评论和回复已写入数据库 {db}")
+    
+    # 断点续采基于追加写入的CSV，Parquet在采集完成后一次性生成
+    if output_format == "parquet":
+        save_path = csv_to_parquet(save_path)
+    logger.info(f"数据已保存到 {save_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="抖音评论采集")
+    parser.add_argument("aweme_id", nargs="?", help="视频ID，不传时交互输入")
+    parser.add_argument("--replies", action="store_true", default=None, help="同时获取评论的回复")
+    parser.add_argument("--resume", action="store_true", help="从 data/v1/<视频ID>/ 下的断点继续采集")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                        help="输出格式，parquet需要安装pyarrow（评论ID为int64、评论时间为时间戳）")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="评论分页预取页数，请求往返延迟较大时在当前页请求期间提前请求后面几页（仍受限速控制）")
+    parser.add_argument("--delta", action="store_true",
+                        help="增量刷新：只获取上次采集之后的新评论和变化的点赞数/回复数，合并到已有结果")
+    parser.add_argument("--db", help="同时写入SQLite数据库（如data/comments.db），所有视频的评论、回复和用户累积保存在同一个库中")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        asyncio.run(main_async())
+        asyncio.run(main_async(args.aweme_id, args.replies, args.resume, args.format, args.prefetch, args.delta, args.db))
     except Exception as e:
         logger.error(f"程序运行出错: {str(e)}")
@@ -0,0 +1,241 @@
+"""
+本地模拟抖音评论接口，用于基准测试和离线调试
+
+用法:
+    python mock_server.py --port 8000 --comments 1000
+    python mock_server.py --comments 5000 --replies 3 --latency 0.05 --jitter 0.1 --error-rate 0.05 --duplicate-rate 0.02
+    DOUYIN_HOST=http://127.0.0.1:8000 python main.py
+
+故障注入（按seed可复现）：
+- error_rate: 按概率返回 status_code 非0 和 status_msg（评论和回复接口都会）
+- duplicate_rate: 按概率返回上一页的评论且cursor不前进，模拟服务端返回重复页
+- latency/jitter: 每个请求固定延迟加 0~jitter 秒的随机延迟
+
+评论变化（用于测试增量刷新）：add_comments() 追加的新评论排在列表最前面，bump_likes() 增加所有评论的点赞数，
+修改 replies_per_comment 改变每条评论的回复数。
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+COMMENT_PATH = "/aweme/v1/web/comment/list/"
+REPLY_PATH = "/aweme/v1/web/comment/list/reply/"
+BASE_CID = 7400000000000000000
+BASE_TIME = 1736900000
+ERROR_MSG = "请求过于频繁，请稍后再试"
+REPLY_OFFSET = 10 ** 13  # 回复ID的起始偏移，每条评论的回复占REPLY_STRIDE个ID，评论数或回复数变化时ID不变
+REPLY_STRIDE = 10 ** 6
+
+def make_comment(aweme_id: str, index: int, reply_total: int = 0, likes: int = 0, create_time: int = None) -> dict:
+    """生成一条模拟评论，create_time默认为BASE_TIME + index"""
+    return {
+        "cid": str(BASE_CID + index),
+        "aweme_id": aweme_id,
+        "text": f"模拟评论 {index}",
+        "digg_count": index % 97 + likes,
+        "create_time": BASE_TIME + index if create_time is None else create_time,
+        "ip_label": "北京",
+        "reply_comment_total": reply_total,
+        "user": {"nickname": f"用户{index}", "unique_id": f"user_{index}"},
+    }
+
+class MockDouyinHandler(BaseHTTPRequestHandler):
+    """模拟评论列表和回复列表接口"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _comment(self, aweme_id: str, position: int) -> dict:
+        """列表中第position条评论，新追加的评论排在最前面（最新的在第一条）"""
+        server = self.server
+        if position < server.new_comments:
+            index = server.total_comments + server.new_comments - 1 - position
+        else:
+            index = position - server.new_comments
+        return make_comment(aweme_id, index, server.replies_per_comment, server.likes)
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        cursor = int(query.get("cursor", 0))
+        count = int(query.get("count", 20))
+        delay = server.latency + (server.draw() * server.jitter if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if parsed.path in (COMMENT_PATH, REPLY_PATH):
+            server.record("requests")
+            if server.error_rate and server.draw() < server.error_rate:
+                server.record("errors")
+                self._send_json({"status_code": 8, "status_msg": server.error_msg})
+                return
+
+        if parsed.path == COMMENT_PATH:
+            aweme_id = query.get("aweme_id", "")
+            if cursor > 0 and server.duplicate_rate and server.draw() < server.duplicate_rate:
+                # 重复页：返回上一页的评论，cursor不前进
+                server.record("duplicates")
+                start = max(0, cursor - count)
+                comments = [self._comment(aweme_id, i) for i in range(start, cursor)]
+                self._send_json({
+                    "status_code": 0,
+                    "comments": comments,
+                    "cursor": cursor,
+                    "has_more": 1,
+                    "total": server.total_comments + server.new_comments,
+                })
+                return
+            total = server.total_comments + server.new_comments
+            end = min(cursor + count, total)
+            comments = [self._comment(aweme_id, i) for i in range(cursor, end)]
+            self._send_json({
+                "status_code": 0,
+                "comments": comments,
+                "cursor": end,
+                "has_more": int(end < total),
+                "total": total,
+            })
+        elif parsed.path == REPLY_PATH:
+            aweme_id = query.get("item_id", "")
+            parent = int(query.get("comment_id", BASE_CID)) - BASE_CID
+            total = server.replies_per_comment
+            end = min(cursor + count, total)
+            offset = REPLY_OFFSET + parent * REPLY_STRIDE
+            replies = [make_comment(aweme_id, offset + i, create_time=BASE_TIME + parent + i) for i in range(cursor, end)]
+            self._send_json({
+                "status_code": 0,
+                "comments": replies,
+                "cursor": end,
+                "has_more": int(end < total),
+                "total": total,
+            })
+        else:
+            self._send_json({"status_code": 404, "status_msg": "not found"}, status=404)
+
+class MockDouyinServer:
+    """在后台线程中运行的模拟服务器"""
+
+    def __init__(self, total_comments: int = 1000, replies_per_comment: int = 0,
+                 latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, jitter: float = 0.0,
+                 error_rate: float = 0.0, duplicate_rate: float = 0.0, error_msg: str = ERROR_MSG,
+                 seed: int = None):
+        """
+        Args:
+            total_comments: 每个视频的评论总数
+            replies_per_comment: 每条评论的回复数
+            latency: 每个请求的固定延迟（秒）
+            jitter: 额外的随机延迟上限（秒）
+            error_rate: 返回status_msg错误的概率
+            duplicate_rate: 返回重复页的概率
+            error_msg: 注入错误时的status_msg
+            seed: 随机种子，相同参数和请求顺序下注入的故障相同
+        """
+        self.httpd = ThreadingHTTPServer((host, port), MockDouyinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.total_comments = total_comments
+        self.httpd.new_comments = 0
+        self.httpd.likes = 0
+        self.httpd.replies_per_comment = replies_per_comment
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        self.httpd.error_rate = error_rate
+        self.httpd.duplicate_rate = duplicate_rate
+        self.httpd.error_msg = error_msg
+        self.httpd.stats = {"requests": 0, "errors": 0, "duplicates": 0}
+        random_state = random.Random(seed)
+        lock = threading.Lock()
+
+        def draw() -> float:
+            with lock:
+                return random_state.random()
+
+        def record(name: str):
+            with lock:
+                self.httpd.stats[name] += 1
+
+        self.httpd.draw = draw
+        self.httpd.record = record
+        self._thread = None
+
+    def add_comments(self, count: int):
+        """追加count条新评论，排在评论列表最前面"""
+        self.httpd.new_comments += count
+
+    def bump_likes(self, amount: int = 1):
+        """所有评论的点赞数增加amount"""
+        self.httpd.likes += amount
+
+    @property
+    def replies_per_comment(self) -> int:
+        return self.httpd.replies_per_comment
+
+    @replies_per_comment.setter
+    def replies_per_comment(self, value: int):
+        self.httpd.replies_per_comment = value
+
+    @property
+    def stats(self) -> dict:
+        """已处理的接口请求数、注入的错误数和重复页数"""
+        return dict(self.httpd.stats)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟抖音评论接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--comments", type=int, default=1000, help="每个视频的评论总数")
+    parser.add_argument("--replies", type=int, default=0, help="每条评论的回复数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外随机延迟的上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回status_msg错误的概率")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="返回重复页的概率")
+    parser.add_argument("--error-msg", default=ERROR_MSG, help="注入错误时的status_msg")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    server = MockDouyinServer(
+        args.comments, args.replies, args.latency, args.host, args.port, jitter=args.jitter,
+        error_rate=args.error_rate, duplicate_rate=args.duplicate_rate, error_msg=args.error_msg, seed=args.seed
+    )
+    print(f"模拟服务器已启动: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+视频评论持续监控
+
+用法:
+    python monitor.py videos.txt --replies
+    python monitor.py videos.txt --cookies cookies.txt --max-crawls 2 --min-interval 120
+    python monitor.py 7400000000000000000 --duration 3600
+
+按视频的评论增长速度调整轮询间隔：每次轮询只请求一页（check_comments_count获取评论总数），
+总数有变化时才对该视频做增量刷新（见delta模块）。评论增长快的视频轮询得更频繁，
+长时间没有新评论的视频轮询间隔逐步拉长到max_interval，采集名额按待采集的新评论数优先分配给活跃的视频。
+每次轮询和采集追加一行到 data/v1/<aweme_id>/monitor.csv，重启后从最后一行恢复增长速度和轮询间隔。
+"""
+import os
+import csv
+import time
+import asyncio
+import argparse
+import httpx
+from datetime import datetime
+from loguru import logger
+from typing import Dict, Iterable, List, Optional
+
+from main import load_cookie, DEFAULT_REPLY_CONCURRENCY, TIME_FORMAT
+from fetch_comments import check_comments_count
+from crawl_control import CrawlCancelled, CrawlControl, controlled
+from http_session import SessionManager
+from cookie_pool import CookiePool, read_cookies
+from batch import read_sources, resolve_jobs
+from delta import refresh_async
+
+MIN_INTERVAL = 60.0  # 最短轮询间隔（秒）
+MAX_INTERVAL = 6 * 3600.0  # 最长轮询间隔（秒）
+TARGET_NEW = 20  # 两次轮询之间期望新增的评论数（一页）
+VELOCITY_SMOOTHING = 0.5  # 增长速度的指数平滑系数，越大越跟随最近一次的变化
+PROBE_CONCURRENCY = 4  # 同时进行的轮询请求数
+REPORT_INTERVAL = 300  # 汇总状态的间隔（秒）
+SERIES_COLUMNS = ["时间", "事件", "评论总数", "新增", "速度(条/小时)", "轮询间隔(秒)", "新采集评论"]
+
+class WatchedVideo:
+    """
+    监控中的一个视频：最近一次的评论总数、平滑后的增长速度（条/小时）和下次轮询时间
+
+    crawled_count为上次增量刷新时的评论总数，轮询到的总数与它不同时需要采集。
+    """
+
+    def __init__(self, aweme_id: str, source: str = "", base_dir: str = "data/v1"):
+        self.aweme_id = aweme_id
+        self.source = source or aweme_id
+        self.series_path = os.path.join(base_dir, aweme_id, "monitor.csv")
+        self.count = None
+        self.crawled_count = None
+        self.polled_at = None
+        self.velocity = 0.0
+        self.interval = MIN_INTERVAL
+        self.next_poll = 0.0
+        self.status = "idle"  # idle / polling / queued / crawling
+        self.polls = 0
+        self.crawls = 0
+        self.new_comments = 0  # 监控期间增量刷新采集到的新评论数
+
+    @property
+    def backlog(self) -> int:
+        """轮询到但还没有采集的评论数"""
+        if self.count is None:
+            return 0
+        return abs(self.count - (self.crawled_count or 0))
+
+    def restore(self, min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL):
+        """
+        从时间序列恢复：最后一次轮询的评论总数、增长速度和下次轮询时间，
+        以及最后一次采集时的评论总数（总数没有变化时重启后不再重新采集）
+        """
+        if not os.path.exists(self.series_path):
+            return
+        last = last_crawl = None
+        with open(self.series_path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("事件") == "轮询":
+                    last = row
+                elif row.get("事件") == "采集":
+                    last_crawl = row
+        if last is None:
+            return
+        try:
+            self.polled_at = datetime.strptime(last["时间"], TIME_FORMAT).timestamp()
+            self.count = int(last["评论总数"])
+            self.velocity = float(last["速度(条/小时)"])
+            self.interval = min(max(float(last["轮询间隔(秒)"]), min_interval), max_interval)
+            if last_crawl is not None:
+                self.crawled_count = int(last_crawl["评论总数"])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"视频 {self.aweme_id} 的监控记录无法解析，重新开始: {str(e)}")
+            self.count, self.crawled_count, self.polled_at, self.velocity = None, None, None, 0.0
+            return
+        self.next_poll = self.polled_at + self.interval
+
+    def observe(self, count: int, now: float, min_interval: float = MIN_INTERVAL,
+                max_interval: float = MAX_INTERVAL, target_new: int = TARGET_NEW) -> int:
+        """
+        记录一次轮询到的评论总数，更新增长速度和下次轮询时间
+
+        轮询间隔取预计新增target_new条评论所需的时间，限制在[min_interval, max_interval]之间；
+        没有新增时速度按平滑系数衰减，间隔随之逐步拉长。
+
+        Returns:
+            int: 与上次轮询相比新增的评论数
+        """
+        change = 0 if self.count is None else count - self.count
+        if self.polled_at is not None and now > self.polled_at:
+            rate = max(change, 0) * 3600 / (now - self.polled_at)
+            self.velocity = VELOCITY_SMOOTHING * rate + (1 - VELOCITY_SMOOTHING) * self.velocity
+        if self.velocity > 0:
+            interval = target_new * 3600 / self.velocity
+        else:
+            interval = self.interval * 2
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.count = count
+        self.polled_at = now
+        self.next_poll = now + self.interval
+        self.polls += 1
+        return change
+
+    def record(self, event: str, now: float, change: int = 0, new_comments=""):
+        """追加一行到时间序列"""
+        directory = os.path.dirname(self.series_path)
+        os.makedirs(directory, exist_ok=True)
+        exists = os.path.exists(self.series_path) and os.path.getsize(self.series_path) > 0
+        with open(self.series_path, "a" if exists else "w", newline="", encoding="utf-8" if exists else "utf-8-sig") as f:
+            writer = csv.writer(f)
+            if not exists:
+                writer.writerow(SERIES_COLUMNS)
+            writer.writerow([
+                datetime.fromtimestamp(now).strftime(TIME_FORMAT), event,
+                "" if self.count is None else self.count, change,
+                f"{self.velocity:.2f}", f"{self.interval:.0f}", new_comments
+            ])
+
+class MonitorScheduler:
+    """
+    监控调度器
+
+    主循环在最早的下次轮询时间或有任务完成时醒来：到期的视频发出轮询请求（最多probe_concurrency个），
+    总数有变化的视频进入待采集队列，空出的采集名额（max_crawls）按待采集的评论数从多到少分配。
+    轮询和采集从CookiePool分配账号，请求都经过该账号的RateController，与批量采集共用同一套限速。
+    """
+
+    def __init__(self, cookies: Optional[List[str]] = None, get_replies: bool = False,
+                 max_crawls: Optional[int] = None, per_account: int = 2,
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 target_new: int = TARGET_NEW, probe_concurrency: int = PROBE_CONCURRENCY,
+                 reply_concurrency: int = DEFAULT_REPLY_CONCURRENCY, rate_options: Optional[Dict] = None,
+                 account_rate_options: Optional[List[Dict]] = None, report_interval: float = REPORT_INTERVAL,
+                 pool: Optional[CookiePool] = None, control: Optional[CrawlControl] = None):
+        """
+        Args:
+            cookies: 账号Cookie列表，不传时使用load_cookie加载的单个账号
+            get_replies: 增量刷新时是否获取回复
+            max_crawls: 同时进行的增量刷新数，默认为账号数
+            per_account: 每个账号同时进行的轮询和采集数
+            min_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            target_new: 两次轮询之间期望新增的评论数
+            probe_concurrency: 同时进行的轮询请求数
+            reply_concurrency: 每个账号同时进行的回复请求数
+            rate_options: 所有账号的RateController参数
+            account_rate_options: 按账号顺序覆盖rate_options的参数
+            report_interval: 汇总状态的间隔（秒）
+            pool: 已有的CookiePool，传入时忽略cookies和限速参数
+            control: CrawlControl取消/暂停令牌，取消时停止监控
+        """
+        self.pool = pool or CookiePool(
+            cookies or [load_cookie()], max_in_flight=per_account,
+            rate_options=rate_options, account_rate_options=account_rate_options
+        )
+        self.get_replies = get_replies
+        self.max_crawls = max(1, max_crawls or len(self.pool))
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.target_new = target_new
+        self.probe_concurrency = max(1, probe_concurrency)
+        self.reply_concurrency = reply_concurrency
+        self.report_interval = report_interval
+        self.control = control or CrawlControl()
+        self.videos: List[WatchedVideo] = []
+        self._wakeup = None
+
+    def _done(self, video: WatchedVideo, task: asyncio.Task):
+        """轮询或采集任务结束：读取未处理的异常（例如合并CSV时的OSError），记入该视频的时间序列"""
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            logger.opt(exception=error).error(f"视频 {video.aweme_id} 的任务异常结束: {str(error)}")
+            video.status = "idle"
+            video.next_poll = max(video.next_poll, time.time() + self.min_interval)
+            try:
+                video.record("出错", time.time())
+            except OSError as e:
+                logger.error(f"写入视频 {video.aweme_id} 的监控记录失败: {str(e)}")
+        self._wakeup.set()
+
+    async def _probe(self, video: WatchedVideo, session: SessionManager):
+        account = await self.pool.acquire_async()
+        try:
+            await controlled(account.controller.acquire(), self.control)
+            count = await controlled(
+                check_comments_count(video.aweme_id, account.cookie, client=session.get_client(account.cookie)),
+                self.control
+            )
+            # 账号的限速器同时把结果记入CookiePool的健康统计
+            account.controller.on_success()
+        except (ValueError, httpx.HTTPError) as e:
+            account.controller.on_backoff(str(e))
+            video.interval = min(video.interval * 2, self.max_interval)
+            video.next_poll = time.time() + video.interval
+            video.status = "idle"
+            video.record("出错", time.time())
+            logger.warning(f"[{account.name}] 视频 {video.aweme_id} 轮询失败，{video.interval:.0f} 秒后重试: {str(e)}")
+            return
+        finally:
+            self.pool.release(account)
+
+        now = time.time()
+        change = video.observe(count, now, self.min_interval, self.max_interval, self.target_new)
+        video.record("轮询", now, change)
+        if count != video.crawled_count:
+            video.status = "queued"
+            logger.info(f"视频 {video.aweme_id} 评论总数 {count}（{change:+d}），"
+                        f"速度 {video.velocity:.1f} 条/小时，等待采集")
+        else:
+            video.status = "idle"
+            logger.debug(f"视频 {video.aweme_id} 评论总数没有变化，{video.interval:.0f} 秒后再次轮询")
+
+    async def _crawl(self, video: WatchedVideo, session: SessionManager):
+        target = video.count
+        account = await self.pool.acquire_async()
+        try:
+            result = await refresh_async(
+                video.aweme_id, get_replies=self.get_replies, session=session, cookie=account.cookie,
+                rate_controller=account.controller, control=self.control, concurrency=self.reply_concurrency
+            )
+            if result["cancelled"]:
+                # 已获取的部分已经合并，未完成的刷新不记为已采集，下次轮询时重新刷新
+                logger.info(f"视频 {video.aweme_id} 的增量刷新被取消")
+                return
+            video.crawled_count = target
+            video.crawls += 1
+            video.new_comments += result["new_comments"]
+            video.record("采集", time.time(), new_comments=result["new_comments"])
+            logger.info(f"[{account.name}] 视频 {video.aweme_id} {result['mode']} 采集完成，"
+                        f"新评论 {result['new_comments']} 条，新回复 {result['new_replies']} 条")
+        except CrawlCancelled:
+            logger.info(f"视频 {video.aweme_id} 的增量刷新被取消")
+        except (ValueError, httpx.HTTPError) as e:
+            # 每次请求的失败已经由账号的限速器记入CookiePool
+            video.record("出错", time.time())
+            logger.error(f"[{account.name}] 视频 {video.aweme_id} 采集失败: {str(e)}")
+        finally:
+            self.pool.release(account)
+            video.status = "idle"
+            video.next_poll = max(video.next_poll, time.time() + self.min_interval)
+
+    def _start(self, video: WatchedVideo, coroutine, tasks: set):
+        task = asyncio.create_task(coroutine)
+        task.add_done_callback(lambda task: self._done(video, task))
+        tasks.add(task)
+
+    async def run(self, sources: Iterable[str], duration: Optional[float] = None) -> List[WatchedVideo]:
+        """
+        持续监控直到被取消，或经过duration秒
+
+        Args:
+            sources: 视频ID或分享链接
+            duration: 监控时长（秒），不传时一直运行；到时后等待进行中的轮询和采集完成再返回
+
+        Returns:
+            List[WatchedVideo]: 每个视频的监控状态
+        """
+        self.videos = [WatchedVideo(job.aweme_id, job.source) for job in await resolve_jobs(sources)]
+        if not self.videos:
+            logger.error("没有可监控的视频")
+            return []
+        for video in self.videos:
+            video.restore(self.min_interval, self.max_interval)
+
+        self._wakeup = asyncio.Event()
+        deadline = time.time() + duration if duration is not None else None
+        next_report = time.time() + self.report_interval
+        tasks = set()
+        logger.info(f"开始监控 {len(self.videos)} 个视频，{len(self.pool)} 个账号，同时采集 {self.max_crawls} 个")
+        async with SessionManager() as session:
+            try:
+                while True:
+                    tasks = {task for task in tasks if not task.done()}
+                    now = time.time()
+                    if deadline is not None and now >= deadline:
+                        break
+                    if all(account.invalid for account in self.pool.accounts):
+                        logger.error("账号池中的Cookie已全部失效，停止监控")
+                        break
+
+                    polling = sum(video.status == "polling" for video in self.videos)
+                    for video in sorted(self.videos, key=lambda v: v.next_poll):
+                        if polling >= self.probe_concurrency or video.next_poll > now:
+                            break
+                        if video.status == "idle":
+                            video.status = "polling"
+                            polling += 1
+                            self._start(video, self._probe(video, session), tasks)
+
+                    crawling = sum(video.status == "crawling" for video in self.videos)
+                    queued = sorted((v for v in self.videos if v.status == "queued"), key=lambda v: -v.backlog)
+                    for video in queued[:max(0, self.max_crawls - crawling)]:
+                        video.status = "crawling"
+                        self._start(video, self._crawl(video, session), tasks)
+
+                    if now >= next_report:
+                        logger.info(self.status_text())
+                        next_report = now + self.report_interval
+
+                    idle = [v.next_poll for v in self.videos if v.status == "idle"]
+                    wake_at = min(idle + [next_report] + ([deadline] if deadline is not None else []))
+                    self._wakeup.clear()
+                    try:
+                        await controlled(
+                            asyncio.wait_for(self._wakeup.wait(), max(0.0, wake_at - time.time())), self.control
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            except CrawlCancelled:
+                logger.info("监控已停止")
+            finally:
+                # 取消时进行中的采集通过control尽快结束，已获取的部分照常合并
+                await asyncio.gather(*tasks, return_exceptions=True)
+        return self.videos
+
+    def status_text(self) -> str:
+        """汇总状态：采集中/待采集的视频数和最活跃的几个视频"""
+        counts = {status: 0 for status in ("idle", "polling", "queued", "crawling")}
+        for video in self.videos:
+            counts[video.status] += 1
+        active = sorted(self.videos, key=lambda v: -v.velocity)[:5]
+        top = "，".join(f"{v.aweme_id} {v.velocity:.1f}条/小时" for v in active if v.velocity > 0) or "无"
+        return (f"监控 {len(self.videos)} 个视频 - 轮询中 {counts['polling']}，待采集 {counts['queued']}，"
+                f"采集中 {counts['crawling']}；最活跃: {top}")
+
+    def summary(self) -> str:
+        """每个视频的评论总数、增长速度、轮询间隔和采集次数"""
+        lines = [f"{'视频ID':<22}{'评论总数':>10}{'速度(条/小时)':>14}{'间隔(秒)':>10}{'轮询':>6}{'采集':>6}{'新评论':>8}"]
+        for video in self.videos:
+            count = "" if video.count is None else video.count
+            lines.append(f"{video.aweme_id:<22}{count:>10}{video.velocity:>14.1f}{video.interval:>10.0f}"
+                         f"{video.polls:>6}{video.crawls:>6}{video.new_comments:>8}")
+        return "\n".join(lines)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="抖音视频评论持续监控")
+    parser.add_argument("sources", nargs="+", help="视频ID、分享链接，或每行一个的列表文件")
+    parser.add_argument("--replies", action="store_true", help="增量刷新时同时获取回复")
+    parser.add_argument("--cookies", help="每行一个账号Cookie的文件，不传时使用DOUYIN_COOKIE或cookie.txt")
+    parser.add_argument("--max-crawls", type=int, help="同时进行的增量刷新数，默认为账号数")
+    parser.add_argument("--min-interval", type=float, default=MIN_INTERVAL, help="最短轮询间隔（秒）")
+    parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL, help="最长轮询间隔（秒）")
+    parser.add_argument("--target", type=int, default=TARGET_NEW, help="两次轮询之间期望新增的评论数")
+    parser.add_argument("--duration", type=float, help="监控时长（秒），默认一直运行")
+    parser.add_argument("--rate", type=float, default=0.5, help="每个账号的初始请求速率（次/秒）")
+    parser.add_argument("--min-rate", type=float, default=0.1, help="出现限流时最低降到的请求速率")
+    parser.add_argument("--max-rate", type=float, default=4.0, help="响应正常时最高升到的请求速率")
+    return parser.parse_args()
+
+async def main_async(args):
+    cookies, account_rate_options = read_cookies(args.cookies) if args.cookies else (None, None)
+    scheduler = MonitorScheduler(
+        cookies=cookies,
+        get_replies=args.replies,
+        max_crawls=args.max_crawls,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        target_new=args.target,
+        rate_options={"rate": args.rate, "min_rate": args.min_rate, "max_rate": args.max_rate},
+        account_rate_options=account_rate_options,
+    )
+    try:
+        await scheduler.run(read_sources(args.sources), duration=args.duration)
+    finally:
+        print(scheduler.summary())
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main_async(parse_args()))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"监控出错: {str(e)}")
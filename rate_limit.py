@@ -0,0 +1,105 @@
+import time
+import random
+import asyncio
+from loguru import logger
+
+class RateLimiter:
+    """
+    令牌桶限速器
+
+    多个协程共享同一个限速器时，总请求速率不超过rate次/秒，
+    burst为允许的瞬时并发请求数。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: 每秒允许的请求数
+            burst: 令牌桶容量
+        """
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = None
+        self._loop = None  # _lock所属的事件循环
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            # 同一个限速器可能先后在多个事件循环中使用（如界面每次采集新建事件循环），锁按循环重建
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        """请求正常完成，固定速率的限速器不做调整"""
+
+    def on_backoff(self, reason: str = ""):
+        """服务端出现限流迹象，固定速率的限速器不做调整"""
+
+class RateController(RateLimiter):
+    """
+    AIMD自适应限速器
+
+    响应正常时每次把速率加increase（加性增），出现403、"禁止访问"、空页面、重复cursor等
+    限流迹象时把速率乘以decrease（乘性减），速率在[min_rate, max_rate]之间。
+    每个账号使用一个实例，评论分页和回复请求共用，多个视频同时采集时也共享同一个预算。
+    """
+
+    def __init__(self, rate: float = 0.5, min_rate: float = 0.1, max_rate: float = 4.0,
+                 increase: float = 0.05, decrease: float = 0.5, burst: int = 1, jitter: float = 0.2):
+        """
+        Args:
+            rate: 初始速率（次/秒）
+            min_rate: 最低速率
+            max_rate: 最高速率
+            increase: 每次正常响应增加的速率
+            decrease: 出现限流迹象时速率乘以的系数
+            burst: 令牌桶容量
+            jitter: 每次请求前额外等待的随机时间，占当前请求间隔的比例，避免请求间隔过于规律
+        """
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("速率范围无效")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease必须在0和1之间")
+        super().__init__(min(max(rate, min_rate), max_rate), burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.jitter = jitter
+        self.success_count = 0
+        self.backoff_count = 0
+
+    async def acquire(self):
+        await super().acquire()
+        if self.jitter > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter / self.rate))
+
+    def on_success(self):
+        self.success_count += 1
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_backoff(self, reason: str = ""):
+        self.backoff_count += 1
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # 清空令牌，下一次请求至少等待一个新的请求间隔
+        self._tokens = min(self._tokens, 0.0)
+        logger.warning(f"检测到限流迹象（{reason or '未知原因'}），请求速率降至 {self.rate:.2f} 次/秒")
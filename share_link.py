@@ -0,0 +1,70 @@
+import re
+import time
+import requests
+from loguru import logger
+
+def extract_video_id(share_text):
+    """从分享文本中提取视频ID"""
+    try:
+        # 尝试直接匹配数字ID
+        if share_text.isdigit():
+            return share_text
+            
+        # 尝试直接从URL中提取视频ID
+        video_id_pattern = r'/video/(\d+)'
+        match = re.search(video_id_pattern, share_text)
+        if match:
+            return match.group(1)
+            
+        # 匹配短链接
+        url_pattern = r'https?://[^\s<>"]+|www\.[^\s<>"]+|v\.douyin\.com/[^\s<>"]+'
+        urls = re.findall(url_pattern, share_text)
+        
+        if not urls:
+            return None
+            
+        # 获取第一个URL
+        url = urls[0]
+        
+        # 如果是短链接，尝试使用高级请求头获取重定向后的URL
+        if 'v.douyin.com' in url:
+            headers = {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.9",
+                "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+                "Upgrade-Insecure-Requests": "1"
+            }
+            
+            # 设置重试次数
+            max_retries = 3
+            retry_count = 0
+            
+            while retry_count < max_retries:
+                try:
+                    session = requests.Session()
+                    # 禁用重定向，手动处理
+                    response = session.get(url, headers=headers, allow_redirects=False, timeout=10)
+                    
+                    # 检查是否有重定向
+                    if response.status_code in [301, 302]:
+                        redirect_url = response.headers.get('Location')
+                        if redirect_url:
+                            # 从重定向URL中提取视频ID
+                            match = re.search(video_id_pattern, redirect_url)
+                            if match:
+                                return match.group(1)
+                    break
+                except requests.exceptions.RequestException as e:
+                    retry_count += 1
+                    if retry_count == max_retries:
+                        logger.error(f"重试{max_retries}次后仍然失败: {str(e)}")
+                        return None
+                    logger.warning(f"第{retry_count}次重试...")
+                    time.sleep(1)  # 重试前等待1秒
+                    
+        return None
+    except Exception as e:
+        logger.error(f"解析分享链接时出错: {str(e)}")
+        return None
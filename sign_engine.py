@@ -0,0 +1,379 @@
+import os
+import json
+import queue
+import shutil
+import atexit
+import asyncio
+import platform
+import threading
+import subprocess
+import multiprocessing
+import abogus
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from loguru import logger
+from typing import Optional, List
+
+# 签名脚本所在目录
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DOUYIN_JS = os.path.join(BASE_DIR, 'douyin.js')
+SIGN_WORKER_JS = os.path.join(BASE_DIR, 'sign_worker.js')
+# 等待node签名进程响应一次请求的最长时间（秒），超时后重启进程
+SIGN_TIMEOUT = 10.0
+
+class SignEngineError(Exception):
+    """签名引擎异常"""
+    pass
+
+def find_node_path() -> Optional[str]:
+    """查找Node.js可执行文件路径，优先使用各系统的默认安装路径"""
+    if platform.system() == 'Windows':
+        default_path = r'C:\Program Files\nodejs\node.exe'  # Windows默认Node.js路径
+    else:
+        default_path = '/usr/local/bin/node'  # Mac默认Node.js路径
+    if os.path.exists(default_path):
+        return default_path
+    return shutil.which('node')
+
+class NodeSignEngine:
+    """
+    常驻Node.js签名进程
+
+    启动一次node进程并加载douyin.js，之后通过stdin/stdout的JSON行协议
+    反复调用签名函数，避免execjs每次调用都重新启动node并解析脚本。
+    进程的输出由后台线程读取，一次请求超过timeout秒没有响应时结束该进程并重启。
+    """
+
+    def __init__(self, node_path: Optional[str] = None, script_path: str = DOUYIN_JS, timeout: float = SIGN_TIMEOUT):
+        self.node_path = node_path or find_node_path()
+        self.script_path = script_path
+        self.timeout = timeout
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._request_id = 0
+        if not self.node_path:
+            raise SignEngineError("未找到Node.js，请先安装Node.js")
+
+    def start(self):
+        """启动签名进程"""
+        if self._process and self._process.poll() is None:
+            return
+        try:
+            self._process = subprocess.Popen(
+                [self.node_path, SIGN_WORKER_JS, self.script_path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                encoding='utf-8',
+                bufsize=1,
+            )
+            logger.debug(f"签名进程已启动: pid={self._process.pid}")
+        except OSError as e:
+            raise SignEngineError(f"启动签名进程失败: {str(e)}")
+        # 每个进程一个输出队列，重启后不会读到旧进程迟到的响应
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_lines, args=(self._process, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _read_lines(process, lines: queue.Queue):
+        """把签名进程的输出逐行放入队列，进程退出时放入None"""
+        try:
+            for line in process.stdout:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def close(self):
+        """关闭签名进程"""
+        process, self._process = self._process, None
+        if not process:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+
+    def kill(self):
+        """立即结束签名进程（进程没有响应时使用）"""
+        process, self._process = self._process, None
+        if not process:
+            return
+        process.kill()
+        process.wait()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _request(self, method: str, args: List) -> str:
+        self.start()
+        self._request_id += 1
+        request_id = self._request_id
+        self._process.stdin.write(json.dumps({"id": request_id, "method": method, "args": args}) + '\n')
+        self._process.stdin.flush()
+        try:
+            line = self._lines.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"签名进程 {self.timeout:g} 秒没有响应")
+        if not line:
+            raise BrokenPipeError("签名进程已退出")
+        response = json.loads(line)
+        if response.get("id") != request_id:
+            raise SignEngineError(f"签名进程响应错乱: 期望 {request_id}，收到 {response.get('id')}")
+        if "error" in response:
+            raise SignEngineError(response["error"])
+        return response.get("result")
+
+    def call(self, method: str, *args) -> str:
+        """调用签名脚本中的函数，接口与execjs上下文的call保持一致"""
+        with self._lock:
+            try:
+                return self._request(method, list(args))
+            except TimeoutError as e:
+                logger.warning(f"{str(e)}，正在重启")
+                self.kill()
+                return self._request(method, list(args))
+            except (BrokenPipeError, OSError) as e:
+                # 进程意外退出时重启一次
+                logger.warning(f"签名进程异常，正在重启: {str(e)}")
+                self.close()
+                return self._request(method, list(args))
+
+    def sign_datail(self, params: str, user_agent: str) -> str:
+        """生成评论列表接口签名"""
+        return self.call('sign_datail', params, user_agent)
+
+    def sign_reply(self, params: str, user_agent: str) -> str:
+        """生成评论回复接口签名"""
+        return self.call('sign_reply', params, user_agent)
+
+_node_registered = False
+
+def _register_node_runtime(execjs):
+    """把系统默认路径下的Node.js注册为execjs运行时（只注册一次）"""
+    global _node_registered
+    node_path = find_node_path()
+    if node_path and not _node_registered:
+        execjs.register('Node', {'runtime_path': node_path})
+        _node_registered = True
+
+class ExecjsSignEngine:
+    """基于execjs的签名实现，每次调用都会启动新的node进程，保留用于兼容和对比"""
+
+    def __init__(self, script_path: str = DOUYIN_JS):
+        # 只有选择execjs后端时才导入execjs，默认的纯Python签名不依赖Node.js
+        import execjs
+        _register_node_runtime(execjs)
+        with open(script_path, 'r', encoding='utf-8') as f:
+            js_code = f.read()
+            # 处理可能的编码问题
+            js_code = js_code.replace('\ufeff', '')  # 移除BOM
+            js_code = js_code.encode('utf-8').decode('utf-8-sig')  # 处理编码
+        self._context = execjs.compile(js_code)
+
+    def call(self, method: str, *args) -> str:
+        """调用签名脚本中的函数"""
+        import execjs
+        try:
+            return self._context.call(method, *args)
+        except execjs.RuntimeError as e:
+            raise SignEngineError(str(e))
+
+    def sign_datail(self, params: str, user_agent: str) -> str:
+        """生成评论列表接口签名"""
+        return self.call('sign_datail', params, user_agent)
+
+    def sign_reply(self, params: str, user_agent: str) -> str:
+        """生成评论回复接口签名"""
+        return self.call('sign_reply', params, user_agent)
+
+    def close(self):
+        pass
+
+class PythonSignEngine:
+    """基于abogus模块的纯Python签名实现，不依赖Node.js"""
+
+    def call(self, method: str, *args) -> str:
+        """调用签名函数，接口与execjs上下文的call保持一致"""
+        if method not in ('sign_datail', 'sign_reply'):
+            raise SignEngineError(f"不支持的签名函数: {method}")
+        return getattr(abogus, method)(*args)
+
+    def sign_datail(self, params: str, user_agent: str) -> str:
+        """生成评论列表接口签名"""
+        return self.call('sign_datail', params, user_agent)
+
+    def sign_reply(self, params: str, user_agent: str) -> str:
+        """生成评论回复接口签名"""
+        return self.call('sign_reply', params, user_agent)
+
+    def sign_batch(self, queries: List[str], user_agent: str, reply: bool = False) -> List[str]:
+        """批量签名，后缀和User-Agent的摘要只计算一次"""
+        arguments = abogus.REPLY_ARGUMENTS if reply else abogus.DETAIL_ARGUMENTS
+        return abogus.sign_batch(queries, user_agent, arguments)
+
+    def cache_info(self) -> dict:
+        """返回User-Agent和后缀摘要缓存的命中/未命中次数"""
+        return abogus.cache_info()
+
+    def close(self):
+        pass
+
+def create_sign_engine(backend: Optional[str] = None):
+    """
+    创建签名引擎
+
+    Args:
+        backend: 签名后端，可选 python（纯Python实现）、node（常驻进程）或 execjs，
+                 默认读取环境变量DOUYIN_SIGN_BACKEND，未设置时使用python
+
+    Returns:
+        签名引擎实例，提供call/sign_datail/sign_reply方法
+    """
+    backend = (backend or os.getenv("DOUYIN_SIGN_BACKEND") or "python").lower()
+    if backend == "python":
+        return PythonSignEngine()
+    if backend == "execjs":
+        return ExecjsSignEngine()
+    if backend == "node":
+        engine = NodeSignEngine()
+        engine.start()
+        atexit.register(engine.close)
+        return engine
+    raise SignEngineError(f"不支持的签名后端: {backend}")
+
+# 子进程中的签名引擎（进程池模式下每个工作进程一个）
+_process_engine = None
+
+def _init_process_engine(backend: str):
+    global _process_engine
+    _process_engine = create_sign_engine(backend)
+
+def _process_call(method: str, *args) -> str:
+    return _process_engine.call(method, *args)
+
+class AsyncSigner:
+    """
+    异步签名接口
+
+    签名在线程池或进程池中执行，协程只需要 await，事件循环不会被签名阻塞。
+    - thread 模式：每个线程各自持有一个签名引擎（node后端即每线程一个常驻进程），
+      适合node/execjs这类在子进程中计算的后端
+    - process 模式：每个工作进程各自创建签名引擎，纯Python签名可以利用多核
+    """
+
+    def __init__(self, backend: Optional[str] = None, workers: Optional[int] = None, mode: str = "auto"):
+        """
+        Args:
+            backend: 签名后端，同create_sign_engine
+            workers: 签名工作线程/进程数，默认读取环境变量DOUYIN_SIGN_WORKERS，未设置时为CPU核数（最多4个）
+            mode: thread、process 或 auto（使用线程池）；签名耗时远小于进程间传递参数的开销，
+                进程池在benchmark.py signer中没有提速，只在需要时显式指定process
+        """
+        self.backend = (backend or os.getenv("DOUYIN_SIGN_BACKEND") or "python").lower()
+        workers = workers or int(os.getenv("DOUYIN_SIGN_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+        self.workers = max(1, workers)
+        mode = (mode or "auto").lower()
+        if mode == "auto":
+            mode = "thread"
+        if mode not in ("thread", "process"):
+            raise SignEngineError(f"不支持的签名模式: {mode}")
+        self.mode = mode
+        self._executor: Optional[Executor] = None
+        self._local = threading.local()
+        self._engines = []
+        self._lock = threading.Lock()
+
+    def _thread_engine(self):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = create_sign_engine(self.backend)
+            self._local.engine = engine
+            with self._lock:
+                self._engines.append(engine)
+        return engine
+
+    def _thread_call(self, method: str, *args) -> str:
+        return self._thread_engine().call(method, *args)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.mode == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_process_engine,
+                        initargs=(self.backend,),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="signer")
+                logger.debug(f"签名工作池已启动: {self.mode} x {self.workers}，后端 {self.backend}")
+            return self._executor
+
+    async def call(self, method: str, *args) -> str:
+        """在工作池中调用签名函数"""
+        executor = self._get_executor()
+        func = _process_call if self.mode == "process" else self._thread_call
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, method, *args)
+
+    async def sign(self, query: str, user_agent: str, kind: str = "detail") -> str:
+        """
+        生成a_bogus签名
+
+        Args:
+            query: 已排序编码的查询字符串
+            user_agent: 请求使用的User-Agent
+            kind: detail（评论列表）或 reply（评论回复）
+        """
+        method = "sign_reply" if kind == "reply" else "sign_datail"
+        return await self.call(method, query, user_agent)
+
+    def close(self):
+        """关闭工作池和各线程的签名引擎"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            engines, self._engines = self._engines, []
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for engine in engines:
+            try:
+                engine.close()
+            except Exception as e:
+                logger.error(f"关闭签名引擎时出错: {str(e)}")
+
+_default_signer: Optional[AsyncSigner] = None
+_default_signer_lock = threading.Lock()
+
+def get_async_signer() -> AsyncSigner:
+    """获取全局异步签名器，首次调用时按环境变量创建"""
+    global _default_signer
+    with _default_signer_lock:
+        if _default_signer is None:
+            _default_signer = AsyncSigner()
+        return _default_signer
+
+def configure_async_signer(backend: Optional[str] = None, workers: Optional[int] = None, mode: str = "auto") -> AsyncSigner:
+    """替换全局异步签名器（例如调整签名工作数），旧的签名器会被关闭"""
+    global _default_signer
+    signer = AsyncSigner(backend, workers, mode)
+    with _default_signer_lock:
+        old, _default_signer = _default_signer, signer
+    if old is not None:
+        old.close()
+    return signer
+
+@atexit.register
+def _close_default_signer():
+    if _default_signer is not None:
+        _default_signer.close()
+
+async def sign_async(query: str, user_agent: str, kind: str = "detail") -> str:
+    """使用全局异步签名器生成签名，见AsyncSigner.sign"""
+    return await get_async_signer().sign(query, user_agent, kind)
@@ -0,0 +1,34 @@
+// 常驻签名进程：启动时加载一次douyin.js，之后从stdin逐行读取JSON请求，向stdout逐行写出JSON结果
+// 请求格式: {"id": 1, "method": "sign_datail", "args": ["query", "user-agent"]}
+// 响应格式: {"id": 1, "result": "..."} 或 {"id": 1, "error": "错误信息"}
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+const vm = require('vm');
+
+const scriptPath = process.argv[2] || path.join(__dirname, 'douyin.js');
+const code = fs.readFileSync(scriptPath, 'utf-8').replace(/^\ufeff/, '');
+vm.runInThisContext(code, {filename: scriptPath});
+
+const ALLOWED_METHODS = new Set(['sign_datail', 'sign_reply', 'sign']);
+
+const rl = readline.createInterface({input: process.stdin, terminal: false});
+rl.on('line', (line) => {
+    if (!line.trim()) {
+        return;
+    }
+    let request = null;
+    let response = null;
+    try {
+        request = JSON.parse(line);
+        if (!ALLOWED_METHODS.has(request.method)) {
+            throw new Error('unknown method: ' + request.method);
+        }
+        const result = globalThis[request.method].apply(null, request.args || []);
+        response = {id: request.id, result: result};
+    } catch (e) {
+        response = {id: request ? request.id : null, error: String(e && e.stack || e)};
+    }
+    process.stdout.write(JSON.stringify(response) + '\n');
+});
+rl.on('close', () => process.exit(0));
@@ -0,0 +1,240 @@
+"""
+SQLite存储：所有视频的评论、回复和用户保存在同一个数据库中
+
+评论和回复分表保存，回复记录所属的评论（parent_cid），按评论ID upsert：重复采集、断点续采和增量刷新
+都只会更新点赞数、回复数等计数，不会产生重复行。数据库使用WAL模式，写入时可以同时查询。
+
+用法:
+    python main.py <视频ID> --replies --db data/comments.db
+    python sqlite_store.py data/comments.db --top 20 --days 7
+"""
+import os
+import time
+import sqlite3
+import argparse
+import pandas as pd
+from loguru import logger
+from typing import Dict, Iterable, Optional
+
+DEFAULT_DB_PATH = "data/comments.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid TEXT PRIMARY KEY,
+    unique_id TEXT,
+    nickname TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    cid INTEGER PRIMARY KEY,
+    aweme_id TEXT NOT NULL,
+    uid TEXT,
+    text TEXT,
+    digg_count INTEGER NOT NULL DEFAULT 0,
+    reply_total INTEGER NOT NULL DEFAULT 0,
+    create_time INTEGER NOT NULL,
+    ip_label TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS replies (
+    cid INTEGER PRIMARY KEY,
+    parent_cid INTEGER NOT NULL,
+    aweme_id TEXT NOT NULL,
+    uid TEXT,
+    text TEXT,
+    digg_count INTEGER NOT NULL DEFAULT 0,
+    create_time INTEGER NOT NULL,
+    ip_label TEXT,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comments_aweme ON comments(aweme_id, create_time);
+CREATE INDEX IF NOT EXISTS idx_comments_time ON comments(create_time);
+CREATE INDEX IF NOT EXISTS idx_replies_parent ON replies(parent_cid);
+CREATE INDEX IF NOT EXISTS idx_replies_aweme ON replies(aweme_id, create_time);
+CREATE INDEX IF NOT EXISTS idx_replies_time ON replies(create_time);
+"""
+
+UPSERT_USER = """
+INSERT INTO users (uid, unique_id, nickname, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT(uid) DO UPDATE SET
+    unique_id = excluded.unique_id, nickname = excluded.nickname, updated_at = excluded.updated_at
+"""
+
+UPSERT_COMMENT = """
+INSERT INTO comments (cid, aweme_id, uid, text, digg_count, reply_total, create_time, ip_label, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(cid) DO UPDATE SET
+    uid = excluded.uid, text = excluded.text, digg_count = excluded.digg_count,
+    reply_total = excluded.reply_total, ip_label = excluded.ip_label, updated_at = excluded.updated_at
+"""
+
+UPSERT_REPLY = """
+INSERT INTO replies (cid, parent_cid, aweme_id, uid, text, digg_count, create_time, ip_label, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(cid) DO UPDATE SET
+    uid = excluded.uid, text = excluded.text, digg_count = excluded.digg_count,
+    ip_label = excluded.ip_label, updated_at = excluded.updated_at
+"""
+
+# 查询结果的列名与CSV输出一致，另加视频ID（回复还有父评论ID）
+SELECT_COLUMNS = """
+    CAST(c.cid AS TEXT) AS 评论ID, c.text AS 评论内容, c.digg_count AS 点赞数,
+    strftime('%Y-%m-%d %H:%M:%S', c.create_time, 'unixepoch', 'localtime') AS 评论时间,
+    COALESCE(u.nickname, '未知') AS 用户昵称, COALESCE(u.unique_id, '未设置') AS 用户抖音号,
+    COALESCE(c.ip_label, '未知') AS ip归属
+"""
+
+def user_key(user: Dict) -> Optional[str]:
+    """用户的唯一标识：优先uid，其次sec_uid和抖音号"""
+    for key in ("uid", "sec_uid", "unique_id"):
+        value = user.get(key)
+        if value:
+            return str(value)
+    return None
+
+class SqliteStore:
+    """
+    评论数据库
+
+    每次upsert_comments/upsert_replies在一个事务中用executemany批量写入，采集时每页调用一次，
+    应在提交断点之前调用：断点之后重新采集的页再次upsert也不会产生重复。
+    连接只能在创建它的线程中使用。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL模式下NORMAL只在检查点时同步，断电最多丢失最后几个事务，断点会让这些页重新采集
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _rows(self, aweme_id: str, items: Iterable[Dict], now: int, users: Dict):
+        """把原始评论/回复转换为 (cid, aweme_id, uid, text, digg_count, reply_total, create_time, ip_label) 元组"""
+        rows = []
+        skipped = 0
+        for item in items:
+            if not isinstance(item, dict) or not str(item.get("cid", "")).isdigit():
+                skipped += 1
+                continue
+            user = item.get("user") if isinstance(item.get("user"), dict) else {}
+            uid = user_key(user)
+            if uid is not None:
+                users[uid] = (uid, user.get("unique_id"), user.get("nickname"), now)
+            create_time = item.get("create_time", 0)
+            rows.append((
+                int(item["cid"]), str(item.get("aweme_id") or aweme_id), uid, item.get("text", ""),
+                int(item.get("digg_count", 0) or 0), int(item.get("reply_comment_total", 0) or 0),
+                int(create_time) if isinstance(create_time, (int, float)) else 0, item.get("ip_label")
+            ))
+        if skipped:
+            logger.warning(f"写入数据库时跳过 {skipped} 条无效记录")
+        return rows
+
+    def upsert_comments(self, aweme_id: str, comments: Iterable[Dict]) -> int:
+        """
+        批量写入一级评论，已存在的评论更新内容和计数
+
+        Returns:
+            int: 写入的评论数
+        """
+        now = int(time.time())
+        users = {}
+        rows = self._rows(aweme_id, comments, now, users)
+        with self.conn:
+            self.conn.executemany(UPSERT_USER, users.values())
+            self.conn.executemany(UPSERT_COMMENT, [row + (now,) for row in rows])
+        return len(rows)
+
+    def upsert_replies(self, aweme_id: str, parent_cid: str, replies: Iterable[Dict]) -> int:
+        """
+        批量写入一条评论的回复
+
+        Returns:
+            int: 写入的回复数
+        """
+        now = int(time.time())
+        users = {}
+        rows = self._rows(aweme_id, replies, now, users)
+        parent = int(parent_cid)
+        with self.conn:
+            self.conn.executemany(UPSERT_USER, users.values())
+            self.conn.executemany(UPSERT_REPLY, [
+                (cid, parent, aweme, uid, text, digg, create_time, ip, now)
+                for cid, aweme, uid, text, digg, _, create_time, ip in rows
+            ])
+        return len(rows)
+
+    def counts(self, aweme_id: Optional[str] = None) -> Dict[str, int]:
+        """评论数、回复数和用户数，传入aweme_id时只统计该视频"""
+        if aweme_id is None:
+            comments, = self.conn.execute("SELECT COUNT(*) FROM comments").fetchone()
+            replies, = self.conn.execute("SELECT COUNT(*) FROM replies").fetchone()
+        else:
+            comments, = self.conn.execute("SELECT COUNT(*) FROM comments WHERE aweme_id = ?", (aweme_id,)).fetchone()
+            replies, = self.conn.execute("SELECT COUNT(*) FROM replies WHERE aweme_id = ?", (aweme_id,)).fetchone()
+        users, = self.conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        return {"comments": comments, "replies": replies, "users": users}
+
+    def top_comments(self, since: Optional[float] = None, until: Optional[float] = None,
+                     aweme_id: Optional[str] = None, limit: int = 100) -> pd.DataFrame:
+        """
+        点赞数最多的一级评论，例如所有视频最近一周的热门评论
+
+        按评论时间范围走idx_comments_time索引，指定视频时走idx_comments_aweme索引。
+
+        Args:
+            since: 评论时间下限（秒级时间戳，含）
+            until: 评论时间上限（秒级时间戳，不含）
+            aweme_id: 只查询该视频
+            limit: 返回的条数
+        """
+        conditions, params = [], []
+        if aweme_id is not None:
+            conditions.append("c.aweme_id = ?")
+            params.append(str(aweme_id))
+        if since is not None:
+            conditions.append("c.create_time >= ?")
+            params.append(int(since))
+        if until is not None:
+            conditions.append("c.create_time < ?")
+            params.append(int(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (f"SELECT c.aweme_id AS 视频ID, {SELECT_COLUMNS}, c.reply_total AS 回复总数 "
+               f"FROM comments c LEFT JOIN users u ON u.uid = c.uid {where} "
+               f"ORDER BY c.digg_count DESC, c.cid LIMIT ?")
+        return pd.read_sql_query(sql, self.conn, params=params + [int(limit)])
+
+    def replies_of(self, parent_cid: str) -> pd.DataFrame:
+        """一条评论的全部回复，按评论时间排序"""
+        sql = (f"SELECT {SELECT_COLUMNS}, CAST(c.parent_cid AS TEXT) AS 父评论ID "
+               f"FROM replies c LEFT JOIN users u ON u.uid = c.uid "
+               f"WHERE c.parent_cid = ? ORDER BY c.create_time, c.cid")
+        return pd.read_sql_query(sql, self.conn, params=[int(parent_cid)])
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="查询评论数据库")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB_PATH, help="数据库路径")
+    parser.add_argument("--top", type=int, default=20, help="输出点赞数最多的评论条数")
+    parser.add_argument("--days", type=float, help="只统计最近几天的评论")
+    parser.add_argument("--aweme-id", help="只查询该视频")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with SqliteStore(args.db) as store:
+        since = time.time() - args.days * 86400 if args.days else None
+        print(store.counts(args.aweme_id))
+        print(store.top_comments(since=since, aweme_id=args.aweme_id, limit=args.top).to_string(index=False))
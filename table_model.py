@@ -0,0 +1,108 @@
+import bisect
+import pandas as pd
+from typing import List, Optional
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+# 每次滚动到底部时加入表格的行数
+FETCH_BATCH = 500
+
+class CommentTableModel(QAbstractTableModel):
+    """
+    以DataFrame为数据源的只读表格模型（配合QTableView使用）
+
+    表格只在绘制时读取可见单元格，不复制数据，DataFrame是唯一的一份数据；
+    行在滚动到底部时分批加入（canFetchMore/fetchMore），显示几万条评论也不会卡住界面。
+    采集过程中用append_frame追加的每批数据单独保存（不反复拼接整张表），frame()时才合并。
+    """
+
+    def __init__(self, columns: List[str], headers: Optional[List[str]] = None,
+                 batch_size: int = FETCH_BATCH, parent=None):
+        """
+        Args:
+            columns: 按顺序显示的DataFrame列名
+            headers: 表头文字，默认与列名相同
+            batch_size: 每次加入表格的行数
+        """
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.headers = list(headers or columns)
+        self.batch_size = max(1, batch_size)
+        self._chunks = []  # (起始行, DataFrame, 各列在DataFrame中的位置，-1表示缺少该列)
+        self._starts = []
+        self._total = 0
+        self._loaded = 0
+
+    def _add_chunk(self, frame: pd.DataFrame):
+        positions = [frame.columns.get_loc(c) if c in frame.columns else -1 for c in self.columns]
+        self._chunks.append((self._total, frame, positions))
+        self._starts.append(self._total)
+        self._total += len(frame)
+
+    def set_frame(self, frame: Optional[pd.DataFrame]):
+        """替换数据源，只加载第一批行"""
+        self.beginResetModel()
+        self._chunks, self._starts, self._total = [], [], 0
+        if frame is not None and len(frame):
+            self._add_chunk(frame)
+        self._loaded = min(self.batch_size, self._total)
+        self.endResetModel()
+
+    def append_frame(self, frame: pd.DataFrame):
+        """追加一批行；之前的行已全部加入表格时直接显示新行，否则等滚动到底部时再加载"""
+        if frame is None or not len(frame):
+            return
+        shown_all = self._loaded == self._total
+        self._add_chunk(frame)
+        if shown_all:
+            self.fetchMore()
+
+    def frame(self) -> pd.DataFrame:
+        """全部数据（多批数据在此时合并为一个DataFrame）"""
+        if not self._chunks:
+            return pd.DataFrame(columns=self.columns)
+        if len(self._chunks) > 1:
+            merged = pd.concat([chunk for _, chunk, _ in self._chunks], ignore_index=True)
+            self._chunks, self._starts, self._total = [], [], 0
+            self._add_chunk(merged)
+        return self._chunks[0][1]
+
+    @property
+    def total_rows(self) -> int:
+        """数据源的总行数（包括尚未加入表格的行）"""
+        return self._total
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        start, frame, positions = self._chunks[bisect.bisect_right(self._starts, index.row()) - 1]
+        position = positions[index.column()]
+        if position < 0:
+            return ""
+        value = frame.iat[index.row() - start, position]
+        return "" if pd.isna(value) else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.batch_size, self._total - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
@@ -0,0 +1,90 @@
+"""
+断点续采测试：采集到一半中断后从断点继续，结果与一次性采集完全一致
+
+运行: python -m pytest -q test_checkpoint.py
+"""
+import asyncio
+import pandas as pd
+import pytest
+
+import main
+import fetch_replies
+from checkpoint import CrawlCheckpoint
+from crawl_control import CrawlControl
+from writers import CsvAppendWriter
+
+def read_result(tmp_path):
+    return pd.read_csv(tmp_path / "data/v1/1/comments.csv", encoding="utf-8-sig", dtype={"评论ID": str})
+
+@pytest.mark.parametrize("writes", [2, 6])
+def test_resume_matches_full_crawl(mock_crawl, crash_after, tmp_path, monkeypatch, writes):
+    original = crash_after(writes)
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.crawl_to_csv_async("1", get_replies=True))
+
+    checkpoint = CrawlCheckpoint("1")
+    assert checkpoint.load() and not checkpoint.finished
+    # 提交点之后写入的半行数据在恢复时会被截断
+    with open(tmp_path / "data/v1/1/comments.csv", "a", encoding="utf-8") as f:
+        f.write("半行数据")
+
+    monkeypatch.setattr(CsvAppendWriter, "write_rows", original)
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True, resume=True))
+
+    df = read_result(tmp_path)
+    assert len(df) == 90 + 90 * 2
+    assert df["评论ID"].is_unique
+    checkpoint = CrawlCheckpoint("1")
+    assert checkpoint.load() and checkpoint.finished
+
+def test_resume_without_checkpoint_starts_over(mock_crawl, tmp_path):
+    asyncio.run(main.crawl_to_csv_async("1", resume=True))
+    df = read_result(tmp_path)
+    assert len(df) == 90
+    assert (df["回复总数"] == 2).all()
+
+def test_on_rows_streams_every_row(mock_crawl, tmp_path):
+    batches = []
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True, on_rows=lambda rows, status: batches.append((rows, status))))
+    streamed = [row["评论ID"] for rows, _ in batches for row in rows]
+    assert sorted(streamed) == sorted(read_result(tmp_path)["评论ID"])
+    comment_status = [status for _, status in batches if status["stage"] == "comments"]
+    assert comment_status[-1]["comment_count"] == comment_status[-1]["total_comments"] == 90
+    last = batches[-1][1]
+    assert last["stage"] == "replies" and last["replies_done"] == last["reply_targets"] == 90
+
+def test_cancel_keeps_partial_result_and_resumes(mock_crawl, tmp_path):
+    control = CrawlControl()
+    batches = []
+
+    def on_rows(rows, status):
+        batches.append(rows)
+        if len(batches) == 2:
+            control.cancel()
+
+    save_path = asyncio.run(main.crawl_to_csv_async("1", get_replies=True, on_rows=on_rows, control=control))
+    partial = read_result(tmp_path)
+    assert save_path.endswith("comments.csv")
+    assert 0 < len(partial) < 90
+    assert sorted(partial["评论ID"]) == sorted(row["评论ID"] for rows in batches for row in rows)
+    checkpoint = CrawlCheckpoint("1")
+    assert checkpoint.load() and not checkpoint.finished
+
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True, resume=True))
+    df = read_result(tmp_path)
+    assert len(df) == 90 + 90 * 2
+    assert df["评论ID"].is_unique
+
+def test_fetch_all_replies_async_returns_partial_on_cancel(mock_crawl, monkeypatch):
+    comments = [{"aweme_id": "1", "cid": str(i), "reply_comment_total": 2} for i in range(1, 41)]
+    control = CrawlControl()
+    original = fetch_replies.fetch_reply_page
+
+    async def fetch_reply_page(*args, **kwargs):
+        page = await original(*args, **kwargs)
+        if args[1] == "5":
+            control.cancel()
+        return page
+    monkeypatch.setattr(fetch_replies, "fetch_reply_page", fetch_reply_page)
+    replies = asyncio.run(main.fetch_all_replies_async(comments, concurrency=2, rate=1000, control=control))
+    assert 0 < len(replies) < 80
@@ -0,0 +1,102 @@
+"""
+请求上下文测试：缓存后生成的查询字符串与逐次处理完全一致
+
+运行: python -m pytest -q test_common.py
+"""
+import asyncio
+import subprocess
+import sys
+import time
+
+import common
+import sign_engine
+from sign_engine import AsyncSigner, NodeSignEngine
+from common import RequestContext, build_query, common_uncached, get_request_context
+
+COOKIE = "s_v_web_id=verify_abc; dy_swidth=1920; dy_sheight=1080; device_web_cpu_core=8; device_web_memory_size=16"
+
+def test_context_query_matches_uncached(monkeypatch):
+    queries = []
+    monkeypatch.setattr(common.DOUYIN_SIGN, "call", lambda name, query, ua: queries.append((name, query)) or "sig")
+    context = RequestContext(COOKIE)
+    monkeypatch.setattr(common, "get_ms_token", lambda: context.static_params["msToken"])
+    monkeypatch.setattr(common, "get_webid", lambda params=None: context.static_params["webid"])
+
+    for uri, params in [
+        ("/aweme/v1/web/comment/list/", {"aweme_id": "7456965026184809728", "cursor": "40", "count": "20", "item_type": 0}),
+        ("/aweme/v1/web/comment/list/reply/", {"item_id": "1", "comment_id": "2", "cursor": "0", "count": "50", "item_type": 0}),
+    ]:
+        cached_params, cached_headers = context.build(uri, dict(params), {"cookie": COOKIE})
+        legacy_params, legacy_headers = common_uncached(uri, dict(params), {"cookie": COOKIE})
+        assert queries[-2] == queries[-1]
+        assert cached_params == legacy_params
+        assert cached_headers == legacy_headers
+    assert queries[-1][0] == "sign_reply"
+
+def test_dynamic_params_override_static():
+    context = RequestContext(COOKIE)
+    params = {"cursor": "0", "screen_width": "800", "version_code": None}
+    expected = build_query({**context.static_params, **params})
+    assert context.build_query(params) == expected
+    assert "screen_width=800" in expected
+
+def test_context_cached_per_cookie():
+    common.clear_request_contexts()
+    first = get_request_context(COOKIE)
+    assert get_request_context(COOKIE) is first
+    assert get_request_context(COOKIE + "; a=1") is not first
+    assert first.static_params["screen_width"] == "1920"
+
+def test_build_async_matches_build(monkeypatch):
+    monkeypatch.setattr(common.DOUYIN_SIGN, "call", lambda name, query, ua: f"{name}:{query}")
+
+    async def fake_sign(query, ua, kind="detail"):
+        return f"{'sign_reply' if kind == 'reply' else 'sign_datail'}:{query}"
+    monkeypatch.setattr(common, "sign_async", fake_sign)
+
+    context = RequestContext(COOKIE)
+    for uri in ("/aweme/v1/web/comment/list/", "/aweme/v1/web/comment/list/reply/"):
+        params = {"aweme_id": "1", "cursor": "20", "count": "20"}
+        assert asyncio.run(context.build_async(uri, dict(params), {})) == context.build(uri, dict(params), {})
+
+def test_async_signer_thread_and_process():
+    async def sign_many(signer):
+        return await asyncio.gather(*(signer.sign(f"cursor={i}", "Mozilla/5.0", "detail") for i in range(4)))
+
+    for mode in ("thread", "process"):
+        signer = AsyncSigner("python", workers=2, mode=mode)
+        try:
+            signatures = asyncio.run(sign_many(signer))
+        finally:
+            signer.close()
+        assert signer.mode == mode
+        assert all(isinstance(s, str) and s for s in signatures)
+    assert AsyncSigner("python", workers=4).mode == "thread"
+
+def test_node_engine_restarts_stuck_worker(tmp_path, monkeypatch):
+    # 用Python脚本代替node签名进程：第一次请求不响应，重启后的进程正常返回
+    worker = tmp_path / "worker.py"
+    worker.write_text(
+        "import json, os, sys, time\n"
+        "marker = sys.argv[1] + '.hung'\n"
+        "for line in sys.stdin:\n"
+        "    request = json.loads(line)\n"
+        "    if not os.path.exists(marker):\n"
+        "        open(marker, 'w').close()\n"
+        "        time.sleep(60)\n"
+        "    print(json.dumps({'id': request['id'], 'result': 'ok'}), flush=True)\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(sign_engine, "SIGN_WORKER_JS", str(worker))
+    engine = NodeSignEngine(node_path=sys.executable, script_path=str(tmp_path / "douyin"), timeout=0.5)
+    try:
+        started = time.perf_counter()
+        assert engine.call("sign_datail", "cursor=0", "Mozilla/5.0") == "ok"
+        assert time.perf_counter() - started < 5
+    finally:
+        engine.close()
+
+def test_default_backend_does_not_import_execjs():
+    # 在新进程中检查，当前进程可能已被其他测试导入过execjs
+    code = "import sys, main; assert 'execjs' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=sign_engine.BASE_DIR, capture_output=True)
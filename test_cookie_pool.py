@@ -0,0 +1,75 @@
+"""
+Cookie账号池测试
+
+运行: python -m pytest -q test_cookie_pool.py
+"""
+import asyncio
+
+import pytest
+
+import batch
+from batch import BatchCrawler
+from cookie_pool import CookiePool, read_cookies
+
+def test_round_robin_skips_busy_accounts():
+    pool = CookiePool(["a=1", "b=2", "c=3", "a=1"], strategy="round_robin", max_in_flight=1)
+    assert len(pool) == 3
+    first, second = pool.acquire(), pool.acquire()
+    assert (first.cookie, second.cookie) == ("a=1", "b=2")
+    pool.release(first)
+    assert pool.acquire().cookie == "c=3"
+    assert pool.acquire().cookie == "a=1"
+    assert pool.acquire() is None
+
+def test_least_loaded_prefers_idle_and_healthy():
+    pool = CookiePool(["a=1", "b=2"], max_in_flight=2)
+    a, b = pool.accounts
+    a.controller.on_backoff("空页面")
+    b.controller.on_success()
+    assert pool.acquire() is b
+    assert pool.acquire() is a
+    assert pool.acquire() is b
+
+def test_quarantine_after_consecutive_403():
+    pool = CookiePool(["a=1", "b=2"], quarantine_after=2, quarantine_seconds=60)
+    a, b = pool.accounts
+    a.controller.on_backoff("访问被拒绝，请检查Cookie是否有效")
+    assert a.available
+    a.controller.on_backoff("IP被限制，请稍后再试")
+    assert a.quarantined and a.blocked_count == 2
+    with pool.lease() as account:
+        assert account is b
+
+def test_invalid_cookie_is_disabled():
+    pool = CookiePool(["a=1"])
+    account = pool.acquire()
+    pool.report_failure(account, "Cookie已失效，请更新Cookie")
+    pool.release(account)
+    with pytest.raises(ValueError):
+        pool.acquire()
+
+def test_batch_failures_only_disable_invalid_cookies(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def crawl(aweme_id, **kwargs):
+        raise ValueError("视频不存在或已被删除" if aweme_id != "2" else "Cookie已失效，请更新Cookie")
+    monkeypatch.setattr(batch, "crawl_to_csv_async", crawl)
+
+    # 与账号无关的失败不计入健康统计，不会让账号被隔离
+    crawler = BatchCrawler(cookies=["a=1"], report_interval=60)
+    account = crawler.pool.accounts[0]
+    jobs = asyncio.run(crawler.run(["1", "3", "4"]))
+    assert [job.status for job in jobs] == ["failed"] * 3
+    assert account.soft_failure_count == 0 and account.available
+
+    jobs = asyncio.run(crawler.run(["2"]))
+    assert jobs[0].status == "failed" and account.invalid
+
+def test_read_cookies_with_rate(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text("# 注释\na=1\t2.5\nb=2\n", encoding="utf-8")
+    cookies, options = read_cookies(str(path))
+    assert cookies == ["a=1", "b=2"]
+    assert options == [{"max_rate": 2.5}, {}]
+    pool = CookiePool(cookies, account_rate_options=options)
+    assert pool.accounts[0].controller.max_rate == 2.5
@@ -0,0 +1,54 @@
+"""
+取消/暂停令牌测试：取消立即中断等待，暂停期间不再继续，继续后正常完成
+
+运行: python -m pytest -q test_crawl_control.py
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from crawl_control import CrawlCancelled, CrawlControl, controlled
+
+def test_cancel_interrupts_sleep_from_another_thread():
+    control = CrawlControl()
+    threading.Timer(0.05, control.cancel).start()
+
+    async def run():
+        started = time.perf_counter()
+        with pytest.raises(CrawlCancelled):
+            await control.sleep(10)
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 1
+    assert control.cancelled and not control.paused
+
+def test_pause_waits_until_resume():
+    control = CrawlControl()
+    control.pause()
+    threading.Timer(0.2, control.resume).start()
+
+    async def run():
+        started = time.perf_counter()
+        result = await controlled(asyncio.sleep(0, result="ok"), control)
+        return result, time.perf_counter() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result == "ok" and elapsed >= 0.15
+
+def test_cancel_while_paused():
+    control = CrawlControl()
+    control.pause()
+    threading.Timer(0.05, control.cancel).start()
+
+    async def run():
+        with pytest.raises(CrawlCancelled):
+            await control.checkpoint()
+
+    asyncio.run(run())
+
+def test_cancel_error_is_not_swallowed_by_retry_loops():
+    # 采集循环用 except Exception 重试，取消必须能穿过这些循环
+    assert not issubclass(CrawlCancelled, Exception)
+    assert issubclass(CrawlCancelled, asyncio.CancelledError)
@@ -0,0 +1,126 @@
+"""
+增量刷新测试：只分页到已知评论为止，新评论和变化的计数合并到已有结果
+"""
+import os
+import asyncio
+import pandas as pd
+import pytest
+
+import main
+from delta import refresh_async
+from checkpoint import CrawlCheckpoint
+from writers import CsvAppendWriter
+from mock_server import BASE_CID
+
+@pytest.fixture
+def mock_options():
+    return {"total_comments": 200, "replies_per_comment": 2}
+
+def read_result():
+    return pd.read_csv("data/v1/1/comments.csv", encoding="utf-8-sig", dtype={"评论ID": str})
+
+def test_first_refresh_is_full_crawl(mock_crawl):
+    result = asyncio.run(refresh_async("1", get_replies=True))
+    assert result["mode"] == "full"
+    assert len(read_result()) == 200 * 3
+
+def test_refresh_fetches_only_new_pages(mock_crawl):
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True))
+    mock_crawl.add_comments(25)
+    mock_crawl.bump_likes(1)
+    requests_before = mock_crawl.stats["requests"]
+
+    result = asyncio.run(refresh_async("1", get_replies=True))
+    # 2页有新评论，之后连续2页都是已知评论
+    assert result["mode"] == "delta" and result["pages"] == 4
+    assert result["new_comments"] == 25 and result["new_replies"] == 25 * 2
+    assert result["updated"] == 80 - 25
+    assert mock_crawl.stats["requests"] - requests_before == 4 + 25
+
+    df = read_result().set_index("评论ID")
+    assert len(df) == 225 * 3 and df.index.is_unique
+    top = [str(BASE_CID + 200 + i) for i in range(25)]
+    assert df.loc[top, "回复总数"].eq(2).all()
+    # 扫描到的已有评论更新了点赞数，没有扫描到的保持原值
+    assert df.loc[str(BASE_CID), "点赞数"] == 1
+    assert df.loc[str(BASE_CID + 199), "点赞数"] == 199 % 97
+
+    checkpoint = CrawlCheckpoint("1")
+    assert checkpoint.load() and checkpoint.comment_count == 225 and checkpoint.reply_count == 225 * 2
+
+    # 没有变化时只扫描stop_pages页
+    result = asyncio.run(refresh_async("1", get_replies=True))
+    assert (result["pages"], result["new_comments"], result["updated"]) == (2, 0, 0)
+
+def test_refresh_fetches_new_replies_of_known_comments(mock_crawl):
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True))
+    mock_crawl.replies_per_comment = 3
+    result = asyncio.run(refresh_async("1", get_replies=True))
+    # 前2页的评论回复数增加，只获取新增的回复
+    assert (result["new_comments"], result["updated"], result["new_replies"]) == (0, 40, 40)
+    df = read_result()
+    assert len(df) == 200 * 3 + 40 and df["评论ID"].is_unique
+
+def test_unfinished_crawl_resumes_before_refresh(mock_crawl, crash_after, monkeypatch):
+    original = crash_after(3)
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.crawl_to_csv_async("1"))
+    monkeypatch.setattr(CsvAppendWriter, "write_rows", original)
+
+    result = asyncio.run(refresh_async("1"))
+    assert result["mode"] == "resume"
+    assert len(read_result()) == 200 and read_result()["评论ID"].is_unique
+
+def test_refresh_appends_when_only_new_comments(mock_crawl):
+    asyncio.run(main.crawl_to_csv_async("1"))
+    with open("data/v1/1/comments.csv", "rb") as f:
+        before = f.read()
+    mock_crawl.add_comments(5)
+    result = asyncio.run(refresh_async("1"))
+    assert (result["new_comments"], result["updated"]) == (5, 0)
+    with open("data/v1/1/comments.csv", "rb") as f:
+        after = f.read()
+    # 没有计数变化时原有内容不重写，新评论追加在末尾
+    assert after.startswith(before) and len(after) > len(before)
+    checkpoint = CrawlCheckpoint("1")
+    assert checkpoint.load() and checkpoint.output_size == len(after)
+
+def test_refresh_interrupted_before_commit_is_redone(mock_crawl, monkeypatch):
+    asyncio.run(main.crawl_to_csv_async("1"))
+    mock_crawl.add_comments(5)
+    original = CrawlCheckpoint.commit_comments
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("模拟中断")
+    monkeypatch.setattr(CrawlCheckpoint, "commit_comments", crash)
+    with pytest.raises(RuntimeError):
+        asyncio.run(refresh_async("1"))
+    monkeypatch.setattr(CrawlCheckpoint, "commit_comments", original)
+
+    # 追加了但没有提交的行被截断，重新作为新评论获取
+    result = asyncio.run(refresh_async("1"))
+    assert result["new_comments"] == 5
+    df = read_result()
+    assert len(df) == 205 and df["评论ID"].is_unique
+
+def test_refresh_interrupted_before_replace_rolls_forward(mock_crawl, monkeypatch):
+    asyncio.run(main.crawl_to_csv_async("1"))
+    mock_crawl.bump_likes(1)
+    mock_crawl.add_comments(5)
+    replace = os.replace
+
+    def crash(src, dst):
+        if src.endswith("comments.csv.tmp"):
+            raise RuntimeError("模拟中断")
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(RuntimeError):
+        asyncio.run(refresh_async("1"))
+    monkeypatch.setattr(os, "replace", replace)
+
+    # 断点已经提交，下次刷新先完成替换，不再重复获取
+    result = asyncio.run(refresh_async("1"))
+    assert result["new_comments"] == 0
+    df = read_result().set_index("评论ID")
+    assert len(df) == 205 and df.index.is_unique
+    assert df.loc[str(BASE_CID), "点赞数"] == 1
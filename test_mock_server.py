@@ -0,0 +1,101 @@
+"""
+模拟服务器故障注入测试
+
+运行: python -m pytest -q test_mock_server.py
+"""
+import asyncio
+import httpx
+import pytest
+
+import main
+import fetch_comments
+import fetch_replies
+from dedup import DedupIndex
+from rate_limit import RateLimiter
+from mock_server import MockDouyinServer, BASE_CID, COMMENT_PATH, REPLY_PATH, ERROR_MSG
+
+def get_page(server, cursor, count=20):
+    params = {"aweme_id": "1", "cursor": cursor, "count": count}
+    return httpx.get(server.url + COMMENT_PATH, params=params).json()
+
+def test_pages_follow_cursor():
+    with MockDouyinServer(total_comments=30) as server:
+        first = get_page(server, 0)
+        second = get_page(server, first["cursor"])
+    assert (first["cursor"], first["has_more"], first["total"]) == (20, 1, 30)
+    assert len(second["comments"]) == 10 and not second["has_more"]
+    assert second["comments"][0]["cid"] != first["comments"][-1]["cid"]
+
+def test_fault_injection_is_reproducible():
+    def responses(seed):
+        with MockDouyinServer(total_comments=1000, error_rate=0.3, duplicate_rate=0.3, seed=seed) as server:
+            return [get_page(server, 20 * i) for i in range(20)], server.stats
+
+    first, stats = responses(7)
+    assert responses(7)[0] == first
+    assert stats["requests"] == 20 and stats["errors"] > 0 and stats["duplicates"] > 0
+    errors = [page for page in first if page["status_code"] != 0]
+    assert all(page["status_msg"] == ERROR_MSG for page in errors)
+    # 重复页的cursor不前进
+    assert any(page["status_code"] == 0 and page["cursor"] == 20 * i and i for i, page in enumerate(first))
+
+def test_crawl_survives_injected_errors(monkeypatch):
+    with MockDouyinServer(total_comments=200, error_rate=0.2, seed=3) as server:
+        monkeypatch.setattr(fetch_comments, "url", server.url + COMMENT_PATH)
+        comments = asyncio.run(fetch_comments.fetch_all_comments(
+            "1", "s_v_web_id=test", use_batch_mode=False, dedup=DedupIndex(), rate_controller=RateLimiter(1000)
+        ))
+        assert server.stats["errors"] > 0
+    assert len({c["cid"] for c in comments}) == 200
+
+@pytest.mark.parametrize("options", [{}, {"error_rate": 0.2}, {"duplicate_rate": 0.1}])
+def test_prefetch_matches_serial_crawl(monkeypatch, options):
+    def crawl(prefetch):
+        with MockDouyinServer(total_comments=300, latency=0.01, seed=5, **options) as server:
+            monkeypatch.setattr(fetch_comments, "url", server.url + COMMENT_PATH)
+            comments = asyncio.run(fetch_comments.fetch_all_comments(
+                "1", "s_v_web_id=test", use_batch_mode=False, dedup=DedupIndex(),
+                rate_controller=RateLimiter(1000), prefetch=prefetch
+            ))
+            return [c["cid"] for c in comments], server.stats
+
+    serial, _ = crawl(0)
+    pipelined, stats = crawl(4)
+    # 预取的页按cursor顺序使用，猜错的页被丢弃
+    assert pipelined == sorted(pipelined, key=int) and len(set(pipelined)) == len(pipelined)
+    if not options:
+        assert pipelined == serial
+        assert stats["requests"] == 300 // 20  # 评论总数已知，不会预取末尾之后的页
+    assert len(pipelined) >= len(serial) - 20
+
+@pytest.mark.parametrize("total", [0, 60, 120, 400])
+def test_reply_pager_follows_cursor(monkeypatch, total):
+    # total是评论上记录的reply_comment_total，偏小或偏大时仍以服务端的cursor和has_more为准
+    with MockDouyinServer(total_comments=1, replies_per_comment=120) as server:
+        monkeypatch.setattr(fetch_replies, "url", server.url + REPLY_PATH)
+        replies = asyncio.run(fetch_replies.fetch_all_replies(
+            "1", str(BASE_CID), "s_v_web_id=test", rate_limiter=RateLimiter(1000), total=total
+        ))
+    cids = [r["cid"] for r in replies]
+    assert len(cids) == 120 and len(set(cids)) == 120
+    assert cids == sorted(cids, key=int)
+
+def test_fetch_all_replies_async_gets_every_page(monkeypatch):
+    comments = [{"aweme_id": "1", "cid": str(BASE_CID + i), "reply_comment_total": 120} for i in range(5)]
+    with MockDouyinServer(total_comments=5, replies_per_comment=120, error_rate=0.05, seed=2) as server:
+        monkeypatch.setattr(fetch_replies, "url", server.url + REPLY_PATH)
+        monkeypatch.setenv("DOUYIN_COOKIE", "s_v_web_id=test")
+        replies = asyncio.run(main.fetch_all_replies_async(comments, rate_limiter=RateLimiter(1000, 4)))
+    assert len({r["cid"] for r in replies}) == 5 * 120
+
+@pytest.mark.parametrize("total", [0, 420, 1000])
+def test_reply_pager_requests_only_pages_on_chain(monkeypatch, total):
+    # 推算的页以服务端返回的cursor和回复总数为准，reply_comment_total偏大时也不会多请求
+    with MockDouyinServer(total_comments=1, replies_per_comment=420) as server:
+        monkeypatch.setattr(fetch_replies, "url", server.url + REPLY_PATH)
+        limiter = RateLimiter(1000)
+        replies = asyncio.run(fetch_replies.fetch_all_replies(
+            "1", str(BASE_CID), "s_v_web_id=test", rate_limiter=limiter, total=total
+        ))
+        assert len({r["cid"] for r in replies}) == 420
+        assert server.stats["requests"] == 9
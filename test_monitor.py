@@ -0,0 +1,112 @@
+"""
+持续监控测试：轮询间隔跟随评论增长速度，总数变化时才增量刷新，时间序列可以恢复
+"""
+import asyncio
+import threading
+
+import httpx
+import pandas as pd
+import pytest
+
+import monitor
+from http_session import SessionManager
+from monitor import MonitorScheduler, WatchedVideo
+
+FAST = {"rate": 1000, "max_rate": 1000, "jitter": 0}
+
+@pytest.fixture
+def mock_options():
+    return {"total_comments": 100, "replies_per_comment": 1}
+
+def test_interval_follows_velocity(tmp_path):
+    active = WatchedVideo("1", base_dir=str(tmp_path))
+    idle = WatchedVideo("2", base_dir=str(tmp_path))
+    for i in range(5):
+        # 活跃视频每10分钟新增100条，另一个视频没有变化
+        active.observe(100 * i, 600 * i, max_interval=3600)
+        idle.observe(100, 600 * i, max_interval=3600)
+    assert active.velocity > 500
+    assert 60 <= active.interval < 300
+    # 没有增长的视频每次轮询间隔翻倍，直到max_interval
+    assert idle.velocity == 0 and idle.interval == 60 * 2 ** 5
+    idle.observe(100, 3000, max_interval=3600)
+    assert idle.interval == 3600
+
+    # 停止增长后速度衰减，间隔逐步拉长
+    intervals = []
+    for i in range(5, 10):
+        active.observe(400, 600 * i, max_interval=3600)
+        intervals.append(active.interval)
+    assert intervals == sorted(intervals) and intervals[-1] > intervals[0]
+
+def test_crawls_only_when_count_moves(mock_crawl):
+    scheduler = MonitorScheduler(get_replies=True, min_interval=0.05, max_interval=0.2, rate_options=FAST)
+    threading.Timer(0.8, mock_crawl.add_comments, args=(30,)).start()
+    videos = asyncio.run(scheduler.run(["1"], duration=2))
+    video = videos[0]
+
+    # 第一次轮询时完整采集，新增评论后增量刷新一次，其余轮询不采集
+    assert video.crawls == 2 and video.polls > 4
+    assert (video.count, video.crawled_count, video.new_comments) == (130, 130, 130)
+    df = pd.read_csv("data/v1/1/comments.csv", encoding="utf-8-sig", dtype={"评论ID": str})
+    assert len(df) == 130 * 2 and df["评论ID"].is_unique
+
+    series = pd.read_csv("data/v1/1/monitor.csv", encoding="utf-8-sig")
+    polls = series[series["事件"] == "轮询"]
+    assert len(polls) == video.polls and (series["事件"] == "采集").sum() == 2
+    assert polls["新增"].sum() == 30 and polls["评论总数"].iloc[-1] == 130
+
+    # 重启后从时间序列恢复，总数没有变化时不再采集
+    restored = WatchedVideo("1")
+    restored.restore(0.05, 0.2)
+    assert (restored.count, restored.crawled_count) == (130, 130)
+    assert restored.interval == pytest.approx(video.interval, abs=1)
+    requests_before = mock_crawl.stats["requests"]
+    videos = asyncio.run(MonitorScheduler(min_interval=0.05, max_interval=0.2, rate_options=FAST).run(["1"], duration=0.5))
+    assert videos[0].polls > 0 and videos[0].crawls == 0
+    assert mock_crawl.stats["requests"] - requests_before < videos[0].polls + 5
+
+def test_failures_are_reported_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scheduler = MonitorScheduler(cookies=["s_v_web_id=test"], rate_options=FAST)
+    account = scheduler.pool.accounts[0]
+    video = WatchedVideo("1")
+
+    def run(step):
+        async def go():
+            async with SessionManager() as session:
+                await step(video, session)
+        asyncio.run(go())
+
+    async def blocked(*args, **kwargs):
+        raise ValueError("禁止访问")
+    monkeypatch.setattr(monitor, "check_comments_count", blocked)
+    run(scheduler._probe)
+    assert (account.blocked_count, account.consecutive_blocked) == (1, 1) and video.status == "idle"
+
+    async def broken(*args, **kwargs):
+        raise httpx.ConnectError("连接失败")
+    monkeypatch.setattr(monitor, "refresh_async", broken)
+    video.count = 10
+    run(scheduler._crawl)
+    assert video.crawled_count is None and video.status == "idle" and account.in_flight == 0
+
+    async def cancelled(*args, **kwargs):
+        return {"save_path": "", "mode": "delta", "pages": 1, "new_comments": 3, "new_replies": 0,
+                "updated": 0, "cancelled": True}
+    monkeypatch.setattr(monitor, "refresh_async", cancelled)
+    run(scheduler._crawl)
+    # 被取消的刷新不记为已采集，下次轮询时仍会重新刷新
+    assert video.crawled_count is None and video.crawls == 0
+
+def test_unexpected_task_errors_are_recorded(mock_crawl, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise OSError("磁盘已满")
+    monkeypatch.setattr(monitor, "refresh_async", broken)
+    scheduler = MonitorScheduler(min_interval=0.05, max_interval=0.2, rate_options=FAST)
+    video = asyncio.run(scheduler.run(["1"], duration=0.5))[0]
+
+    # 异常没有丢失：记为出错，视频回到空闲状态，之后的轮询会重新尝试采集
+    assert video.crawls == 0 and video.crawled_count is None and video.status == "idle"
+    series = pd.read_csv("data/v1/1/monitor.csv", encoding="utf-8-sig")
+    assert (series["事件"] == "出错").sum() > 1
@@ -0,0 +1,71 @@
+"""
+列式处理测试：project_frame 与逐行处理（project_rows）的结果完全一致
+
+运行: python -m pytest -q test_process.py
+"""
+import time
+import random
+import pandas as pd
+import pytest
+
+from main import project_frame, project_rows, process_comments, process_replies
+
+def make_items(count, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        item = {
+            "cid": str(7400000000000000000 + i),
+            "text": f"评论{i}",
+            "digg_count": rng.randint(0, 1000),
+            # 覆盖2024年3月、11月的夏令时切换
+            "create_time": rng.choice([1710054000, 1730613600, 1736900000]) + rng.randint(-7200, 7200),
+            "ip_label": "北京",
+            "reply_comment_total": rng.randint(0, 5),
+            "user": {"nickname": f"用户{i}", "unique_id": f"u{i}"},
+        }
+        items.append(item)
+    # 各种无效或不规范的记录
+    items[1]["user"] = None
+    items[2]["cid"] = ""
+    items[3]["digg_count"] = "abc"
+    items[4]["create_time"] = "2024-01-01"
+    items[5]["create_time"] = 1736900000.9999999
+    items[6]["create_time"] = float("nan")
+    items[7]["digg_count"] = "12"
+    items[8]["reply_comment_total"] = None
+    items[9]["create_time"] = 1e20
+    items[10]["create_time"] = 10_000_000_000  # 2286年，超出pandas纳秒时间范围
+    del items[11]["user"]
+    del items[12]["text"]
+    items[13] = "不是字典"
+    items[14] = None
+    return items
+
+def expected_frame(items, is_reply=False):
+    rows, error_count = project_rows(items, is_reply)
+    return pd.DataFrame(rows), error_count
+
+@pytest.mark.parametrize("tz", ["Asia/Shanghai", "America/New_York", "UTC"])
+@pytest.mark.parametrize("is_reply", [False, True])
+def test_project_frame_matches_rows(monkeypatch, tz, is_reply):
+    if not hasattr(time, "tzset"):
+        pytest.skip("需要time.tzset")
+    monkeypatch.setenv("TZ", tz)
+    time.tzset()
+    try:
+        items = make_items(500)
+        frame, error_count = project_frame(items, is_reply)
+        expected, expected_errors = expected_frame(items, is_reply)
+        assert error_count == expected_errors
+        pd.testing.assert_frame_equal(frame, expected)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+def test_process_empty_and_invalid():
+    assert process_comments([]).empty
+    assert process_comments([None, {"cid": ""}]).empty
+    assert process_replies([None], None).empty
+    df = process_comments(make_items(20))
+    assert list(df.columns)[0] == "评论ID" and len(df) == len(expected_frame(make_items(20))[0])
@@ -0,0 +1,56 @@
+"""
+自适应限速器测试
+
+运行: python -m pytest -q test_rate_limit.py
+"""
+import asyncio
+import time
+import pytest
+
+from rate_limit import RateLimiter, RateController
+
+def test_additive_increase_multiplicative_decrease():
+    controller = RateController(rate=1.0, min_rate=0.2, max_rate=1.5, increase=0.1, decrease=0.5, jitter=0)
+    for _ in range(3):
+        controller.on_success()
+    assert controller.rate == pytest.approx(1.3)
+    for _ in range(10):
+        controller.on_success()
+    assert controller.rate == pytest.approx(1.5)
+    controller.on_backoff("403")
+    assert controller.rate == pytest.approx(0.75)
+    for _ in range(5):
+        controller.on_backoff("空页面")
+    assert controller.rate == pytest.approx(0.2)
+    assert controller.success_count == 13 and controller.backoff_count == 6
+
+def test_backoff_drains_tokens():
+    controller = RateController(rate=20, max_rate=20, burst=5, jitter=0)
+    controller.on_backoff("禁止访问")
+
+    async def timed_acquire():
+        start = time.monotonic()
+        await controller.acquire()
+        return time.monotonic() - start
+    # 降速后的第一次请求需要等待一个新的请求间隔（1/10秒）
+    assert asyncio.run(timed_acquire()) >= 0.08
+
+def test_fixed_limiter_ignores_feedback():
+    limiter = RateLimiter(2.0)
+    limiter.on_success()
+    limiter.on_backoff("403")
+    assert limiter.rate == 2.0
+
+def test_invalid_range():
+    with pytest.raises(ValueError):
+        RateController(rate=1, min_rate=2, max_rate=1)
+
+def test_limiter_reused_across_event_loops():
+    # 界面的账号池在多次采集之间复用同一个限速器，每次采集都在新的事件循环中运行
+    limiter = RateController(rate=1000, max_rate=1000, burst=1, jitter=0)
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire() for _ in range(4)))
+
+    asyncio.run(run())
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+"""
+SQLite存储测试：upsert不产生重复、回复关联所属评论、热门评论查询走索引
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+import main
+from delta import refresh_async
+from sqlite_store import SqliteStore
+from mock_server import BASE_CID, BASE_TIME, make_comment
+
+@pytest.fixture
+def mock_options():
+    return {"total_comments": 100, "replies_per_comment": 2}
+
+def test_upsert_updates_counts_without_duplicates(tmp_path):
+    with SqliteStore(str(tmp_path / "comments.db")) as store:
+        comments = [make_comment("1", i, reply_total=1) for i in range(3)]
+        assert store.upsert_comments("1", comments) == 3
+        comments[0]["digg_count"] = 500
+        store.upsert_comments("1", comments + [{"cid": ""}, "bad"])
+        store.upsert_replies("1", comments[0]["cid"], [make_comment("1", 10), make_comment("1", 11)])
+        store.upsert_replies("1", comments[0]["cid"], [make_comment("1", 11)])
+
+        assert store.counts() == {"comments": 3, "replies": 2, "users": 5}
+        top = store.top_comments(limit=1)
+        assert top["评论ID"].tolist() == [str(BASE_CID)] and top["点赞数"].tolist() == [500]
+        assert top["用户抖音号"].tolist() == ["user_0"] and top["视频ID"].tolist() == ["1"]
+        replies = store.replies_of(comments[0]["cid"])
+        assert replies["评论ID"].tolist() == [str(BASE_CID + 10), str(BASE_CID + 11)]
+        assert set(replies["父评论ID"]) == {str(BASE_CID)}
+    conn = sqlite3.connect(str(tmp_path / "comments.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_top_comments_uses_time_index(tmp_path):
+    with SqliteStore(str(tmp_path / "comments.db")) as store:
+        plan = store.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT cid FROM comments WHERE create_time >= ? ORDER BY digg_count DESC LIMIT 10", (0,)
+        ).fetchall()
+        assert any("idx_comments_time" in row[-1] for row in plan)
+        plan = store.conn.execute("EXPLAIN QUERY PLAN SELECT cid FROM replies WHERE parent_cid = ?", (1,)).fetchall()
+        assert any("idx_replies_parent" in row[-1] for row in plan)
+
+def test_crawl_and_refresh_write_to_store(mock_crawl):
+    store = SqliteStore("data/comments.db")
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True, store=store))
+    assert store.counts("1") == {"comments": 100, "replies": 200, "users": 300}
+
+    # 重新采集和增量刷新只更新计数，不产生重复
+    asyncio.run(main.crawl_to_csv_async("1", get_replies=True, store=store))
+    mock_crawl.add_comments(10)
+    mock_crawl.bump_likes(1000)
+    asyncio.run(refresh_async("1", get_replies=True, store=store))
+    assert store.counts("1")["comments"] == 110 and store.counts()["replies"] == 220
+    since = BASE_TIME + 50
+    top = store.top_comments(since=since, limit=5)
+    assert (top["点赞数"] >= 1000).all() and len(top) == 5
+    assert store.replies_of(str(BASE_CID + 100))["评论ID"].size == 2
+    store.close()
@@ -0,0 +1,43 @@
+"""
+表格模型测试：分批加载行，直接读取DataFrame
+
+运行: python -m pytest -q test_table_model.py
+"""
+import pandas as pd
+import pytest
+
+QtCore = pytest.importorskip("PyQt6.QtCore")
+from table_model import CommentTableModel
+
+def test_rows_fetched_in_batches():
+    frame = pd.DataFrame({"评论ID": [str(i) for i in range(1200)], "点赞数": range(1200)})
+    frame.loc[5, "评论ID"] = None
+    model = CommentTableModel(["评论ID", "点赞数", "ip归属"], ["ID", "赞", "IP"], batch_size=500)
+    model.set_frame(frame)
+    assert (model.rowCount(), model.columnCount(), model.total_rows) == (500, 3, 1200)
+
+    fetched = []
+    while model.canFetchMore():
+        model.fetchMore()
+        fetched.append(model.rowCount())
+    assert fetched == [1000, 1200]
+
+    assert model.data(model.index(1100, 1)) == "1100"
+    assert model.data(model.index(5, 0)) == ""  # 缺失值
+    assert model.data(model.index(0, 2)) == ""  # DataFrame中没有的列
+    assert model.headerData(1, QtCore.Qt.Orientation.Horizontal) == "赞"
+    assert model.frame() is frame
+
+    model.set_frame(frame.head(10))
+    assert model.rowCount() == 10 and not model.canFetchMore()
+
+def test_append_frame_keeps_batches():
+    model = CommentTableModel(["评论ID"], batch_size=3)
+    for start in range(0, 10, 2):
+        model.append_frame(pd.DataFrame({"评论ID": [str(i) for i in range(start, start + 2)]}))
+    assert model.total_rows == 10
+    while model.canFetchMore():
+        model.fetchMore()
+    assert [model.data(model.index(i, 0)) for i in range(10)] == [str(i) for i in range(10)]
+    assert model.frame()["评论ID"].tolist() == [str(i) for i in range(10)]
+    assert model.data(model.index(7, 0)) == "7"  # 合并后仍可读取
@@ -0,0 +1,75 @@
+"""
+写入器测试：Parquet按schema转换类型，与CSV转换的结果一致；Excel超过行数上限时自动分表
+
+运行: python -m pytest -q test_writers.py
+"""
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from main import COLUMNS, project_rows
+from mock_server import make_comment
+from writers import CsvAppendWriter, ParquetAppendWriter, XlsxStreamWriter, comment_schema, csv_to_parquet
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+needs_pyarrow = pytest.mark.skipif(pq is None, reason="需要pyarrow")
+
+@pytest.fixture
+def rows():
+    rows, _ = project_rows([make_comment("1", i, i % 3) for i in range(250)])
+    return rows
+
+@needs_pyarrow
+def test_parquet_typed_schema(tmp_path, rows):
+    path = tmp_path / "comments.parquet"
+    with ParquetAppendWriter(str(path), schema=comment_schema(), row_group_size=100) as writer:
+        for start in range(0, len(rows), 20):
+            writer.write_rows(rows[start:start + 20])
+    parquet = pq.ParquetFile(str(path))
+    assert parquet.metadata.num_row_groups == 3
+    df = parquet.read().to_pandas()
+    assert str(parquet.schema_arrow.field("评论ID").type) == "int64"
+    assert df["评论ID"].tolist() == [int(row["评论ID"]) for row in rows]
+    assert df["评论时间"].dt.strftime("%Y-%m-%d %H:%M:%S").tolist() == [row["评论时间"] for row in rows]
+    assert isinstance(df["ip归属"].dtype, pd.CategoricalDtype)
+
+@needs_pyarrow
+def test_csv_to_parquet_matches_direct_write(tmp_path, rows):
+    direct = tmp_path / "direct.parquet"
+    with ParquetAppendWriter(str(direct), schema=comment_schema()) as writer:
+        writer.write_rows(rows)
+    csv_path = tmp_path / "comments.csv"
+    with CsvAppendWriter(str(csv_path), columns=COLUMNS) as writer:
+        writer.write_rows(rows)
+    converted = csv_to_parquet(str(csv_path), chunk_rows=64)
+    assert pq.read_table(converted).equals(pq.read_table(str(direct)))
+
+@needs_pyarrow
+def test_empty_parquet_keeps_schema(tmp_path):
+    path = tmp_path / "empty.parquet"
+    ParquetAppendWriter(str(path), schema=comment_schema()).close()
+    table = pq.read_table(str(path))
+    assert table.num_rows == 0 and table.schema.names == COLUMNS
+
+def test_xlsx_splits_sheets(tmp_path, rows):
+    path = tmp_path / "comments.xlsx"
+    frame = pd.DataFrame(rows)
+    frame.loc[3, "评论内容"] = None
+    progress = []
+    with XlsxStreamWriter(str(path), max_rows_per_sheet=100) as writer:
+        writer.write_frame(frame, chunk_rows=64, progress=lambda written, total: progress.append(written))
+    assert writer.sheet_count == 3 and progress[-1] == len(rows)
+
+    workbook = load_workbook(str(path), read_only=True)
+    assert workbook.sheetnames == ["评论数据", "评论数据_2", "评论数据_3"]
+    values = []
+    for sheet in workbook.worksheets:
+        sheet_rows = list(sheet.iter_rows(values_only=True))
+        assert list(sheet_rows[0]) == COLUMNS
+        values.extend(sheet_rows[1:])
+    assert len(values) == len(rows)
+    assert [v[0] for v in values] == [row["评论ID"] for row in rows]  # 评论ID按文本保存
+    assert values[3][1] is None and values[4][2] == rows[4]["点赞数"]
@@ -0,0 +1,341 @@
+import os
+import csv
+from loguru import logger
+from typing import Dict, Iterable, List, Mapping, Optional
+
+# 输出表格中评论时间的格式（本地时间）
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Parquet每个row group的行数，逐页写入时先缓冲到该行数再写盘
+PARQUET_ROW_GROUP_SIZE = 65536
+# Excel每个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+def import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("写入Parquet需要安装pyarrow: pip install pyarrow")
+    return pa, pq
+
+def comment_schema():
+    """
+    评论表格的Parquet schema
+
+    评论ID为int64（不会像CSV那样被表格软件截断成科学计数法），评论时间为秒级时间戳（本地时间），
+    ip归属取值很少，使用字典编码。
+    """
+    pa, _ = import_pyarrow()
+    return pa.schema([
+        ("评论ID", pa.int64()),
+        ("评论内容", pa.string()),
+        ("点赞数", pa.int64()),
+        ("评论时间", pa.timestamp("s")),
+        ("用户昵称", pa.string()),
+        ("用户抖音号", pa.string()),
+        ("ip归属", pa.dictionary(pa.int32(), pa.string())),
+        ("回复总数", pa.int64()),
+    ])
+
+class CsvAppendWriter:
+    """
+    追加写入的CSV写入器
+
+    每写入一批数据就刷新到磁盘，采集中途异常退出时已写入的行不会丢失。
+    新文件使用utf-8-sig编码（带BOM，方便Excel直接打开）。
+    """
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None, overwrite: bool = False):
+        """
+        Args:
+            path: 输出文件路径
+            columns: 列名，不传时使用第一批数据的键
+            overwrite: 是否覆盖已存在的文件，否则追加
+        """
+        self.path = path
+        self.columns = columns
+        self.rows_written = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0 and not overwrite
+        self._header_written = exists
+        self._file = open(path, "a" if exists else "w", newline="", encoding="utf-8" if exists else "utf-8-sig")
+        self._writer = None
+
+    def write_rows(self, rows: Iterable[Dict]):
+        """写入一批行并刷新到磁盘"""
+        rows = list(rows)
+        if not rows:
+            return
+        if self._writer is None:
+            self.columns = self.columns or list(rows[0].keys())
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction="ignore")
+            if not self._header_written:
+                self._writer.writeheader()
+                self._header_written = True
+        self._writer.writerows(rows)
+        self._file.flush()
+        self.rows_written += len(rows)
+
+    def tell(self) -> int:
+        """已写入磁盘的文件大小（字节），用于记录断点"""
+        return self._file.tell()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class ParquetAppendWriter:
+    """
+    按批写入的Parquet写入器（需要安装pyarrow）
+
+    写入的行先缓冲，攒够row_group_size行写成一个row group，文件在close时写入尾部元数据。
+    传入schema时按schema转换类型（字符串ID转int64、时间字符串转时间戳、字典编码等）。
+    """
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None, overwrite: bool = True,
+                 schema=None, row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        """
+        Args:
+            path: 输出文件路径
+            columns: 列名，传入schema时使用schema的列
+            overwrite: 是否覆盖已存在的文件（Parquet不支持追加）
+            schema: pyarrow.Schema，例如comment_schema()
+            row_group_size: 每个row group的行数
+        """
+        self._pa, self._pq = import_pyarrow()
+        self.path = path
+        self.schema = schema
+        self.columns = schema.names if schema is not None else columns
+        self.row_group_size = max(1, row_group_size)
+        self.rows_written = 0
+        self._writer = None
+        self._buffer = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and not overwrite:
+            raise FileExistsError(f"Parquet文件不支持追加写入: {path}")
+
+    def _convert(self, values, field):
+        """把一列数据转换为schema中的类型"""
+        pa = self._pa
+        array = values if isinstance(values, pa.Array) else pa.array(values, from_pandas=True)
+        target = field.type
+        if array.type == target:
+            return array
+        if pa.types.is_dictionary(target):
+            return self._convert(array, pa.field(field.name, target.value_type)).dictionary_encode()
+        if pa.types.is_timestamp(target) and (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+            import pyarrow.compute as pc
+            return pc.strptime(array, format=TIME_FORMAT, unit=target.unit)
+        return array.cast(target)
+
+    def _to_table(self, columns: Mapping):
+        if self.schema is None:
+            return self._pa.Table.from_pydict({c: columns[c] for c in self.columns})
+        arrays = [self._convert(columns[field.name], field) for field in self.schema]
+        return self._pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _write_table(self, table):
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self.schema or table.schema)
+        self._writer.write_table(table.cast(self._writer.schema), row_group_size=self.row_group_size)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        self._write_table(self._to_table({c: [row.get(c) for row in rows] for c in self.columns}))
+
+    def write_rows(self, rows: Iterable[Dict]):
+        """写入一批行（缓冲到row_group_size行后写盘）"""
+        rows = list(rows)
+        if not rows:
+            return
+        self.columns = self.columns or list(rows[0].keys())
+        self._buffer.extend(rows)
+        self.rows_written += len(rows)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def write_frame(self, frame, progress=None):
+        """
+        写入一个DataFrame，按row_group_size分块转换和写盘
+
+        Args:
+            frame: pandas.DataFrame
+            progress: 每写完一块调用progress(已写入行数, 总行数)
+        """
+        self._flush()
+        self.columns = self.columns or list(frame.columns)
+        total = len(frame)
+        for start in range(0, total, self.row_group_size):
+            chunk = frame.iloc[start:start + self.row_group_size]
+            self._write_table(self._to_table({c: chunk[c] for c in self.columns}))
+            self.rows_written += len(chunk)
+            if progress is not None:
+                progress(self.rows_written, total)
+
+    def close(self):
+        try:
+            self._flush()
+        finally:
+            if self._writer is None and self.schema is not None:
+                # 没有数据时也写出带schema的空文件
+                self._writer = self._pq.ParquetWriter(self.path, self.schema)
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class XlsxStreamWriter:
+    """
+    流式写入的Excel写入器（openpyxl write_only模式）
+
+    行写入后不再保留在内存中，内存占用与总行数无关；超过Excel单表行数上限时
+    自动新建工作表（评论数据、评论数据_2……），每个工作表都有表头。
+    """
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None, sheet_name: str = "评论数据",
+                 max_rows_per_sheet: int = EXCEL_MAX_ROWS - 1, text_columns: Iterable[str] = ("评论ID",)):
+        """
+        Args:
+            path: 输出文件路径
+            columns: 列名，不传时使用第一批数据的键
+            sheet_name: 工作表名称，后续工作表加序号
+            max_rows_per_sheet: 每个工作表的数据行数（不含表头）
+            text_columns: 按文本写入的列，19位评论ID超过Excel数字的15位精度
+        """
+        from openpyxl import Workbook
+
+        self.path = path
+        self.columns = columns
+        self.sheet_name = sheet_name
+        self.max_rows_per_sheet = max(1, max_rows_per_sheet)
+        self.text_columns = set(text_columns or ())
+        self.rows_written = 0
+        self.sheet_count = 0
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        title = self.sheet_name if self.sheet_count == 1 else f"{self.sheet_name}_{self.sheet_count}"
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append(self.columns)
+        self._sheet_rows = 0
+
+    def _append_values(self, rows: Iterable[List]):
+        text_indices = [i for i, c in enumerate(self.columns) if c in self.text_columns]
+        for values in rows:
+            if self._sheet is None or self._sheet_rows >= self.max_rows_per_sheet:
+                self._new_sheet()
+            for i in text_indices:
+                if values[i] is not None:
+                    values[i] = str(values[i])
+            self._sheet.append(values)
+            self._sheet_rows += 1
+            self.rows_written += 1
+
+    def write_rows(self, rows: Iterable[Dict]):
+        """写入一批行"""
+        rows = list(rows)
+        if not rows:
+            return
+        self.columns = self.columns or list(rows[0].keys())
+        self._append_values([row.get(c) for c in self.columns] for row in rows)
+
+    def write_frame(self, frame, chunk_rows: int = 10000, progress=None):
+        """
+        写入一个DataFrame
+
+        Args:
+            frame: pandas.DataFrame
+            chunk_rows: 每次转换的行数
+            progress: 每写完一块调用progress(已写入行数, 总行数)
+        """
+        self.columns = self.columns or [str(c) for c in frame.columns]
+        total = len(frame)
+        for start in range(0, total, chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            # 缺失值写成空单元格
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            self._append_values(list(values) for values in chunk.itertuples(index=False, name=None))
+            if progress is not None:
+                progress(min(start + chunk_rows, total), total)
+
+    def close(self):
+        if self._workbook is None:
+            return
+        if self._sheet is None:
+            self.columns = self.columns or []
+            self._new_sheet()
+        workbook, self._workbook = self._workbook, None
+        workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def csv_to_parquet(csv_path: str, parquet_path: Optional[str] = None, schema=None,
+                   chunk_rows: int = PARQUET_ROW_GROUP_SIZE) -> str:
+    """
+    把采集得到的CSV分块转换为Parquet，内存占用只与chunk_rows有关
+
+    Args:
+        csv_path: CsvAppendWriter写出的CSV文件
+        parquet_path: 输出路径，默认与CSV同名、扩展名为.parquet
+        schema: 不传时使用comment_schema()
+        chunk_rows: 每次读取和写入的行数
+
+    Returns:
+        str: Parquet文件路径
+    """
+    import pandas as pd
+
+    parquet_path = parquet_path or os.path.splitext(csv_path)[0] + ".parquet"
+    schema = schema or comment_schema()
+    # 全部按字符串读取，类型转换交给schema，避免pandas把19位ID读成浮点数
+    chunks = pd.read_csv(csv_path, encoding="utf-8-sig", dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    with ParquetAppendWriter(parquet_path, schema=schema, row_group_size=chunk_rows) as writer:
+        for chunk in chunks:
+            writer.write_frame(chunk)
+    logger.info(f"已转换为Parquet: {parquet_path}，共 {writer.rows_written} 行")
+    return parquet_path
+
+def open_writer(path: str, fmt: Optional[str] = None, **kwargs):
+    """
+    根据格式创建写入器
+
+    Args:
+        path: 输出文件路径
+        fmt: csv、parquet 或 xlsx，不传时根据扩展名判断
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".") or "csv").lower()
+    if fmt == "csv":
+        return CsvAppendWriter(path, **kwargs)
+    if fmt == "parquet":
+        return ParquetAppendWriter(path, **kwargs)
+    if fmt == "xlsx":
+        return XlsxStreamWriter(path, **kwargs)
+    logger.error(f"不支持的输出格式: {fmt}")
+    raise ValueError(f"不支持的输出格式: {fmt}")